@@ -0,0 +1,257 @@
+# 本地 Bing / GitHub 替身服务器，供基准测试使用
+# 模拟 HPImageArchive.aspx、/th?id=..._UHD.jpg 等图片地址与 GitHub releases/latest 接口，
+# 可配置延迟(含偶发的延迟尖峰)、带宽、错误率、断连率与图片大小，图片支持 HEAD 与 Range 请求
+# 单独运行: python benchmarks/fake_bing.py [--port 8765] [--latency-ms 50] [--bandwidth-mbps 20] ...
+import argparse
+import datetime
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+ARCHIVE_DAYS = 8  # 与真实接口一致: idx 最大 7, 每次最多 8 张
+RESOLUTION_RE = re.compile(r"_(UHD|\d+x\d+)\.jpg$")
+RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+class ServerConfig:
+    def __init__(self, latency_ms=0, bandwidth_mbps=0, error_rate=0.0, image_size=4 * 1024 * 1024,
+                 small_image_size=300 * 1024, ranges=True, latest_tag="v1.4.0", seed=None, image=None,
+                 spike_rate=0.0, spike_ms=0, drop_rate=0.0, archive_days=ARCHIVE_DAYS, rate_remaining=59,
+                 rate_reset=None, variants=None):
+        self.latency_ms = latency_ms            # 每个请求在响应头前的额外延迟
+        self.spike_rate = spike_rate            # 请求额外等待 spike_ms 的概率(模拟慢请求的长尾)
+        self.spike_ms = spike_ms
+        self.drop_rate = drop_rate              # 发送一半正文后断开连接的概率
+        self.archive_days = archive_days        # 可分页获取的历史天数，调大可模拟数百天的存档
+        self.bandwidth_mbps = bandwidth_mbps    # 每个连接的带宽上限(MB/s)，0 表示不限
+        self.error_rate = error_rate            # 返回 503 的概率
+        self.image_size = image_size            # _UHD 图片字节数
+        self.small_image_size = small_image_size  # 其它分辨率图片字节数
+        self.ranges = ranges
+        self.latest_tag = latest_tag
+        self.rate_remaining = rate_remaining    # releases 接口剩余额度，为 0 时返回 403
+        self.rate_reset = rate_reset            # 额度重置时间戳，默认一小时后
+        self.image = image                      # 指定时 _UHD 图片使用这份真实 JPEG 内容
+        self.variants = variants                # 提供的图片规格(如 {"UHD", "1920x1080"})，None 表示全部
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+
+    def as_dict(self):
+        return {"latency_ms": self.latency_ms, "bandwidth_mbps": self.bandwidth_mbps,
+                "error_rate": self.error_rate, "image_size": self.image_size,
+                "small_image_size": self.small_image_size, "ranges": self.ranges,
+                "spike_rate": self.spike_rate, "spike_ms": self.spike_ms, "drop_rate": self.drop_rate,
+                "archive_days": self.archive_days}
+
+    def _chance(self, rate):
+        if not rate:
+            return False
+        with self.rng_lock:
+            return self.rng.random() < rate
+
+    def should_fail(self):
+        return self._chance(self.error_rate)
+
+    def should_spike(self):
+        return self._chance(self.spike_rate)
+
+    def should_drop(self):
+        return self._chance(self.drop_rate)
+
+class _QuietServer(ThreadingHTTPServer):
+    # 客户端取消、对冲请求落败或主动断连时连接被重置属于预期情况，不打印堆栈
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+class FakeBingServer:
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.config = config or ServerConfig()
+        self._images = {}
+        self._images_lock = threading.Lock()
+        self.requests = 0
+        self._requests_lock = threading.Lock()
+        handler = type("BoundHandler", (_Handler,), {"server_ref": self})
+        self.httpd = _QuietServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def image_bytes(self, name):
+        # 带 SOF/SOS 标记段、以 EOI 结尾的确定性内容，可通过下载器的 JPEG 结构校验
+        if self.config.image is not None and name.endswith("_UHD.jpg"):
+            return self.config.image
+        size = self.config.image_size if name.endswith("_UHD.jpg") else self.config.small_image_size
+        with self._images_lock:
+            data = self._images.get((name, size))
+            if data is None:
+                header = (b"\xff\xd8"
+                          + b"\xff\xc0\x00\x11\x08\x08\x70\x0f\x00\x03\x01\x22\x00\x02\x11\x01\x03\x11\x01"
+                          + b"\xff\xda\x00\x0c\x03\x01\x00\x02\x11\x03\x11\x00\x3f\x00")
+                seed = name.encode("utf-8") * (size // max(1, len(name)) + 1)
+                data = header + seed[:max(0, size - len(header) - 2)] + b"\xff\xd9"
+                self._images[(name, size)] = data
+            return data
+
+    def archive(self, idx, n, mkt):
+        today = datetime.date.today()
+        images = []
+        days = self.config.archive_days
+        for i in range(min(idx, days - 1), min(idx + n, days)):
+            day = today - datetime.timedelta(days=i)
+            start = day.strftime("%Y%m%d")
+            images.append({
+                "startdate": start,
+                "fullstartdate": f"{start}1600",
+                "enddate": (day + datetime.timedelta(days=1)).strftime("%Y%m%d"),
+                "urlbase": f"/th?id=OHR.Bench{start}_{mkt.replace('-', '').upper()}",
+                "title": f"Benchmark {start}",
+                "copyright": "Benchmark",
+                "hsh": f"bench{start}",
+            })
+        return {"images": images}
+
+class _Handler(BaseHTTPRequestHandler):
+    server_ref = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self._handle(head=True)
+
+    def do_GET(self):
+        self._handle(head=False)
+
+    def _handle(self, head):
+        server = self.server_ref
+        config = server.config
+        with server._requests_lock:
+            server.requests += 1
+        if config.latency_ms:
+            time.sleep(config.latency_ms / 1000)
+        if config.should_spike():
+            time.sleep(config.spike_ms / 1000)
+        if config.should_fail():
+            return self._send(503, b"unavailable", "text/plain", head)
+
+        parts = urlsplit(self.path)
+        query = parse_qs(parts.query)
+        if parts.path == "/HPImageArchive.aspx":
+            payload = server.archive(int(query.get("idx", ["0"])[0]), int(query.get("n", ["1"])[0]),
+                                     query.get("mkt", ["zh-CN"])[0])
+            return self._send(200, json.dumps(payload).encode("utf-8"), "application/json", head)
+        m = RESOLUTION_RE.search(query.get("id", [""])[0]) if parts.path == "/th" else None
+        if m and (config.variants is None or m.group(1) in config.variants):
+            return self._send_image(server.image_bytes(query["id"][0]), head)
+        if parts.path.endswith("/releases/latest"):
+            # 与 GitHub 一致: 带 ETag，条件请求命中时返回 304
+            etag = f'"{config.latest_tag}"'
+            reset = config.rate_reset or int(time.time()) + 3600
+            headers = {"ETag": etag, "X-RateLimit-Limit": "60", "X-RateLimit-Remaining": str(config.rate_remaining),
+                       "X-RateLimit-Reset": str(int(reset))}
+            if config.rate_remaining <= 0:
+                return self._send(403, b'{"message": "API rate limit exceeded"}', "application/json", head, headers)
+            if self.headers.get("If-None-Match") == etag:
+                return self._send(304, b"", "application/json", head, headers)
+            payload = {"tag_name": config.latest_tag, "html_url": "http://127.0.0.1/releases/latest"}
+            return self._send(200, json.dumps(payload).encode("utf-8"), "application/json", head, headers)
+        return self._send(404, b"not found", "text/plain", head)
+
+    def _send_image(self, data, head):
+        config = self.server_ref.config
+        etag = f'"{len(data):x}"'
+        match = RANGE_RE.match(self.headers.get("Range", "")) if config.ranges else None
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2)) if match.group(2) else len(data) - 1, len(data) - 1)
+            else:
+                start, end = max(0, len(data) - int(match.group(2))), len(data) - 1
+            if start >= len(data) or start > end:
+                return self._send(416, b"", "text/plain", head, {"Content-Range": f"bytes */{len(data)}"})
+            headers = {"Content-Range": f"bytes {start}-{end}/{len(data)}", "ETag": etag, "Accept-Ranges": "bytes"}
+            return self._send(206, data[start:end + 1], "image/jpeg", head, headers)
+        headers = {"ETag": etag}
+        if config.ranges:
+            headers["Accept-Ranges"] = "bytes"
+        return self._send(200, data, "image/jpeg", head, headers)
+
+    def _send(self, status, body, content_type, head, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if head:
+            return
+        if self.server_ref.config.should_drop():
+            # 只发出一半正文就断开，客户端读到不完整的响应
+            body = body[:len(body) // 2]
+            self.close_connection = True
+        rate = self.server_ref.config.bandwidth_mbps * 1024 * 1024
+        chunk = 64 * 1024
+        try:
+            for offset in range(0, len(body), chunk):
+                started = time.perf_counter()
+                piece = body[offset:offset + chunk]
+                self.wfile.write(piece)
+                if rate:
+                    remaining = len(piece) / rate - (time.perf_counter() - started)
+                    if remaining > 0:
+                        time.sleep(remaining)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 Bing / GitHub 替身服务器")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--bandwidth-mbps", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--spike-rate", type=float, default=0.0)
+    parser.add_argument("--spike-ms", type=float, default=0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--archive-days", type=int, default=ARCHIVE_DAYS)
+    parser.add_argument("--image-mb", type=float, default=4)
+    parser.add_argument("--no-ranges", action="store_true")
+    args = parser.parse_args()
+    config = ServerConfig(latency_ms=args.latency_ms, bandwidth_mbps=args.bandwidth_mbps,
+                          error_rate=args.error_rate, image_size=int(args.image_mb * 1024 * 1024),
+                          ranges=not args.no_ranges, spike_rate=args.spike_rate, spike_ms=args.spike_ms,
+                          drop_rate=args.drop_rate, archive_days=args.archive_days)
+    server = FakeBingServer(config, port=args.port).start()
+    print(f"服务地址 {server.url}，Ctrl+C 退出")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+# 按显示器裁剪缩放基准: python benchmarks/fit.py
+# 用合成的 UHD 图片和一组常见显示器尺寸(含竖屏)运行 DisplayFitter，输出冷/热缓存耗时与每百万像素耗时
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from wallpaper_core import DisplayFitter, HAS_PILLOW
+
+GEOMETRIES = [(1366, 768), (1920, 1080), (2560, 1440), (3440, 1440), (1080, 1920), (3840, 2160)]
+
+def make_image(path, width=3840, height=2160):
+    from PIL import Image
+    # 渐变而非纯色，避免 JPEG 编解码走捷径
+    gradient = Image.linear_gradient("L").resize((width, height))
+    Image.merge("RGB", (gradient, gradient.transpose(Image.FLIP_LEFT_RIGHT), gradient.rotate(180))).save(
+        path, "JPEG", quality=90)
+
+def main():
+    if not HAS_PILLOW:
+        print("需要 Pillow: pip install pillow")
+        return 1
+    # 索引等内部状态写入临时的应用数据目录，结束后一并删除
+    state_dir = tempfile.mkdtemp(prefix="bing_bench_state_")
+    os.environ["XDG_STATE_HOME"] = os.environ["LOCALAPPDATA"] = state_dir
+    root = tempfile.mkdtemp(prefix="bing_fit_bench_")
+    try:
+        image_path = os.path.join(root, "20260101_UHD.jpg")
+        make_image(image_path)
+        fitter = DisplayFitter(root)
+        cold = fitter.fit(image_path, GEOMETRIES)
+        warm = fitter.fit(image_path, GEOMETRIES)
+        print(f"{len(GEOMETRIES)} 种尺寸")
+        print(f"冷缓存 {cold['seconds'] * 1000:8.1f} ms, 每百万像素 {cold['ms_per_mp']:6.2f} ms")
+        print(f"热缓存 {warm['seconds'] * 1000:8.1f} ms, 命中 {warm['cached']}/{len(GEOMETRIES)}")
+        for geometry, path in cold["outputs"].items():
+            print(f"  {geometry[0]}x{geometry[1]:<6} {os.path.getsize(path) / 1024:8.1f} KB")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+        shutil.rmtree(state_dir, ignore_errors=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+# 历史图库基准: python benchmarks/gallery.py [--images 3000] [--offscreen]
+# 生成大量带不同日期的 JPEG 作为历史归档，打开 HistoryWindow 后逐步滚动到底，
+# 每一步的 setValue + 同步重绘耗时作为帧时间，分别统计冷缓存(缩略图尚未生成)与热缓存两轮，并输出峰值内存
+import argparse
+import datetime
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def make_archive(root, count):
+    # 一张 1920x1080 原图复制为 count 个按日期命名的文件
+    from PyQt5.QtGui import QImage, QColor, QLinearGradient, QPainter
+    image = QImage(1920, 1080, QImage.Format_RGB32)
+    painter = QPainter(image)
+    gradient = QLinearGradient(0, 0, 1920, 1080)
+    gradient.setColorAt(0, QColor(20, 60, 120))
+    gradient.setColorAt(1, QColor(230, 160, 60))
+    painter.fillRect(image.rect(), gradient)
+    painter.end()
+    source = os.path.join(root, "source.jpg")
+    image.save(source, "JPG", 90)
+    day = datetime.date(2026, 1, 1)
+    for i in range(count):
+        shutil.copyfile(source, os.path.join(root, f"{day - datetime.timedelta(days=i):%Y%m%d}_1920x1080.jpg"))
+    os.remove(source)
+
+def scroll_pass(app, window, step):
+    bar = window.view.verticalScrollBar()
+    bar.setValue(0)
+    app.processEvents()
+    frames = []
+    for value in range(0, bar.maximum() + step, step):
+        started = time.perf_counter()
+        bar.setValue(min(value, bar.maximum()))
+        window.view.viewport().repaint()
+        frames.append((time.perf_counter() - started) * 1000)
+        # 交付后台生成的缩略图，与真实事件循环一致
+        app.processEvents()
+    return frames
+
+def wait_idle(app, loader, timeout=120):
+    end = time.time() + timeout
+    while time.time() < end:
+        app.processEvents()
+        with loader._cond:
+            if not loader._pending:
+                break
+        time.sleep(0.05)
+    app.processEvents()
+
+def report(name, frames):
+    ordered = sorted(frames)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f"{name:<6} {len(frames):5d} 帧  p50 {statistics.median(ordered):7.2f} ms  "
+          f"p95 {p95:7.2f} ms  最大 {ordered[-1]:7.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="历史图库滚动帧时间与内存基准")
+    parser.add_argument("--images", type=int, default=3000)
+    parser.add_argument("--step", type=int, default=120, help="每帧滚动像素")
+    parser.add_argument("--offscreen", action="store_true", help="无显示环境下运行")
+    args = parser.parse_args()
+    if args.offscreen:
+        os.environ["QT_QPA_PLATFORM"] = "offscreen"
+
+    from PyQt5.QtWidgets import QApplication
+    from bing_wallpaper import HistoryWindow
+    from wallpaper_core import WallpaperStore, peak_rss_mb
+
+    app = QApplication(sys.argv)
+    # 索引等内部状态写入临时的应用数据目录，结束后一并删除
+    state_dir = tempfile.mkdtemp(prefix="bing_bench_state_")
+    os.environ["XDG_STATE_HOME"] = os.environ["LOCALAPPDATA"] = state_dir
+    root = tempfile.mkdtemp(prefix="bing_gallery_bench_")
+    try:
+        make_archive(root, args.images)
+        started = time.perf_counter()
+        WallpaperStore.open(root)
+        print(f"{args.images} 张图片, 建立索引 {(time.perf_counter() - started) * 1000:.0f} ms, "
+              f"基线内存 {peak_rss_mb():.1f} MB")
+
+        window = HistoryWindow(root)
+        window.resize(1000, 700)
+        started = time.perf_counter()
+        window.show()
+        app.processEvents()
+        print(f"打开窗口 {(time.perf_counter() - started) * 1000:.0f} ms")
+
+        report("冷缓存", scroll_pass(app, window, args.step))
+        wait_idle(app, window.loader)
+        report("热缓存", scroll_pass(app, window, args.step))
+        print(f"生成缩略图 {window.loader.generated} 张, 内存中 {len(window.model._pixmaps)} 张, "
+              f"记录页 {len(window.model._pages)} 页")
+        print(f"峰值内存 {peak_rss_mb():.1f} MB")
+        window.loader.close()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+        shutil.rmtree(state_dir, ignore_errors=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
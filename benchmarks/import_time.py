@@ -0,0 +1,47 @@
+# 冷启动导入耗时回归检查: python benchmarks/import_time.py
+# 基于 python -X importtime，任一模块的累计导入耗时超出预算时以非零状态退出
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 模块 -> 冷导入预算(ms)，约为实测值加 25~35 ms 余量(wallpaper_core 实测约 7 ms，bing_wallpaper 含 PyQt5 约 55 ms)
+BUDGETS_MS = {
+    "wallpaper_core": 30,
+    "bing_wallpaper": 90,
+}
+RUNS = 5
+
+LINE_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s+(\S.*)$")
+
+def import_cost_ms(module):
+    # 预算针对已有字节码缓存的冷启动: 先编译项目模块，避免环境禁止写入 __pycache__ 时计入源码编译
+    import compileall
+    compileall.compile_dir(ROOT, maxlevels=0, quiet=1)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        return None
+    for line in proc.stderr.splitlines():
+        m = LINE_RE.match(line)
+        if m and m.group(3).strip() == module:
+            return int(m.group(2)) / 1000
+    return None
+
+def main():
+    failed = False
+    for module, budget in BUDGETS_MS.items():
+        samples = [import_cost_ms(module) for _ in range(RUNS)]
+        if any(v is None for v in samples):
+            print(f"{module:<16} 跳过(依赖缺失)")
+            continue
+        best = min(samples)
+        over = best > budget
+        failed |= over
+        print(f"{module:<16} {best:8.1f} ms / 预算 {budget} ms {'超出' if over else 'OK'}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
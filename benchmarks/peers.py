@@ -0,0 +1,105 @@
+# 局域网共享基准: python benchmarks/peers.py [--clients 3] [--bandwidth-mbps 5]
+# 在本机回环地址上启动替身 Bing 服务器、一个开启 --serve-peers 的共享实例和若干客户端实例(均为独立进程)，
+# 比较客户端 直连 Bing 与 先走共享 时的耗时和发往 Bing 的请求数
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+from fake_bing import FakeBingServer, ServerConfig
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def instance(bing_url, state_dir, argv):
+    # 子进程入口: 指向替身服务器，桌面设置使用记录型后端
+    os.environ["XDG_STATE_HOME"] = state_dir
+    from wallpaper_core import WallpaperUtils, WallpaperApplier, RecordingBackend, run_headless
+    WallpaperUtils.BING_HOST = bing_url
+    WallpaperApplier.backend = RecordingBackend()
+    return run_headless(["--headless"] + argv)
+
+def spawn(bing_url, work_dir, name, argv, **kwargs):
+    save_dir = os.path.join(work_dir, name)
+    cmd = [sys.executable, os.path.abspath(__file__), "--instance", bing_url, os.path.join(work_dir, name + "-state"),
+           "--save-dir", save_dir] + argv
+    return subprocess.Popen(cmd, cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, **kwargs)
+
+def wait_ready(peer_url, timeout=60):
+    end = time.time() + timeout
+    while time.time() < end:
+        try:
+            with urllib.request.urlopen(f"{peer_url}/meta?mkt=zh-CN", timeout=1) as resp:
+                if resp.status == 200:
+                    return True
+        except OSError:
+            pass
+        time.sleep(0.2)
+    return False
+
+def run_clients(server, work_dir, prefix, count, argv):
+    before = server.requests
+    started = time.perf_counter()
+    procs = [spawn(server.url, work_dir, f"{prefix}{i}", argv) for i in range(count)]
+    failed = 0
+    for proc in procs:
+        _, err = proc.communicate()
+        if proc.returncode != 0:
+            failed += 1
+            print(err, file=sys.stderr)
+    return {"seconds": time.perf_counter() - started, "bing_requests": server.requests - before, "failed": failed}
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--instance":
+        return instance(sys.argv[2], sys.argv[3], sys.argv[4:])
+
+    parser = argparse.ArgumentParser(description="局域网共享基准")
+    parser.add_argument("--clients", type=int, default=3)
+    parser.add_argument("--latency-ms", type=float, default=30)
+    parser.add_argument("--bandwidth-mbps", type=float, default=5, help="模拟共享出口的单连接带宽")
+    parser.add_argument("--image-mb", type=float, default=4)
+    args = parser.parse_args()
+
+    config = ServerConfig(latency_ms=args.latency_ms, bandwidth_mbps=args.bandwidth_mbps,
+                          image_size=int(args.image_mb * 1024 * 1024), seed=0)
+    work_dir = tempfile.mkdtemp(prefix="bing_peer_bench_")
+    peer_proc = None
+    try:
+        with FakeBingServer(config) as server:
+            direct = run_clients(server, work_dir, "direct", args.clients, [])
+
+            port = free_port()
+            peer_url = f"http://127.0.0.1:{port}"
+            before = server.requests
+            peer_proc = spawn(server.url, work_dir, "peer", ["--serve-peers", f"127.0.0.1:{port}"])
+            if not wait_ready(peer_url):
+                print("共享实例未就绪", file=sys.stderr)
+                return 1
+            seeded = server.requests - before
+            shared = run_clients(server, work_dir, "client", args.clients, ["--peers", peer_url])
+
+        print(f"{args.clients} 个客户端, 图片 {args.image_mb:g} MB, Bing 带宽 {args.bandwidth_mbps:g} MB/s")
+        print(f"直连 Bing   {direct['seconds']:7.2f} s, Bing 请求 {direct['bing_requests']:3d}, 失败 {direct['failed']}")
+        print(f"共享实例     Bing 请求 {seeded:3d}")
+        print(f"经局域网共享 {shared['seconds']:7.2f} s, Bing 请求 {shared['bing_requests']:3d}, 失败 {shared['failed']}")
+        print(json.dumps({"direct": direct, "seed_requests": seeded, "shared": shared}))
+        return 1 if direct["failed"] or shared["failed"] else 0
+    finally:
+        if peer_proc is not None:
+            peer_proc.kill()
+            peer_proc.wait()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+# 同日重复启动基准: python benchmarks/relaunch.py [--markets zh-CN,en-US]
+# 以独立进程依次运行无界面模式: 首次运行、同日再次启动、删除完成日志后再次启动(原有行为)、
+# 以及替身服务器关闭后(离线)再次启动，统计每次的耗时、发往 Bing 的请求数与设置壁纸的次数
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+from fake_bing import FakeBingServer, ServerConfig
+
+def instance(bing_url, state_dir, argv):
+    # 子进程入口: 指向替身服务器，桌面设置使用记录型后端，结束后输出设置壁纸的次数
+    os.environ["XDG_STATE_HOME"] = os.environ["LOCALAPPDATA"] = state_dir
+    from wallpaper_core import WallpaperUtils, WallpaperApplier, RecordingBackend, run_headless
+    WallpaperUtils.BING_HOST = bing_url
+    backend = WallpaperApplier.backend = RecordingBackend()
+    code = run_headless(["--headless"] + argv)
+    print(json.dumps({"applies": len(backend.calls)}))
+    return code
+
+def dead_url():
+    # 已关闭的本地端口，连接立即被拒绝，模拟离线
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+def launch(bing_url, work_dir, markets, server=None):
+    cmd = [sys.executable, os.path.abspath(__file__), "--instance", bing_url, os.path.join(work_dir, "state"),
+           "--save-dir", os.path.join(work_dir, "wallpapers"), "--markets", markets]
+    before = server.requests if server else 0
+    started = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    applies = None
+    if proc.returncode == 0:
+        applies = json.loads(proc.stdout.strip().splitlines()[-1])["applies"]
+    else:
+        print(proc.stderr, file=sys.stderr)
+    return {"seconds": elapsed, "bing_requests": (server.requests - before) if server else 0,
+            "applies": applies, "ok": proc.returncode == 0}
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--instance":
+        return instance(sys.argv[2], sys.argv[3], sys.argv[4:])
+
+    parser = argparse.ArgumentParser(description="同日重复启动的联网与设置壁纸次数基准")
+    parser.add_argument("--markets", default="zh-CN,en-US")
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--image-mb", type=float, default=2)
+    args = parser.parse_args()
+
+    config = ServerConfig(latency_ms=args.latency_ms, image_size=int(args.image_mb * 1024 * 1024), seed=0)
+    work_dir = tempfile.mkdtemp(prefix="bing_relaunch_bench_")
+    # 完成日志位于子进程的应用数据目录
+    os.environ["XDG_STATE_HOME"] = os.environ["LOCALAPPDATA"] = os.path.join(work_dir, "state")
+    from wallpaper_core import CompletionJournal
+    journal = CompletionJournal(os.path.join(work_dir, "wallpapers")).path
+    results = {}
+    try:
+        with FakeBingServer(config) as server:
+            results["首次运行"] = launch(server.url, work_dir, args.markets, server)
+            if not results["首次运行"]["ok"]:
+                return 1
+            results["同日再次启动"] = launch(server.url, work_dir, args.markets, server)
+            os.remove(journal)
+            results["无完成日志"] = launch(server.url, work_dir, args.markets, server)
+        results["离线再次启动"] = launch(dead_url(), work_dir, args.markets)
+        os.remove(journal)
+        results["离线且无日志"] = launch(dead_url(), work_dir, args.markets)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"市场 {args.markets}, 请求延迟 {args.latency_ms:g} ms")
+    for name, r in results.items():
+        status = "成功" if r["ok"] else "失败"
+        print(f"{name:<8} {r['seconds'] * 1000:7.0f} ms  Bing 请求 {r['bing_requests']:3d}  "
+              f"设置壁纸 {r['applies'] if r['applies'] is not None else '-':>2}  {status}")
+    print(json.dumps(results, ensure_ascii=False))
+    return 0 if all(r["ok"] for name, r in results.items() if name != "离线且无日志") else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
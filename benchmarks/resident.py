@@ -0,0 +1,120 @@
+# 托盘常驻占用基准: python benchmarks/resident.py [--idle 10] [--offscreen]
+# 分别以 低占用模式 与 原有行为 启动主程序(子进程)，打开主界面后隐藏到托盘，
+# 测量常驻时的内存(RSS)与空闲 CPU，以及再次打开主界面的恢复耗时。壁纸设置使用记录型后端，不访问网络
+import argparse
+import datetime
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def pump(app, seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        app.processEvents()
+        time.sleep(0.01)
+
+def child(args):
+    from PyQt5.QtCore import QSettings, QTimer
+    from PyQt5.QtGui import QImage, QColor
+    from PyQt5.QtWidgets import QApplication
+    import bing_wallpaper
+    from wallpaper_core import WallpaperStore, WallpaperApplier, RecordingBackend, rss_mb
+
+    work_dir = args.work_dir
+    save_dir = os.path.join(work_dir, "wallpapers")
+    os.makedirs(save_dir, exist_ok=True)
+    image = QImage(3840, 2160, QImage.Format_RGB32)
+    image.fill(QColor(40, 90, 160))
+    image.save(os.path.join(save_dir, f"{datetime.date.today():%Y%m%d}_UHD.jpg"), "JPG", 90)
+    WallpaperStore.open(save_dir)
+
+    settings_path = os.path.join(work_dir, "settings.ini")
+    settings = QSettings(settings_path, QSettings.IniFormat)
+    settings.setValue("low_footprint", args.mode == "low")
+    settings.setValue("auto_check_update", False)
+    settings.sync()
+    bing_wallpaper.QSettings = lambda org, app: QSettings(settings_path, QSettings.IniFormat)
+    bing_wallpaper.default_save_dir = lambda: save_dir
+    bing_wallpaper.BingWallpaperApp.check_screen_resolution = lambda self: True
+    WallpaperApplier.backend = RecordingBackend()
+    WallpaperApplier.state_path = os.path.join(work_dir, "wallpaper.json")
+
+    app = QApplication(sys.argv)
+    window = bing_wallpaper.BingWallpaperApp()
+    # 常驻场景: 不因单次任务完成而退出
+    window.maybe_exit = lambda: None
+    pump(app, 1.0)
+    window.showNormal()
+    pump(app, 2.0)
+    visible_rss = rss_mb()
+
+    window.hide()
+    pump(app, bing_wallpaper.RESIDENT_RELEASE_DELAY_MS / 1000 + 1.0)
+    resident_rss = rss_mb()
+
+    cpu_started, wall_started = time.process_time(), time.perf_counter()
+    QTimer.singleShot(int(args.idle * 1000), app.quit)
+    app.exec_()
+    idle_cpu = (time.process_time() - cpu_started) / (time.perf_counter() - wall_started) * 100
+
+    started = time.perf_counter()
+    window.showNormal()
+    app.processEvents()
+    shown_ms = (time.perf_counter() - started) * 1000
+    while window.preview_key is None and time.perf_counter() - started < 10:
+        app.processEvents()
+        time.sleep(0.002)
+    preview_ms = (time.perf_counter() - started) * 1000
+
+    print(json.dumps({"visible_rss_mb": visible_rss, "resident_rss_mb": resident_rss, "idle_cpu_pct": idle_cpu,
+                      "show_ms": shown_ms, "preview_ms": preview_ms}))
+    window.task_pool.shutdown()
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="托盘常驻内存与空闲 CPU 基准")
+    parser.add_argument("--idle", type=float, default=10, help="空闲 CPU 的采样时长(秒)")
+    parser.add_argument("--offscreen", action="store_true", help="无显示环境下运行")
+    parser.add_argument("--child", choices=["low", "full"], dest="mode", help=argparse.SUPPRESS)
+    parser.add_argument("--work-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.offscreen:
+        os.environ["QT_QPA_PLATFORM"] = "offscreen"
+    if args.mode:
+        return child(args)
+
+    results = {}
+    for mode in ("full", "low"):
+        work_dir = tempfile.mkdtemp(prefix="bing_resident_bench_")
+        try:
+            cmd = [sys.executable, os.path.abspath(__file__), "--child", mode, "--work-dir", work_dir,
+                   "--idle", str(args.idle)]
+            # 索引等内部状态写入工作目录下的应用数据目录，随工作目录一起删除
+            state_dir = os.path.join(work_dir, "state")
+            proc = subprocess.run(cmd, capture_output=True, text=True, cwd=ROOT,
+                                  env=dict(os.environ, XDG_STATE_HOME=state_dir, LOCALAPPDATA=state_dir))
+            if proc.returncode != 0:
+                print(proc.stderr, file=sys.stderr)
+                return 1
+            results[mode] = json.loads(proc.stdout.strip().splitlines()[-1])
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    labels = {"full": "原有行为", "low": "低占用"}
+    print(f"{'':<10} {'显示时 RSS':>12} {'常驻 RSS':>10} {'空闲 CPU':>9} {'重新显示':>10} {'预览就绪':>10}")
+    for mode, r in results.items():
+        print(f"{labels[mode]:<10} {r['visible_rss_mb']:>10.1f} MB {r['resident_rss_mb']:>7.1f} MB "
+              f"{r['idle_cpu_pct']:>8.2f}% {r['show_ms']:>7.1f} ms {r['preview_ms']:>7.1f} ms")
+    saved = results["full"]["resident_rss_mb"] - results["low"]["resident_rss_mb"]
+    print(f"常驻内存减少 {saved:.1f} MB")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
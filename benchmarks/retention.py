@@ -0,0 +1,46 @@
+# 保留策略基准: python benchmarks/retention.py [文件数, 默认 30000]
+# 在合成目录上分别运行 按天数保留 与 按容量淘汰，输出删除数量、回收字节与耗时
+import datetime
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from wallpaper_core import RetentionPolicy, WallpaperStore
+
+TODAY = datetime.date(2026, 1, 1)
+
+def make_tree(root, count, size=4096):
+    payload = b"\0" * size
+    for i in range(count):
+        day = (TODAY - datetime.timedelta(days=i)).strftime("%Y%m%d")
+        with open(os.path.join(root, f"{day}_UHD.jpg"), 'wb') as f:
+            f.write(payload)
+    WallpaperStore(root)
+
+def run(label, count, policy):
+    root = tempfile.mkdtemp(prefix="bing_retention_bench_")
+    try:
+        make_tree(root, count)
+        WallpaperStore._instances.clear()
+        report = policy.apply(root, today=TODAY)
+        print(f"{label:<24} 删除 {report['removed']:>6} 个, 回收 {report['bytes'] / (1024 * 1024):8.1f} MB, "
+              f"保留 {report['kept']:>6} 个, 耗时 {report['seconds'] * 1000:8.1f} ms")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 30000
+    # 索引等内部状态写入临时的应用数据目录，结束后一并删除
+    state_dir = tempfile.mkdtemp(prefix="bing_bench_state_")
+    os.environ["XDG_STATE_HOME"] = os.environ["LOCALAPPDATA"] = state_dir
+    try:
+        run("仅保留今天", count, RetentionPolicy())
+        run("保留最近 30 天", count, RetentionPolicy(keep_days=30))
+        run("容量上限 64 MB", count, RetentionPolicy(keep_days=count, max_bytes=64 * 1024 * 1024))
+    finally:
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# 壁纸索引扩展性基准: python benchmarks/store_index.py [文件数, 默认 100000]
+# 生成合成的壁纸目录，对比 从磁盘重建索引 / 索引查询 与 旧版 listdir + strptime 扫描 的耗时
+import datetime
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from wallpaper_core import WallpaperStore
+
+def make_tree(root, count):
+    start = datetime.date(2000, 1, 1)
+    names = []
+    for i in range(count):
+        day = (start + datetime.timedelta(days=i // 4)).strftime("%Y%m%d")
+        name = f"{day}_UHD.jpg" if i % 4 == 0 else f"{day}_Img{i}_UHD.jpg"
+        with open(os.path.join(root, name), 'wb') as f:
+            f.write(b"\xff\xd8" + b"\0" * 64 + b"\xff\xd9")
+        names.append(name)
+    return names
+
+def legacy_scan(root, today):
+    stale = 0
+    for filename in os.listdir(root):
+        if filename.endswith("_UHD.jpg"):
+            file_date = datetime.datetime.strptime(filename.split("_")[0], "%Y%m%d").date()
+            if file_date != today:
+                stale += 1
+    return stale
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return (time.perf_counter() - started) * 1000, result
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    # 索引等内部状态写入临时的应用数据目录，结束后一并删除
+    state_dir = tempfile.mkdtemp(prefix="bing_bench_state_")
+    os.environ["XDG_STATE_HOME"] = os.environ["LOCALAPPDATA"] = state_dir
+    root = tempfile.mkdtemp(prefix="bing_store_bench_")
+    try:
+        names = make_tree(root, count)
+        ms, _ = timed(WallpaperStore, root)
+        print(f"首次打开(含重建) {count} 个文件: {ms:10.1f} ms")
+        store = WallpaperStore(root)
+        ms, _ = timed(store.rebuild)
+        print(f"增量重建:                       {ms:10.1f} ms")
+        ms, stale = timed(store.filenames_not_on, "20000101")
+        print(f"索引查询待清理({len(stale)}):        {ms:10.1f} ms")
+        ms, _ = timed(lambda: [store.lookup(n) for n in names[-1000:]])
+        print(f"lookup x1000:                   {ms:10.1f} ms")
+        ms, _ = timed(legacy_scan, root, datetime.date(2000, 1, 1))
+        print(f"旧版 listdir + strptime:        {ms:10.1f} ms")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+# 基准测试套件: python benchmarks/suite.py [--latency-ms 50] [--bandwidth-mbps 20] [--compare 旧结果.json]
+# 在本地替身服务器上测量 每日任务端到端耗时、下载吞吐、预览管线耗时、清理耗时随文件数的变化、
+# 更新检查(含 304)耗时、应用壁纸(含未变化跳过)耗时、数百天历史存档的补全耗时 与 慢速链路下预览的首次出图/完整耗时，
+# 结果以 JSON 写入 benchmarks/results/，指定 --compare 时与旧结果对比，退化超过阈值则以非零状态退出
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+from wallpaper_core import (WallpaperUtils, WallpaperStore, RetentionPolicy, UpdateChecker, WallpaperApplier,
+                            RecordingBackend, DownloadProgress, ArchiveBackfill, HAS_PACKAGING)
+from fake_bing import FakeBingServer, ServerConfig
+from retention import TODAY, make_tree
+
+SCHEMA = 1
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+# 指标单位 -> 数值越大越好
+HIGHER_IS_BETTER = {"ms": False, "MB/s": True}
+
+def reset_state(server):
+    # 每轮之间清空进程内缓存，使每次测量都是冷路径
+    WallpaperUtils.BING_HOST = server.url
+    WallpaperUtils.UPDATE_API = f"{server.url}/repos/QsSama-W/wallpaper-win/releases/latest"
+    WallpaperUtils._meta_cache.clear()
+    WallpaperUtils._meta_inflight.clear()
+    WallpaperUtils._download_inflight.clear()
+    WallpaperUtils._fresh_downloads.clear()
+    WallpaperUtils._host_health.clear()
+    WallpaperStore._instances.clear()
+
+def summarize(samples, unit, **extra):
+    ordered = sorted(samples)
+    result = {"unit": unit, "runs": len(ordered), "median": round(statistics.median(ordered), 3),
+              "min": round(ordered[0], 3), "max": round(ordered[-1], 3),
+              "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3)}
+    result.update(extra)
+    return result
+
+def timed(func):
+    started = time.perf_counter()
+    func()
+    return (time.perf_counter() - started) * 1000
+
+def bench_daily_run(server, runs):
+    samples = []
+    for _ in range(runs):
+        reset_state(server)
+        save_dir = tempfile.mkdtemp(prefix="bing_bench_daily_")
+        try:
+            samples.append(timed(lambda: WallpaperUtils.run_daily(save_dir)))
+        finally:
+            shutil.rmtree(save_dir, ignore_errors=True)
+    return summarize(samples, "ms")
+
+def bench_download(server, runs):
+    size = server.config.image_size
+    samples = []
+    for _ in range(runs):
+        reset_state(server)
+        save_dir = tempfile.mkdtemp(prefix="bing_bench_download_")
+        try:
+            url = f"{server.url}/th?id=OHR.BenchDownload_UHD.jpg"
+            ms = timed(lambda: WallpaperUtils.download_image(url, os.path.join(save_dir, "download_UHD.jpg")))
+            samples.append(size / (1024 * 1024) / (ms / 1000))
+        finally:
+            shutil.rmtree(save_dir, ignore_errors=True)
+    return summarize(samples, "MB/s", bytes=size)
+
+def bench_backfill(latency_ms, days, runs):
+    # 替身服务器提供数百天的存档(真实接口只有 8 天)，测量从空目录分页补全全部历史的耗时
+    config = ServerConfig(latency_ms=latency_ms, image_size=256 * 1024, archive_days=days, seed=0)
+    samples = []
+    with FakeBingServer(config) as server:
+        for _ in range(runs):
+            reset_state(server)
+            save_dir = tempfile.mkdtemp(prefix="bing_bench_backfill_")
+            try:
+                report = ArchiveBackfill(save_dir, max_idx=days - 1).run()
+                if report["errors"] or report["downloaded"] != days:
+                    raise RuntimeError(f"补全不完整: {report['downloaded']}/{days}")
+                samples.append(report["seconds"] * 1000)
+            finally:
+                WallpaperStore._instances.clear()
+                shutil.rmtree(save_dir, ignore_errors=True)
+    return {"backfill": summarize(samples, "ms", images=days)}
+
+def bench_preview(runs):
+    # 需要 PyQt5；冷路径包含解码、缩放、写缩略图与圆角合成，热路径命中磁盘缩略图
+    try:
+        from PyQt5.QtGui import QImage, QColor
+        from bing_wallpaper import PreviewCache
+    except ImportError:
+        return None
+    work_dir = tempfile.mkdtemp(prefix="bing_bench_preview_")
+    try:
+        source = QImage(3840, 2160, QImage.Format_RGB32)
+        source.fill(QColor(40, 90, 160))
+        image_path = os.path.join(work_dir, "20260101_UHD.jpg")
+        source.save(image_path, "JPG", 90)
+        cold, warm = [], []
+        for _ in range(runs):
+            thumbs = os.path.join(work_dir, ".thumbs")
+            shutil.rmtree(thumbs, ignore_errors=True)
+            cold.append(timed(lambda: PreviewCache(thumbs).render(image_path, 400, 225)))
+            warm.append(timed(lambda: PreviewCache(thumbs).render(image_path, 400, 225)))
+        return {"preview_cold": summarize(cold, "ms"), "preview_warm": summarize(warm, "ms")}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def bench_progressive_preview(runs, latency_ms, bandwidth_mbps):
+    # 需要 PyQt5；用真实的噪声 JPEG 在限速服务器上下载，统计从开始到首个局部画面与完整预览的耗时
+    try:
+        from PyQt5.QtGui import QImage
+        from bing_wallpaper import PreviewCache, ProgressivePreview
+    except ImportError:
+        return None
+    noise = os.urandom(1920 * 1080 * 4)
+    # QImage 不复制外部缓冲区，先拷贝一份再释放随机数据
+    image = QImage(noise, 1920, 1080, QImage.Format_RGB32).copy()
+    del noise
+    work_dir = tempfile.mkdtemp(prefix="bing_bench_progressive_")
+    try:
+        source = os.path.join(work_dir, "source.jpg")
+        image.save(source, "JPG", 90)
+        with open(source, 'rb') as f:
+            data = f.read()
+        config = ServerConfig(latency_ms=latency_ms, bandwidth_mbps=bandwidth_mbps, image=data, seed=0)
+        first, total = [], []
+        with FakeBingServer(config) as server:
+            for i in range(runs):
+                reset_state(server)
+                save_dir = os.path.join(work_dir, f"run{i}")
+                cache = PreviewCache(os.path.join(save_dir, ".thumbs"))
+                frames = []
+                started = time.perf_counter()
+                progressive = ProgressivePreview(cache, save_dir, 620, 349, 1.0,
+                                                 lambda p: p["kind"] == "partial" and frames.append(time.perf_counter()))
+                with DownloadProgress.subscribe(progressive.on_progress):
+                    save_path, _ = WallpaperUtils.ensure_today(save_dir)
+                cache.render(save_path, 620, 349)
+                done = time.perf_counter()
+                total.append((done - started) * 1000)
+                first.append(((frames[0] if frames else done) - started) * 1000)
+        return {"preview_first_pixel": summarize(first, "ms", bytes=len(data)),
+                "preview_total": summarize(total, "ms", bytes=len(data))}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def bench_cleanup(counts):
+    results = {}
+    for count in counts:
+        root = tempfile.mkdtemp(prefix="bing_bench_cleanup_")
+        try:
+            make_tree(root, count)
+            WallpaperStore._instances.clear()
+            report = RetentionPolicy(keep_days=30).apply(root, today=TODAY)
+            results[f"cleanup_{count}"] = summarize([report["seconds"] * 1000], "ms", files=count,
+                                                    removed=report["removed"])
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+    return results
+
+def bench_check_update(server, runs):
+    # 首次请求与带 ETag 的条件请求(304)分别计时，状态文件放在临时目录
+    if not HAS_PACKAGING:
+        return None
+    full, conditional = [], []
+    for _ in range(runs):
+        reset_state(server)
+        state_dir = tempfile.mkdtemp(prefix="bing_bench_update_")
+        try:
+            checker = UpdateChecker(state_path=os.path.join(state_dir, "update.json"))
+            full.append(timed(lambda: checker.check("1.4.0", force=True)))
+            conditional.append(timed(lambda: checker.check("1.4.0", force=True)))
+        finally:
+            shutil.rmtree(state_dir, ignore_errors=True)
+    return {"check_update": summarize(full, "ms"), "check_update_304": summarize(conditional, "ms")}
+
+def bench_apply(runs):
+    # 使用记录型后端: 首次应用、未变化时的跳过、同路径重写但内容相同时的跳过(索引重新计算一次哈希)
+    work_dir = tempfile.mkdtemp(prefix="bing_bench_apply_")
+    saved = WallpaperApplier.backend, WallpaperApplier.state_path
+    try:
+        image_path = os.path.join(work_dir, "20260101_UHD.jpg")
+        with open(image_path, 'wb') as f:
+            f.write(os.urandom(4 * 1024 * 1024))
+        # 与下载后一致: 图片已登记在索引中，哈希取自索引
+        WallpaperStore.open(work_dir).ensure_hash(os.path.basename(image_path))
+        first, skip, rewritten = [], [], []
+        for i in range(runs):
+            WallpaperApplier.backend = RecordingBackend()
+            WallpaperApplier.state_path = os.path.join(work_dir, f"wallpaper{i}.json")
+            first.append(WallpaperApplier.apply(image_path)["ms"])
+            skip.append(WallpaperApplier.apply(image_path)["ms"])
+            os.utime(image_path)
+            rewritten.append(WallpaperApplier.apply(image_path)["ms"])
+        calls = len(WallpaperApplier.backend.calls)
+        return {"apply": summarize(first, "ms"), "apply_skip": summarize(skip, "ms", backend_calls=calls),
+                "apply_skip_rehash": summarize(rewritten, "ms")}
+    finally:
+        WallpaperApplier.backend, WallpaperApplier.state_path = saved
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def git_revision():
+    try:
+        proc = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+        return proc.stdout.strip() or None
+    except OSError:
+        return None
+
+def compare(current, baseline, threshold):
+    # 同名且同单位的指标按中位数比较，返回退化列表
+    regressions = []
+    for name, result in sorted(current["results"].items()):
+        old = baseline.get("results", {}).get(name)
+        if not old or old.get("unit") != result["unit"] or not old.get("median"):
+            continue
+        change = (result["median"] - old["median"]) / old["median"]
+        worse = -change if HIGHER_IS_BETTER[result["unit"]] else change
+        flag = "退化" if worse > threshold else ""
+        print(f"  {name:<20} {old['median']:>10.2f} -> {result['median']:>10.2f} {result['unit']:<5} "
+              f"({change * 100:+6.1f}%) {flag}")
+        if worse > threshold:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Bing 壁纸基准测试套件")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--bandwidth-mbps", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--image-mb", type=float, default=4)
+    parser.add_argument("--no-ranges", action="store_true")
+    parser.add_argument("--slow-bandwidth-mbps", type=float, default=1, help="预览首次出图测量使用的限速")
+    parser.add_argument("--cleanup-counts", default="1000,10000,30000")
+    parser.add_argument("--backfill-days", type=int, default=365, help="补全基准中替身存档的天数")
+    parser.add_argument("--output", default=None, help="结果文件路径(默认 benchmarks/results/<时间>.json)")
+    parser.add_argument("--compare", default=None, help="与之对比的旧结果文件")
+    parser.add_argument("--threshold", type=float, default=0.2, help="判定退化的相对变化阈值")
+    args = parser.parse_args()
+
+    config = ServerConfig(latency_ms=args.latency_ms, bandwidth_mbps=args.bandwidth_mbps,
+                          error_rate=args.error_rate, image_size=int(args.image_mb * 1024 * 1024),
+                          ranges=not args.no_ranges, seed=0)
+    # 基准中不真正设置桌面壁纸；壁纸状态与索引等内部状态都放在临时的应用数据目录
+    state_dir = tempfile.mkdtemp(prefix="bing_bench_state_")
+    os.environ["XDG_STATE_HOME"] = os.environ["LOCALAPPDATA"] = state_dir
+    WallpaperApplier.backend = RecordingBackend()
+    WallpaperApplier.state_path = os.path.join(state_dir, "wallpaper.json")
+
+    results = {}
+    with FakeBingServer(config) as server:
+        results["daily_run"] = bench_daily_run(server, args.runs)
+        results["download"] = bench_download(server, args.runs)
+        results.update(bench_check_update(server, args.runs) or {})
+    results.update(bench_apply(args.runs))
+    results.update(bench_backfill(args.latency_ms, args.backfill_days, min(args.runs, 3)))
+    results.update(bench_preview(args.runs) or {})
+    results.update(bench_progressive_preview(args.runs, args.latency_ms, args.slow_bandwidth_mbps) or {})
+    results.update(bench_cleanup([int(c) for c in args.cleanup_counts.split(",") if c.strip()]))
+    shutil.rmtree(state_dir, ignore_errors=True)
+
+    report = {"schema": SCHEMA, "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+              "git_rev": git_revision(), "python": platform.python_version(), "platform": platform.platform(),
+              "runs": args.runs, "server": config.as_dict(), "results": results}
+    for name, result in results.items():
+        print(f"{name:<20} 中位 {result['median']:>10.2f} {result['unit']:<5} p95 {result['p95']:>10.2f}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get("server") != report["server"]:
+            print("注意: 两次运行的服务器参数不同，结果仅供参考")
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"以下指标退化超过 {args.threshold * 100:.0f}%: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,31 +1,31 @@
+import time
+_STARTED_AT = time.perf_counter()
+
 import sys
 import os
-import datetime
-import getpass
+
+# 无界面模式在导入 PyQt5 之前分流，开机自启只需下载并应用壁纸
+if __name__ == "__main__" and "--headless" in sys.argv[1:]:
+    from wallpaper_core import run_headless
+    sys.exit(run_headless(sys.argv[1:], started_at=_STARTED_AT))
+
 import ctypes
-import webbrowser
-import re
-import json
-
-try:
-    import urllib3
-    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-except ImportError:
-    pass
-
-try:
-    from packaging import version
-    HAS_PACKAGING = True
-except ImportError:
-    HAS_PACKAGING = False
-
-import requests
+import threading
+import datetime
+from collections import OrderedDict
+
+from wallpaper_core import (WallpaperUtils, WallpaperStore, RetentionPolicy, RolloverScheduler, VariantSelector,
+                            DisplayFitter, DownloadProgress, PeerCache, PeerServer, Metrics, TaskPool, Deadline,
+                            HAS_PACKAGING, AUTO_RUN_MAX_ATTEMPTS, app_data_dir, default_save_dir,
+                            file_sha256, mark_milestone, milestone_ms, parse_markets)
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                             QHBoxLayout, QPushButton, QLabel, QCheckBox, 
                             QFrame, QMessageBox, QSystemTrayIcon,
-                            QMenu, QAction, QGraphicsDropShadowEffect, QStyle)
-from PyQt5.QtCore import Qt, QTimer, QSettings, QSize, QPoint, QThread, pyqtSignal, QObject
-from PyQt5.QtGui import QIcon, QPixmap, QImage, QColor, QFont, QPainter, QPainterPath
+                            QMenu, QAction, QGraphicsDropShadowEffect, QStyle, QListView, QProgressBar)
+from PyQt5.QtCore import (Qt, QEvent, QTimer, QSettings, QSize, QPoint, QRect, pyqtSignal, QObject,
+                          QAbstractListModel, QModelIndex, QBuffer, QIODevice)
+from PyQt5.QtGui import (QIcon, QPixmap, QPixmapCache, QImage, QImageReader, QColor, QFont, QPainter,
+                         QPainterPath)
 
 # ==========================================
 # 0. 核心工具函数 - 修复图标路径问题
@@ -37,90 +37,426 @@ def resource_path(relative_path):
     base_path = os.path.dirname(os.path.abspath(__file__))
     return os.path.join(base_path, relative_path)
 
+def open_url(url):
+    # 仅在点击链接时才需要 webbrowser
+    import webbrowser
+    webbrowser.open(url)
+
+def trim_memory():
+    # 常驻托盘时把已释放的内存还给系统: Windows 收缩工作集，Linux 让 glibc 归还空闲堆
+    import gc
+    gc.collect()
+    try:
+        if sys.platform.startswith('win'):
+            # (HANDLE)-1 即 GetCurrentProcess() 返回的当前进程伪句柄
+            ctypes.windll.psapi.EmptyWorkingSet(ctypes.c_void_p(-1))
+        else:
+            ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
 # ==========================================
-# 1. 业务逻辑
+# 1. 预览缓存
 # ==========================================
-class WallpaperUtils:
-    @staticmethod
-    def get_bing_url():
-        url = "https://cn.bing.com/HPImageArchive.aspx?format=js&idx=0&n=1&mkt=zh-CN"
-        response = requests.get(url, verify=False, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        imgurl_base = data['images'][0]['urlbase']
-        return f"https://cn.bing.com{imgurl_base}_UHD.jpg"
+class PreviewCache:
+    # 由原图生成预览缩略图，按原图内容哈希缓存在磁盘上；
+    # 圆角合成后的成品按 (哈希, 尺寸, 缩放比) 缓存在内存中
+    MAX_ENTRIES = 16
+    MEMO_ENTRIES = 4
 
-    @staticmethod
-    def download_image(url, save_path):
-        response = requests.get(url, verify=False, stream=True, timeout=30)
-        response.raise_for_status()
-        with open(save_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk: f.write(chunk)
-        return save_path
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self._hash_memo = {}
+        self._rendered = OrderedDict()
+        self._lock = threading.Lock()
 
-    @staticmethod
-    def set_wallpaper_api(image_path):
-        abs_path = os.path.abspath(image_path)
-        if not os.path.exists(abs_path):
-            raise FileNotFoundError("壁纸文件未找到")
-        SPI_SETDESKWALLPAPER = 20
-        ctypes.windll.user32.SystemParametersInfoW(SPI_SETDESKWALLPAPER, 0, abs_path, 3)
+    file_hash = staticmethod(file_sha256)
 
-    @staticmethod
-    def clean_old_wallpapers(save_dir):
-        today = datetime.date.today()
-        count = 0
-        if not os.path.exists(save_dir): return 0
-        for filename in os.listdir(save_dir):
-            if filename.endswith("_UHD.jpg"):
-                try:
-                    date_str = filename.split("_")[0]
-                    file_date = datetime.datetime.strptime(date_str, "%Y%m%d").date()
-                    if file_date != today:
-                        os.remove(os.path.join(save_dir, filename))
-                        count += 1
-                except: pass
-        return count
+    def image_hash(self, path):
+        st = os.stat(path)
+        memo_key = (path, st.st_mtime_ns, st.st_size)
+        digest = self._hash_memo.get(memo_key)
+        if digest is None:
+            digest = self.file_hash(path)
+            self._hash_memo[memo_key] = digest
+        return digest
+
+    def get(self, image_path, width, height, digest=None):
+        digest = digest or self.image_hash(image_path)
+        thumb_path = os.path.join(self.cache_dir, f"{digest[:32]}_{width}x{height}.jpg")
+        if not os.path.exists(thumb_path):
+            # JPEG 按缩小尺寸解码，无需先解码完整的 UHD 图像
+            reader = QImageReader(image_path)
+            size = reader.size()
+            if size.isValid():
+                reader.setScaledSize(size.scaled(width, height, Qt.KeepAspectRatioByExpanding))
+            image = reader.read()
+            if image.isNull():
+                raise IOError("预览图生成失败")
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = thumb_path + ".tmp"
+            if not image.save(tmp_path, "JPG", 92):
+                raise IOError("预览图保存失败")
+            os.replace(tmp_path, thumb_path)
+            self._prune()
+        with open(thumb_path, 'rb') as f:
+            return f.read()
+
+    def render(self, image_path, width, height, dpr=1.0, radius=16, digest=None):
+        # 在工作线程中完成解码、缩放与圆角合成，返回可直接显示的 QImage
+        digest = digest or self.image_hash(image_path)
+        key = (digest, width, height, dpr)
+        with self._lock:
+            if key in self._rendered:
+                self._rendered.move_to_end(key)
+                return key, self._rendered[key]
+
+        pixel_w, pixel_h = round(width * dpr), round(height * dpr)
+        with Metrics.span("decode_scale", width=pixel_w, height=pixel_h):
+            source = QImage()
+            if not source.loadFromData(self.get(image_path, pixel_w, pixel_h, digest)):
+                raise IOError("预览图解码失败")
+            scaled = source.scaled(pixel_w, pixel_h, Qt.KeepAspectRatioByExpanding, Qt.SmoothTransformation)
+
+        rounded = self.rounded(scaled, radius, dpr)
+        with self._lock:
+            self._rendered[key] = rounded
+            while len(self._rendered) > self.MEMO_ENTRIES:
+                self._rendered.popitem(last=False)
+        return key, rounded
+
+    def render_partial(self, data, width, height, dpr=1.0, radius=16):
+        # 解码仍在下载中的图片(文件开头的连续部分)，尚未到达的行由解码器填充为灰色
+        pixel_w, pixel_h = round(width * dpr), round(height * dpr)
+        buffer = QBuffer()
+        buffer.setData(data)
+        buffer.open(QIODevice.ReadOnly)
+        reader = QImageReader(buffer, b"jpg")
+        size = reader.size()
+        if not size.isValid():
+            return None
+        reader.setScaledSize(size.scaled(pixel_w, pixel_h, Qt.KeepAspectRatioByExpanding))
+        image = reader.read()
+        if image.isNull():
+            return None
+        return self.rounded(image.scaled(pixel_w, pixel_h, Qt.KeepAspectRatioByExpanding, Qt.FastTransformation),
+                            radius, dpr)
 
     @staticmethod
-    def check_update(current_ver):
-        if not HAS_PACKAGING:
-            return False, "库缺失", ""
-        api_url = "https://api.github.com/repos/QsSama-W/wallpaper-win/releases/latest"
-        response = requests.get(api_url, verify=True, timeout=5)
-        response.raise_for_status()
-        info = response.json()
-        latest_tag = re.sub(r'^v', '', info.get('tag_name', ''))
-        
-        if version.parse(latest_tag) > version.parse(current_ver):
-            return True, latest_tag, info.get('html_url')
-        return False, latest_tag, ""
+    def rounded(image, radius, dpr):
+        result = QImage(image.size(), QImage.Format_ARGB32_Premultiplied)
+        result.fill(Qt.transparent)
+        painter = QPainter(result)
+        painter.setRenderHint(QPainter.Antialiasing)
+        path = QPainterPath()
+        path.addRoundedRect(0, 0, image.width(), image.height(), radius * dpr, radius * dpr)
+        painter.setClipPath(path)
+        painter.drawImage(0, 0, image)
+        painter.end()
+        result.setDevicePixelRatio(dpr)
+        return result
+
+    def clear_memory(self):
+        with self._lock:
+            self._rendered.clear()
+            self._hash_memo.clear()
+
+    def _prune(self):
+        try:
+            entries = sorted(os.scandir(self.cache_dir), key=lambda e: e.stat().st_mtime, reverse=True)
+            for entry in entries[self.MAX_ENTRIES:]:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+class ProgressivePreview:
+    # 今日壁纸下载过程中逐步显示已到达的部分: 进度按 DownloadProgress 的节流频率转发，
+    # 局部解码只在连续部分跨过较粗的步长时进行，且同一时间最多一个，不占用下载线程
+    STEPS = 8
+    MIN_PREFIX = 32 * 1024
+    MIN_INTERVAL = 0.25
+
+    def __init__(self, cache, save_dir, width, height, dpr, emit, cancel=None):
+        self.cache = cache
+        self.save_dir = os.path.abspath(save_dir)
+        self.size = (width, height, dpr)
+        self.emit = emit
+        self.cancel = cancel
+        self.today = datetime.date.today().strftime("%Y%m%d")
+        self._lock = threading.Lock()
+        self._step = -1
+        self._decoding = False
+        self._decoded_at = 0.0
+
+    def accepts(self, event):
+        name = os.path.basename(event["save_path"])
+        return (os.path.dirname(os.path.abspath(event["save_path"])) == self.save_dir
+                and name.startswith(self.today) and WallpaperStore.PRIMARY_RE.match(name) is not None)
+
+    def on_progress(self, event):
+        if (self.cancel is not None and self.cancel.cancelled) or not self.accepts(event) or not event["total"]:
+            return
+        self.emit({"kind": "progress", "done": event["done"], "total": event["total"]})
+        if event["finished"] or event["prefix"] < self.MIN_PREFIX:
+            return
+        step = event["prefix"] * self.STEPS // event["total"]
+        now = time.monotonic()
+        with self._lock:
+            if self._decoding or step <= self._step or now - self._decoded_at < self.MIN_INTERVAL:
+                return
+            self._step, self._decoding = step, True
+        threading.Thread(target=self._decode, args=(event,), name="ProgressivePreview", daemon=True).start()
+
+    def _decode(self, event):
+        try:
+            with open(event["part_path"], 'rb') as f:
+                data = f.read(event["prefix"])
+            image = self.cache.render_partial(data, *self.size)
+            if image is not None and not (self.cancel is not None and self.cancel.cancelled):
+                self.emit({"kind": "partial", "image": image, "fraction": event["prefix"] / event["total"]})
+        except OSError:
+            # 下载已完成并改名，由完整预览接替
+            pass
+        finally:
+            with self._lock:
+                self._decoding = False
+                self._decoded_at = time.monotonic()
+
+# ==========================================
+# 2. 后台任务
+# ==========================================
+TASK_PRIORITIES = {
+    "apply": TaskPool.PRIORITY_APPLY,
+    "history": TaskPool.PRIORITY_APPLY,
+    "preview": TaskPool.PRIORITY_PREVIEW,
+    "update": TaskPool.PRIORITY_UPDATE,
+    "revalidate": TaskPool.PRIORITY_UPDATE,
+}
+
+class TaskBridge(QObject):
+    # 任务池线程完成任务后经信号切回主线程；progress 转发任务进行中的中间结果
+    done = pyqtSignal(object, object, object)
+    progress = pyqtSignal(object)
 
 # ==========================================
-# 2. 线程 Worker
+# 3. 历史壁纸
 # ==========================================
-class WorkerSignals(QObject):
-    finished = pyqtSignal(object)
-    error = pyqtSignal(str)
+class ThumbnailLoader(QObject):
+    # 后台线程生成历史缩略图: JPEG 按缩小尺寸解码，结果持久缓存在 save_dir/.gallery；
+    # 请求后进先出，快速滚动时优先生成当前可见的格子，积压过多时丢弃最早的请求
+    ready = pyqtSignal(str, QImage)
+    failed = pyqtSignal(str)
+    CACHE_DIR = ".gallery"
+    MAX_PENDING = 128
+    MAX_FILES = 5000
+    WORKERS = 2
 
-class Worker(QThread):
-    def __init__(self, task_func, *args, **kwargs):
+    def __init__(self, save_dir, size):
         super().__init__()
-        self.task_func = task_func
-        self.args = args
-        self.kwargs = kwargs
-        self.signals = WorkerSignals()
+        self.save_dir = save_dir
+        self.cache_dir = os.path.join(save_dir, self.CACHE_DIR)
+        self.size = size
+        self._pending = OrderedDict()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.generated = 0
+        for i in range(self.WORKERS):
+            threading.Thread(target=self._work, name=f"Thumbnail-{i}", daemon=True).start()
+
+    def request(self, filename):
+        with self._cond:
+            if filename in self._pending:
+                self._pending.move_to_end(filename)
+                return
+            self._pending[filename] = True
+            while len(self._pending) > self.MAX_PENDING:
+                self._pending.popitem(last=False)
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._pending.clear()
+            self._cond.notify_all()
+
+    def cache_path(self, filename, st):
+        # 以文件名 + 修改时间为键，无需为旧文件计算哈希
+        stem = os.path.splitext(filename)[0]
+        return os.path.join(self.cache_dir,
+                            f"{stem}_{st.st_mtime_ns:x}_{self.size.width()}x{self.size.height()}.jpg")
 
-    def run(self):
+    def load(self, filename):
+        path = os.path.join(self.save_dir, filename)
+        thumb_path = self.cache_path(filename, os.stat(path))
+        if os.path.exists(thumb_path):
+            image = QImage(thumb_path)
+            if not image.isNull():
+                return image
+        reader = QImageReader(path)
+        size = reader.size()
+        if size.isValid():
+            reader.setScaledSize(size.scaled(self.size, Qt.KeepAspectRatioByExpanding))
+        image = reader.read()
+        if image.isNull():
+            raise IOError("缩略图生成失败")
+        w, h = self.size.width(), self.size.height()
+        image = image.copy(QRect((image.width() - w) // 2, (image.height() - h) // 2, w, h))
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = thumb_path + ".tmp"
+        if image.save(tmp_path, "JPG", 85):
+            os.replace(tmp_path, thumb_path)
+        self.generated += 1
+        return image
+
+    def prune(self):
+        # 打开图库时执行一次，仅保留最近使用的 MAX_FILES 个缩略图
         try:
-            result = self.task_func(*self.args, **self.kwargs)
-            self.signals.finished.emit(result)
-        except Exception as e:
-            self.signals.error.emit(str(e))
+            entries = sorted(os.scandir(self.cache_dir), key=lambda e: e.stat().st_atime, reverse=True)
+        except OSError:
+            return
+        for entry in entries[self.MAX_FILES:]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                filename, _ = self._pending.popitem(last=True)
+            try:
+                self.ready.emit(filename, self.load(filename))
+            except Exception:
+                self.failed.emit(filename)
+
+class HistoryModel(QAbstractListModel):
+    # 按需分页读取索引中的历史记录，只为视图实际绘制的格子请求缩略图；
+    # 内存中的记录页与缩略图都按 LRU 限量
+    PAGE_SIZE = 200
+    MAX_PAGES = 8
+    MAX_PIXMAPS = 256
+    FilenameRole = Qt.UserRole + 1
+
+    def __init__(self, store, loader, placeholder):
+        super().__init__()
+        self.store = store
+        self.loader = loader
+        self.placeholder = placeholder
+        self._count = 0
+        self._pages = OrderedDict()
+        self._rows = {}
+        self._pixmaps = OrderedDict()
+        self._failed = set()
+        loader.ready.connect(self.on_thumbnail)
+        loader.failed.connect(self._failed.add)
+
+    def refresh(self):
+        self.beginResetModel()
+        self._pages.clear()
+        self._rows.clear()
+        self._failed.clear()
+        self._count = self.store.count()
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._count
+
+    def record(self, row):
+        page = row // self.PAGE_SIZE
+        rows = self._pages.get(page)
+        if rows is None:
+            rows = self._pages[page] = self.store.history(limit=self.PAGE_SIZE, offset=page * self.PAGE_SIZE)
+            for i, rec in enumerate(rows):
+                self._rows[rec["filename"]] = page * self.PAGE_SIZE + i
+            while len(self._pages) > self.MAX_PAGES:
+                _, old_rows = self._pages.popitem(last=False)
+                for rec in old_rows:
+                    self._rows.pop(rec["filename"], None)
+        else:
+            self._pages.move_to_end(page)
+        index = row - page * self.PAGE_SIZE
+        return rows[index] if index < len(rows) else None
+
+    def data(self, index, role=Qt.DisplayRole):
+        rec = self.record(index.row()) if index.isValid() else None
+        if rec is None:
+            return None
+        name = rec["filename"]
+        if role == Qt.DecorationRole:
+            pixmap = self._pixmaps.get(name)
+            if pixmap is not None:
+                self._pixmaps.move_to_end(name)
+                return pixmap
+            if name not in self._failed:
+                self.loader.request(name)
+            return self.placeholder
+        if role == Qt.DisplayRole:
+            date = rec["date"]
+            return f"{date[:4]}-{date[4:6]}-{date[6:]}"
+        if role == Qt.ToolTipRole:
+            return rec["title"] or name
+        if role == self.FilenameRole:
+            return name
+        return None
+
+    def on_thumbnail(self, filename, image):
+        self._pixmaps[filename] = QPixmap.fromImage(image)
+        while len(self._pixmaps) > self.MAX_PIXMAPS:
+            self._pixmaps.popitem(last=False)
+        row = self._rows.get(filename)
+        if row is not None:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+class HistoryWindow(QWidget):
+    # 虚拟化的历史壁纸网格: QListView 只绘制可见格子，不为每张图片创建控件；单击应用该壁纸
+    apply_requested = pyqtSignal(str)
+    THUMB_SIZE = QSize(192, 108)
+
+    def __init__(self, save_dir, parent=None):
+        super().__init__(parent, Qt.Window)
+        self.setWindowTitle("历史壁纸")
+        self.resize(700, 560)
+        self.loader = ThumbnailLoader(save_dir, self.THUMB_SIZE)
+        placeholder = QPixmap(self.THUMB_SIZE)
+        placeholder.fill(QColor(0, 0, 0, 20))
+        self.model = HistoryModel(WallpaperStore.open(save_dir), self.loader, placeholder)
+
+        self.view = QListView()
+        self.view.setViewMode(QListView.IconMode)
+        self.view.setResizeMode(QListView.Adjust)
+        self.view.setMovement(QListView.Static)
+        self.view.setUniformItemSizes(True)
+        self.view.setIconSize(self.THUMB_SIZE)
+        self.view.setGridSize(QSize(self.THUMB_SIZE.width() + 16, self.THUMB_SIZE.height() + 32))
+        self.view.setVerticalScrollMode(QListView.ScrollPerPixel)
+        self.view.setSelectionMode(QListView.SingleSelection)
+        self.view.setModel(self.model)
+        self.view.clicked.connect(lambda index: self.apply_requested.emit(index.data(HistoryModel.FilenameRole)))
+
+        hint = QLabel("单击缩略图即可应用该壁纸")
+        hint.setStyleSheet("color: #8E8E93;")
+        layout = QVBoxLayout(self)
+        layout.addWidget(hint)
+        layout.addWidget(self.view)
+        threading.Thread(target=self.loader.prune, daemon=True).start()
+
+    def showEvent(self, event):
+        self.model.refresh()
+        super().showEvent(event)
+
+    def closeEvent(self, event):
+        self.hide()
+        event.ignore()
+        if self.parent() is not None:
+            QTimer.singleShot(0, self.parent().maybe_exit)
 
 # ==========================================
-# 3. UI 组件
+# 4. UI 组件
 # ==========================================
 class ModernButton(QPushButton):
     def __init__(self, text, color="#007AFF", parent=None):
@@ -171,24 +507,65 @@ class ModernCheckBox(QCheckBox):
         """)
 
 # ==========================================
-# 4. 主程序
+# 5. 主程序
 # ==========================================
+# 隐藏到托盘后多久释放界面资源，避免频繁显示/隐藏时反复重建
+RESIDENT_RELEASE_DELAY_MS = 5000
+# 由完成日志结束的运行在多久后于后台校验今日元数据
+REVALIDATE_DELAY_MS = 30 * 1000
+
 class BingWallpaperApp(QMainWindow):
     def __init__(self):
         super().__init__()
         self.current_version = "1.4.0" 
-        self.username = getpass.getuser()
-        self.save_dir = os.path.join(f"C:\\Users\\{self.username}", "Pictures", "bing_wallpaper")
+        self.save_dir = default_save_dir()
         
         self.images_dir = resource_path("images")
         
         self.settings = QSettings("BingWallpaper", "Manager")
+        Metrics.configure(os.path.join(app_data_dir(), "logs", "metrics.jsonl"),
+                          prom_path=self.settings.value("prom_textfile") or None)
+        self.configure_variant()
+        QApplication.instance().screenAdded.connect(self.configure_variant)
+        QApplication.instance().screenRemoved.connect(self.configure_variant)
+        PeerCache.configure(self.settings.value("peers", ""))
+        self.peer_server = None
+        if self._get_bool_setting("peer_serve", False):
+            try:
+                port = self._get_int_setting("peer_port", PeerServer.PORT)
+                self.peer_server = PeerServer(self.save_dir, port=port).start()
+            except OSError:
+                pass
         
-        self.preview_worker = None
-        self.download_worker = None
-        self.update_worker = None
-        self.is_download_running = False
-        self.is_preview_running = False
+        self.task_bridge = TaskBridge()
+        self.task_bridge.done.connect(self.on_task_done)
+        self.task_bridge.progress.connect(self.on_preview_progress)
+        self.task_pool = TaskPool(on_done=self.task_bridge.done.emit)
+        self.running_tasks = {}
+        self.update_checked = False
+        self.exit_requested = False
+        self.exit_delay_ms = 0
+        self.auto_attempt = 0
+        self.scheduler = RolloverScheduler(None)
+        self.rollover_timer = None
+        self.preview_cache = PreviewCache(os.path.join(self.save_dir, ".thumbs"))
+        self.preview_key = None
+        self.preview_pixmaps = {}
+        self.preview_paint_t0 = None
+        self.preview_latency_ms = None
+        # 从开始刷新到首次显示出画面(含下载中的局部画面)与显示完整预览的耗时
+        self.preview_started_at = None
+        self.preview_paint_kind = None
+        self.preview_first_pixel_ms = None
+        self.history_window = None
+        # 低占用常驻: 隐藏到托盘后释放阴影、预览图、样式表等可重建的资源
+        self.low_footprint = self._get_bool_setting("low_footprint", True)
+        self.ui_released = False
+        self.saved_styles = []
+        self.preview_deferred = False
+        self.release_timer = QTimer(self)
+        self.release_timer.setSingleShot(True)
+        self.release_timer.timeout.connect(self.release_ui_resources)
         
         self.shadow_margin = 25
         self.content_width = 680
@@ -220,12 +597,13 @@ class BingWallpaperApp(QMainWindow):
             
         self.hide()
         self.tray_icon.show()
+        mark_milestone("tray_icon")
         
-        QTimer.singleShot(500, self.start_refresh_preview)
-        QTimer.singleShot(2000, self.start_auto_download)
-        
-        if self.auto_update_chk.isChecked():
-            QTimer.singleShot(5000, self.start_check_update)
+        # 不再使用固定延时: 预览与自动下载立即开始(二者共享同一次元数据请求与下载)，
+        # 更新检查在下载结束后进行，避免与壁纸下载争抢带宽
+        QTimer.singleShot(0, self.report_startup_metrics)
+        QTimer.singleShot(0, self.start_refresh_preview)
+        QTimer.singleShot(0, self.start_auto_download)
 
     def setup_ui(self):
         base_widget = QWidget()
@@ -243,11 +621,7 @@ class BingWallpaperApp(QMainWindow):
             }
         """)
         
-        shadow = QGraphicsDropShadowEffect(self)
-        shadow.setBlurRadius(30)
-        shadow.setColor(QColor(0, 0, 0, 40))
-        shadow.setYOffset(10)
-        self.container.setGraphicsEffect(shadow)
+        self.apply_shadow()
         main_layout.addWidget(self.container)
         
         self.content_layout = QVBoxLayout(self.container)
@@ -260,6 +634,13 @@ class BingWallpaperApp(QMainWindow):
         self.setup_settings_area()
         self.setup_footer()
 
+    def apply_shadow(self):
+        shadow = QGraphicsDropShadowEffect(self)
+        shadow.setBlurRadius(30)
+        shadow.setColor(QColor(0, 0, 0, 40))
+        shadow.setYOffset(10)
+        self.container.setGraphicsEffect(shadow)
+
     def setup_header(self):
         header = QHBoxLayout()
         titles = QVBoxLayout()
@@ -306,7 +687,21 @@ class BingWallpaperApp(QMainWindow):
         self.preview_label.setAlignment(Qt.AlignCenter)
         self.preview_label.setStyleSheet("color: #aeaeb2; border-radius: 16px;")
         
+        self.preview_label.installEventFilter(self)
+        
         p_layout.addWidget(self.preview_label)
+
+        # 下载进度条叠放在预览底部，不参与布局
+        self.preview_progress = QProgressBar(self.preview_container)
+        self.preview_progress.setGeometry(24, self.preview_container.height() - 14,
+                                          self.preview_container.width() - 48, 4)
+        self.preview_progress.setTextVisible(False)
+        self.preview_progress.setRange(0, 100)
+        self.preview_progress.setStyleSheet("""
+            QProgressBar { background: rgba(0,0,0,0.08); border: none; border-radius: 2px; }
+            QProgressBar::chunk { background: #007AFF; border-radius: 2px; }
+        """)
+        self.preview_progress.hide()
         self.content_layout.addWidget(self.preview_container)
 
     def setup_action_buttons(self):
@@ -354,23 +749,28 @@ class BingWallpaperApp(QMainWindow):
         self.btn_update_chk = QPushButton("检查更新")
         self.btn_update_chk.setCursor(Qt.PointingHandCursor)
         self.btn_update_chk.setStyleSheet("border:none; color:#007AFF; font-weight:bold;")
-        self.btn_update_chk.clicked.connect(self.start_check_update)
+        self.btn_update_chk.clicked.connect(lambda: self.start_check_update(force=True))
         
         icon_style = "border:none; padding:4px; border-radius:4px;"
         
         btn_home = QPushButton("") 
         btn_home.setFixedSize(28,28)
         btn_home.setStyleSheet(icon_style)
-        btn_home.clicked.connect(lambda: webbrowser.open("https://ombk.xyz"))
+        btn_home.clicked.connect(lambda: open_url("https://ombk.xyz"))
         
         home_icon_path = os.path.join(self.images_dir, "home.png")
         if os.path.exists(home_icon_path):
             btn_home.setIcon(QIcon(home_icon_path))
         
+        btn_history = QPushButton("历史壁纸")
+        btn_history.setCursor(Qt.PointingHandCursor)
+        btn_history.setStyleSheet("border:none; color:#007AFF; font-weight:bold;")
+        btn_history.clicked.connect(self.show_history)
+
         btn_git = QPushButton("") 
         btn_git.setFixedSize(28,28)
         btn_git.setStyleSheet(icon_style)
-        btn_git.clicked.connect(lambda: webbrowser.open("https://github.com/QsSama-W/wallpaper-win"))
+        btn_git.clicked.connect(lambda: open_url("https://github.com/QsSama-W/wallpaper-win"))
         
         git_icon_path = os.path.join(self.images_dir, "github.png")
         if os.path.exists(git_icon_path):
@@ -378,13 +778,35 @@ class BingWallpaperApp(QMainWindow):
 
         layout.addWidget(self.status_label)
         layout.addStretch()
+        layout.addWidget(btn_history)
         layout.addWidget(self.btn_update_chk)
         layout.addWidget(btn_home)
         layout.addWidget(btn_git)
         self.content_layout.addLayout(layout)
 
+    def run_task(self, kind, func, *args, on_success, on_error, replace=False, **kwargs):
+        handle = self.task_pool.submit(kind, func, *args, priority=TASK_PRIORITIES[kind], replace=replace, **kwargs)
+        self.running_tasks[kind] = (handle, on_success, on_error)
+        return handle
+
+    def task_running(self, kind):
+        return kind in self.running_tasks
+
+    def on_task_done(self, handle, result, error):
+        # 被取代或已取消的任务在任何界面回调之前丢弃
+        entry = self.running_tasks.get(handle.kind)
+        if entry is None or entry[0] is not handle:
+            return
+        del self.running_tasks[handle.kind]
+        if not self.task_pool.is_current(handle):
+            self.maybe_exit()
+            return
+        if error is not None:
+            entry[2](str(error))
+        else:
+            entry[1](result)
+
     def set_ui_busy(self, busy, msg=""):
-        self.is_download_running = busy
         self.btn_apply.setEnabled(not busy)
         self.btn_apply.setText(msg if busy else "下载并应用今日壁纸")
         if busy:
@@ -393,101 +815,154 @@ class BingWallpaperApp(QMainWindow):
             self.status_label.setText("就绪")
 
     def start_refresh_preview(self):
-        if self.is_preview_running: return 
-        self.is_preview_running = True
+        # 新的刷新取代尚未完成的旧刷新，旧结果不会再显示；低占用模式下窗口隐藏时推迟到显示时再生成
+        if self.low_footprint and not self.isVisible():
+            self.preview_deferred = True
+            return
         self.btn_refresh.setEnabled(False)
         self.btn_refresh.setText("刷新中...")
-        self.preview_worker = Worker(self.task_refresh_preview)
-        self.preview_worker.signals.finished.connect(self.on_preview_ready)
-        self.preview_worker.signals.error.connect(self.on_preview_error)
-        self.preview_worker.start()
-
-    def task_refresh_preview(self):
-        url = WallpaperUtils.get_bing_url()
-        preview_url = url.replace("_UHD.jpg", "_1366x768.jpg")
-        resp = requests.get(preview_url, verify=False, timeout=10)
-        resp.raise_for_status()
-        return resp.content
-
-    def on_preview_ready(self, img_data):
-        self.is_preview_running = False
+        self.preview_started_at = time.perf_counter()
+        self.preview_first_pixel_ms = None
+        self.run_task("preview", self.task_refresh_preview,
+                      self.preview_container.width(), self.preview_container.height(),
+                      self.preview_label.devicePixelRatioF(),
+                      on_success=self.on_preview_ready, on_error=self.on_preview_error, replace=True)
+
+    def task_refresh_preview(self, width, height, dpr, cancel=None):
+        # 预览直接由今日原图生成，本地已有时不访问网络
+        deadline = Deadline(WallpaperUtils.DAILY_DEADLINE, cancel=cancel)
+        # 需要下载时(无论由本任务还是自动任务发起)边下载边显示已到达的部分
+        progressive = ProgressivePreview(self.preview_cache, self.save_dir, width, height, dpr,
+                                         self.task_bridge.progress.emit, cancel)
+        with DownloadProgress.subscribe(progressive.on_progress):
+            save_path, _ = WallpaperUtils.ensure_today(self.save_dir, deadline=deadline)
+        deadline.check()
+        digest = WallpaperStore.open(self.save_dir).ensure_hash(os.path.basename(save_path))
+        key, image = self.preview_cache.render(save_path, width, height, dpr, digest=digest)
+        return {"key": key, "image": image, "emitted_at": time.perf_counter()}
+
+    def on_preview_progress(self, payload):
+        # 中间结果在主线程按节流后的频率到达；刷新已结束或界面资源已释放时忽略
+        if not self.task_running("preview") or self.ui_released:
+            return
+        if payload["kind"] == "progress":
+            percent = int(payload["done"] * 100 / payload["total"])
+            self.preview_progress.setValue(percent)
+            self.preview_progress.show()
+            self.btn_refresh.setText(f"刷新中 {percent}%")
+        else:
+            self.preview_label.setPixmap(QPixmap.fromImage(payload["image"]))
+            self.preview_paint_kind = "partial"
+
+    def on_preview_ready(self, result):
         self.btn_refresh.setEnabled(True)
         self.btn_refresh.setText("刷新预览")
+        self.preview_progress.hide()
+        QTimer.singleShot(0, self.maybe_exit)
+        if self.ui_released:
+            self.preview_deferred = True
+            return
         try:
-            image = QImage()
-            image.loadFromData(img_data)
-            pixmap = QPixmap.fromImage(image)
-            
-            container_w = self.preview_container.width()
-            container_h = self.preview_container.height()
-            
-            scaled_pix = pixmap.scaled(container_w, container_h, 
-                                     Qt.KeepAspectRatioByExpanding, Qt.SmoothTransformation)
-            
-            rounded = QPixmap(scaled_pix.size())
-            rounded.fill(Qt.transparent)
+            key = result["key"]
+            if key != self.preview_key:
+                pixmap = self.preview_pixmaps.get(key)
+                if pixmap is None:
+                    pixmap = QPixmap.fromImage(result["image"])
+                    self.preview_pixmaps = {key: pixmap}
+                self.preview_key = key
+                # 仅在窗口可见时统计 信号 -> 绘制 的耗时
+                if self.isVisible():
+                    self.preview_paint_t0 = result["emitted_at"]
+                    self.preview_paint_kind = "final"
+                self.preview_label.setPixmap(pixmap)
             
-            painter = QPainter(rounded)
-            painter.setRenderHint(QPainter.Antialiasing)
-            path = QPainterPath()
-            path.addRoundedRect(0, 0, scaled_pix.width(), scaled_pix.height(), 16, 16)
-            painter.setClipPath(path)
-            painter.drawPixmap(0, 0, scaled_pix)
-            painter.end()
-            
-            self.preview_label.setPixmap(rounded)
-            
-            if not self.is_download_running:
+            if not self.task_running("apply"):
                 self.status_label.setText("预览已更新")
         except Exception as e:
             self.on_preview_error(str(e))
+
+    def eventFilter(self, obj, event):
+        if obj is self.preview_label and event.type() == QEvent.Paint:
+            if self.preview_paint_kind is not None and self.preview_started_at is not None:
+                self.record_preview_paint()
+            if self.preview_paint_t0 is not None:
+                self.preview_latency_ms = (time.perf_counter() - self.preview_paint_t0) * 1000
+                self.preview_paint_t0 = None
+                first = f"，首次出图 {self.preview_first_pixel_ms:.0f} ms" if self.preview_first_pixel_ms else ""
+                self.preview_label.setToolTip(f"预览显示耗时 {self.preview_latency_ms:.1f} ms{first}")
+        return super().eventFilter(obj, event)
+
+    def record_preview_paint(self):
+        elapsed = time.perf_counter() - self.preview_started_at
+        kind, self.preview_paint_kind = self.preview_paint_kind, None
+        if self.preview_first_pixel_ms is None:
+            self.preview_first_pixel_ms = elapsed * 1000
+            Metrics.record("preview_first_pixel", elapsed, partial=kind == "partial")
+        if kind == "final":
+            Metrics.record("preview_total", elapsed)
+            self.preview_started_at = None
             
     def on_preview_error(self, err_msg):
-        self.is_preview_running = False
         self.btn_refresh.setEnabled(True)
         self.btn_refresh.setText("刷新预览")
+        self.preview_progress.hide()
+        self.preview_key = None
         self.preview_label.setText("获取预览失败")
+        self.maybe_exit()
 
     def start_manual_download(self):
-        if self.is_download_running: return
+        if self.task_running("apply"): return
         self.set_ui_busy(True, "正在下载")
-        self.download_worker = Worker(self.task_download_set, auto_exit=False)
-        self.download_worker.signals.finished.connect(self.on_download_success)
-        self.download_worker.signals.error.connect(self.on_worker_error)
-        self.download_worker.start()
+        self.run_task("apply", self.task_download_set, auto_exit=False, **self.download_options(),
+                      on_success=self.on_download_success, on_error=self.on_worker_error)
 
     def start_auto_download(self):
-        if self.is_download_running: return 
-        
-        self.is_download_running = True
+        if self.task_running("apply"): return
         self.status_label.setText("自动运行中...")
-        self.download_worker = Worker(self.task_download_set, auto_exit=True)
-        self.download_worker.signals.finished.connect(self.on_download_success)
-        self.download_worker.signals.error.connect(self.on_auto_error)
-        self.download_worker.start()
-
-    def task_download_set(self, auto_exit=False):
-        url = WallpaperUtils.get_bing_url()
-        today = datetime.date.today().strftime("%Y%m%d")
-        filename = f"{today}_UHD.jpg"
-        save_path = os.path.join(self.save_dir, filename)
-        
-        is_new = False
-        if not os.path.exists(save_path):
-            WallpaperUtils.download_image(url, save_path)
-            is_new = True
-            
-        WallpaperUtils.set_wallpaper_api(save_path)
-        
-        cleaned = 0
-        if self.auto_del_chk.isChecked():
-            cleaned = WallpaperUtils.clean_old_wallpapers(self.save_dir)
-            
-        return {"path": save_path, "cleaned": cleaned, "auto": auto_exit, "is_new": is_new}
+        self.run_task("apply", self.task_download_set, auto_exit=True, **self.download_options(),
+                      on_success=self.on_download_success, on_error=self.on_auto_error)
+
+    def download_options(self):
+        # 界面与设置只在主线程读取
+        retention = RetentionPolicy(keep_days=self._get_int_setting("keep_days", 1),
+                                    max_bytes=self._get_int_setting("max_size_mb", 0) * 1024 * 1024)
+        return {"auto_delete": self.auto_del_chk.isChecked(), "retention": retention,
+                "markets": parse_markets(self.settings.value("markets", ""))}
+
+    def task_download_set(self, auto_exit=False, auto_delete=False, markets=None, retention=None, cancel=None):
+        result = WallpaperUtils.run_daily(self.save_dir, auto_delete=auto_delete, markets=markets,
+                                          retention=retention,
+                                          deadline=Deadline(WallpaperUtils.DAILY_DEADLINE, cancel=cancel))
+        result["auto"] = auto_exit
+        result["markets"] = markets
+        return result
+
+    def start_revalidate(self, markets=None):
+        if self.task_running("revalidate"): return
+        self.run_task("revalidate", self.task_revalidate, markets,
+                      on_success=self.on_revalidated, on_error=lambda err_msg: None)
+
+    def task_revalidate(self, markets, cancel=None):
+        return WallpaperUtils.revalidate_today(self.save_dir, markets,
+                                               Deadline(WallpaperUtils.DAILY_DEADLINE, cancel=cancel))
+
+    def on_revalidated(self, result):
+        # 按校验后的切换时间重新定时(日志由索引还原时没有切换时间)
+        if result is not None:
+            self.arm_rollover_timer(result.get('fullstartdate'))
 
     def on_download_success(self, result):
         self.set_ui_busy(False)
-        self.status_label.setText("壁纸设置成功")
+        apply = result.get('apply') or {}
+        if result.get('journal'):
+            self.status_label.setText("今日壁纸已完成，无需联网")
+            # 常驻时稍后在后台校验日志中的元数据，单次运行在此之前已退出
+            QTimer.singleShot(REVALIDATE_DELAY_MS, lambda: self.start_revalidate(result.get('markets')))
+        else:
+            self.status_label.setText("壁纸设置成功" if apply.get('applied', True) else "壁纸未变化，已跳过设置")
+        self.auto_attempt = 0
+        self.arm_rollover_timer(result.get('fullstartdate'))
+        self.start_auto_update_check()
         if result['auto']:
             self.schedule_exit(is_new=result.get('is_new', True))
         else:
@@ -500,46 +975,142 @@ class BingWallpaperApp(QMainWindow):
             QMessageBox.warning(self, "操作失败", str(err_msg))
             
     def on_auto_error(self, err_msg):
-        self.is_download_running = False
+        self.auto_attempt += 1
+        if self.auto_attempt < AUTO_RUN_MAX_ATTEMPTS:
+            # 带抖动的指数退避后重试
+            delay = self.scheduler.backoff_delay(self.auto_attempt)
+            self.status_label.setText(f"自动任务失败，{delay:.0f} 秒后重试: {err_msg}")
+            QTimer.singleShot(int(delay * 1000), self.start_auto_download)
+            return
         self.status_label.setText(f"自动任务失败: {err_msg}")
+        self.start_auto_update_check()
+
+    def arm_rollover_timer(self, fullstartdate=None):
+        # 程序常驻时在 Bing 下次切换图片后自动更新，单次定时无需轮询
+        now = self.scheduler.clock.now()
+        next_run = self.scheduler.next_rollover(now, fullstartdate)
+        delay_ms = int(((next_run - now).total_seconds() + RolloverScheduler.ROLLOVER_GRACE) * 1000)
+        if self.rollover_timer is None:
+            self.rollover_timer = QTimer(self)
+            self.rollover_timer.setSingleShot(True)
+            self.rollover_timer.timeout.connect(self.start_auto_download)
+        # QTimer 间隔为 int 毫秒，最长约 24.8 天
+        self.rollover_timer.start(min(delay_ms, 2 ** 31 - 1))
 
     def schedule_exit(self, is_new=True):
-        self.is_download_running = False
         if is_new:
-            self.status_label.setText("任务完成，1分钟后自动退出")
+            self.status_label.setText("任务完成，即将自动退出")
             self.tray_icon.showMessage("每日必应壁纸", "Bing壁纸已更新，程序即将退出", QSystemTrayIcon.Information, 2000)
+            self.exit_delay_ms = 2000
         else:
             if self.silent_exit_chk.isChecked():
-                self.status_label.setText("壁纸已是最新，静默等待自动退出")
+                self.status_label.setText("壁纸已是最新，静默退出")
             else:
-                self.status_label.setText("壁纸已是最新，1分钟后自动退出")
+                self.status_label.setText("壁纸已是最新，即将自动退出")
                 self.tray_icon.showMessage("每日必应壁纸", "今日壁纸已是最新，程序即将退出", QSystemTrayIcon.Information, 2000)
+                self.exit_delay_ms = 2000
                 
-        QTimer.singleShot(60000, self.on_exit)
+        self.exit_requested = True
+        self.maybe_exit()
+
+    def maybe_exit(self):
+        # 单次运行在所有任务结束后立即退出(仅等待通知显示完毕)；用户打开了主界面时不退出
+        if not self.exit_requested or self.isVisible():
+            return
+        # 开启了局域网共享时常驻托盘继续提供服务，由托盘菜单退出
+        if self.peer_server is not None:
+            return
+        if self.history_window is not None and self.history_window.isVisible():
+            return
+        # 后台校验元数据不阻止退出，退出时随任务池一起取消
+        if any(kind != "revalidate" for kind in self.running_tasks):
+            return
+        self.exit_requested = False
+        QTimer.singleShot(self.exit_delay_ms, self.on_exit)
+
+    def show_history(self):
+        # 图库窗口在首次打开时才创建，不影响启动耗时
+        if self.history_window is None:
+            self.history_window = HistoryWindow(self.save_dir, self)
+            self.history_window.apply_requested.connect(self.start_apply_history)
+        self.history_window.showNormal()
+        self.history_window.raise_()
+        self.history_window.activateWindow()
+
+    def start_apply_history(self, filename):
+        # 连续点击时只应用最后一次选择
+        self.status_label.setText("正在应用历史壁纸...")
+        self.run_task("history", self.task_apply_history, os.path.join(self.save_dir, filename),
+                      on_success=self.on_history_applied, on_error=self.on_history_error, replace=True)
+
+    def task_apply_history(self, image_path, cancel=None):
+        if not os.path.exists(image_path):
+            raise IOError("文件已不存在")
+        WallpaperUtils.set_wallpaper_api(DisplayFitter(self.save_dir).wallpaper_for(image_path))
+        return image_path
 
-    def start_check_update(self):
+    def on_history_applied(self, image_path):
+        self.status_label.setText(f"已应用: {os.path.basename(image_path)}")
+
+    def on_history_error(self, err_msg):
+        self.status_label.setText(f"应用失败: {err_msg}")
+
+    def start_auto_update_check(self):
+        if self.auto_update_chk.isChecked() and not self.update_checked:
+            self.update_checked = True
+            self.start_check_update()
+
+    def start_check_update(self, force=False):
         if not HAS_PACKAGING:
             self.status_label.setText("无法检查更新(缺失库)")
             return
             
+        if self.task_running("update"): return
         self.status_label.setText("检查更新...")
-        self.update_worker = Worker(WallpaperUtils.check_update, self.current_version)
-        self.update_worker.signals.finished.connect(self.on_update_checked)
-        self.update_worker.start()
+        self.run_task("update", self.task_check_update, force,
+                      self._get_int_setting("update_interval_hours", 24),
+                      on_success=self.on_update_checked, on_error=self.on_update_error)
+
+    def task_check_update(self, force, interval_hours, cancel=None):
+        return WallpaperUtils.check_update(self.current_version, force=force, interval_hours=interval_hours)
+
+    def on_update_error(self, err_msg):
+        self.status_label.setText("检查更新失败")
+        self.maybe_exit()
 
     def on_update_checked(self, result):
+        QTimer.singleShot(0, self.maybe_exit)
         has_update, ver, url = result
         if has_update:
             if self.isVisible():
                 btn = QMessageBox.question(self, "发现新版本", f"版本 {ver} 可用，是否去下载？")
                 if btn == QMessageBox.Yes:
-                    webbrowser.open(url)
+                    open_url(url)
             else:
                 self.tray_icon.showMessage("每日必应壁纸", f"发现新版本 {ver} 已发布，点击查看", QSystemTrayIcon.Information, 5000)
+                self.exit_delay_ms = max(self.exit_delay_ms, 5000)
             self.status_label.setText(f"发现新版本: {ver}")
         else:
             self.status_label.setText("当前是最新版本")
 
+    def report_startup_metrics(self, attempt=0):
+        tray_ms = milestone_ms("tray_icon", _STARTED_AT)
+        network_ms = milestone_ms("first_network_request", _STARTED_AT)
+        if network_ms is None and attempt < 30:
+            # 首次联网尚未发生时稍后再统计
+            QTimer.singleShot(1000, lambda: self.report_startup_metrics(attempt + 1))
+        self.startup_metrics = {"tray_icon_ms": tray_ms, "first_network_request_ms": network_ms}
+        self.status_label.setToolTip("启动耗时: 托盘图标 {} ms, 首次联网 {} ms".format(
+            f"{tray_ms:.0f}" if tray_ms is not None else "-",
+            f"{network_ms:.0f}" if network_ms is not None else "-"))
+
+    def configure_variant(self, *_):
+        # 各屏物理像素 = 逻辑尺寸 x 缩放比，在主线程读取后交给下载逻辑选择图片规格
+        displays = [(round(screen.size().width() * screen.devicePixelRatio()),
+                     round(screen.size().height() * screen.devicePixelRatio()))
+                    for screen in QApplication.screens()]
+        VariantSelector.configure(self.settings.value("image_variant", "auto"), displays)
+
     def check_screen_resolution(self):
         geo = QApplication.primaryScreen().geometry()
         return not (geo.width() < 1280 or geo.height() < 720)
@@ -572,6 +1143,8 @@ class BingWallpaperApp(QMainWindow):
         
         menu.addAction("显示主界面", self.showNormal)
         menu.addAction("立即更新壁纸", self.start_manual_download)
+        menu.addAction("收藏今日壁纸(不自动清理)", self.pin_today_wallpaper)
+        menu.addAction("历史壁纸", self.show_history)
         menu.addSeparator()
         menu.addAction("退出", self.on_exit)
         
@@ -579,11 +1152,67 @@ class BingWallpaperApp(QMainWindow):
         self.tray_icon.activated.connect(lambda r: self.showNormal() if r == QSystemTrayIcon.DoubleClick or r == QSystemTrayIcon.Trigger else None)
         self.tray_icon.show()
 
+    def pin_today_wallpaper(self):
+        store = WallpaperStore.open(self.save_dir)
+        name = os.path.basename(WallpaperUtils.today_path(self.save_dir))
+        if store.lookup(name) is None:
+            self.tray_icon.showMessage("每日必应壁纸", "今日壁纸尚未下载", QSystemTrayIcon.Information, 2000)
+            return
+        store.set_pinned(name, True)
+        self.tray_icon.showMessage("每日必应壁纸", "已收藏今日壁纸，自动清理时将保留", QSystemTrayIcon.Information, 2000)
+
+    def showEvent(self, event):
+        self.release_timer.stop()
+        if self.ui_released:
+            self.restore_ui_resources()
+        if self.preview_deferred:
+            self.preview_deferred = False
+            QTimer.singleShot(0, self.start_refresh_preview)
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        if self.low_footprint:
+            self.release_timer.start(RESIDENT_RELEASE_DELAY_MS)
+        super().hideEvent(event)
+
+    def release_ui_resources(self):
+        # 最小化时窗口仍算可见，只在真正隐藏到托盘后释放
+        if self.isVisible() or self.ui_released:
+            return
+        self.ui_released = True
+        # 半透明窗口的阴影每次重绘都要对整个窗口做模糊
+        self.container.setGraphicsEffect(None)
+        self.saved_styles = [(widget, widget.styleSheet())
+                             for widget in [self.container] + self.container.findChildren(QWidget)
+                             if widget.styleSheet()]
+        for widget, _ in self.saved_styles:
+            widget.setStyleSheet("")
+        self.preview_label.clear()
+        self.preview_label.setText("等待获取...")
+        self.preview_pixmaps = {}
+        self.preview_key = None
+        self.preview_deferred = True
+        self.preview_cache.clear_memory()
+        if self.history_window is not None and not self.history_window.isVisible():
+            self.history_window.loader.close()
+            self.history_window.deleteLater()
+            self.history_window = None
+        QPixmapCache.clear()
+        trim_memory()
+
+    def restore_ui_resources(self):
+        self.ui_released = False
+        for widget, style in self.saved_styles:
+            widget.setStyleSheet(style)
+        self.saved_styles = []
+        self.apply_shadow()
+
     def closeEvent(self, e):
         if self.tray_icon.isVisible():
             self.hide()
             self.tray_icon.showMessage("每日必应壁纸", "程序已最小化到托盘", QSystemTrayIcon.Information, 1000)
             e.ignore()
+            self.maybe_exit()
         else: e.accept()
         
     def _get_bool_setting(self, key, default=False):
@@ -594,6 +1223,12 @@ class BingWallpaperApp(QMainWindow):
             return val.lower() == 'true'
         return bool(val)
 
+    def _get_int_setting(self, key, default=0):
+        try:
+            return int(self.settings.value(key, default))
+        except (TypeError, ValueError):
+            return default
+
     def load_settings(self):
         self.auto_del_chk.blockSignals(True)
         self.auto_start_chk.blockSignals(True)
@@ -625,13 +1260,21 @@ class BingWallpaperApp(QMainWindow):
             key_path = r"Software\Microsoft\Windows\CurrentVersion\Run"
             with reg.OpenKey(reg.HKEY_CURRENT_USER, key_path, 0, reg.KEY_SET_VALUE) as key:
                 if enable:
-                    reg.SetValueEx(key, "BingWallpaperManager", 0, reg.REG_SZ, os.path.abspath(sys.argv[0]))
+                    # 开机自启走无界面模式，仅下载并应用壁纸
+                    command = f'"{os.path.abspath(sys.argv[0])}" --headless'
+                    reg.SetValueEx(key, "BingWallpaperManager", 0, reg.REG_SZ, command)
                 else:
                     try: reg.DeleteValue(key, "BingWallpaperManager")
                     except: pass
         except: pass
 
     def on_exit(self):
+        # 中止仍在进行的传输，避免退出时等待网络
+        self.task_pool.shutdown()
+        if self.peer_server is not None:
+            self.peer_server.stop()
+        if self.history_window is not None:
+            self.history_window.loader.close()
         self.tray_icon.hide()
         QApplication.quit()
 
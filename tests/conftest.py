@@ -0,0 +1,52 @@
+# 测试公共夹具: 本地替身服务器，以及每个用例独立的全局状态(缓存、熔断器、状态目录、壁纸后端)
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from fake_bing import FakeBingServer, ServerConfig
+from wallpaper_core import (WallpaperUtils, WallpaperApplier, RecordingBackend, VariantSelector, PeerCache,
+                            DownloadProgress)
+
+@pytest.fixture(autouse=True)
+def isolated_state(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_STATE_HOME", str(tmp_path / "state"))
+    monkeypatch.setenv("LOCALAPPDATA", str(tmp_path / "state"))
+    monkeypatch.setattr(WallpaperUtils, "_session", None)
+    monkeypatch.setattr(WallpaperUtils, "_meta_cache", {})
+    monkeypatch.setattr(WallpaperUtils, "_meta_inflight", {})
+    monkeypatch.setattr(WallpaperUtils, "_download_inflight", {})
+    monkeypatch.setattr(WallpaperUtils, "_fresh_downloads", set())
+    monkeypatch.setattr(WallpaperUtils, "_host_health", {})
+    monkeypatch.setattr(WallpaperApplier, "backend", RecordingBackend())
+    monkeypatch.setattr(WallpaperApplier, "state_path", None)
+    monkeypatch.setattr(VariantSelector, "preference", "UHD")
+    monkeypatch.setattr(VariantSelector, "_displays", [])
+    monkeypatch.setattr(VariantSelector, "_head_cache", {})
+    monkeypatch.setattr(PeerCache, "peers", [])
+    monkeypatch.setattr(DownloadProgress, "_listeners", set())
+
+@pytest.fixture
+def bing(monkeypatch):
+    # bing(**ServerConfig 参数) 启动替身服务器并让 WallpaperUtils 指向它，用例结束时关闭
+    servers = []
+
+    def start(**kwargs):
+        server = FakeBingServer(ServerConfig(**kwargs)).start()
+        servers.append(server)
+        monkeypatch.setattr(WallpaperUtils, "BING_HOST", server.url)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+@pytest.fixture
+def save_dir(tmp_path):
+    path = tmp_path / "wallpapers"
+    path.mkdir()
+    return str(path)
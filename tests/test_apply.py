@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+import wallpaper_core
+from wallpaper_core import WallpaperApplier, WallpaperStore, DisplayFitter
+
+def write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+
+@pytest.fixture
+def indexed_image(save_dir):
+    path = os.path.join(save_dir, "20260101_UHD.jpg")
+    write(path, os.urandom(256 * 1024))
+    store = WallpaperStore.open(save_dir)
+    store.ensure_hash(os.path.basename(path))
+    return path
+
+def no_full_read(monkeypatch):
+    def fail(path):
+        raise AssertionError(f"不应重新读取整张图片: {path}")
+    monkeypatch.setattr(wallpaper_core, "file_sha256", fail)
+
+def test_apply_uses_indexed_hash(indexed_image, monkeypatch):
+    no_full_read(monkeypatch)
+    assert WallpaperApplier.apply(indexed_image)["applied"]
+    result = WallpaperApplier.apply(indexed_image)
+    assert not result["applied"]
+    assert result["skip_rate"] == 0.5
+    assert WallpaperApplier.backend.calls == [indexed_image]
+
+def test_rewritten_file_with_same_content_is_skipped(indexed_image):
+    WallpaperApplier.apply(indexed_image)
+    os.utime(indexed_image, ns=(1, 1))
+    assert not WallpaperApplier.apply(indexed_image)["applied"]
+    write(indexed_image, os.urandom(256 * 1024))
+    assert WallpaperApplier.apply(indexed_image)["applied"]
+    assert len(WallpaperApplier.backend.calls) == 2
+
+def test_fitted_image_is_identified_by_name(save_dir, monkeypatch):
+    no_full_read(monkeypatch)
+    fitted = os.path.join(save_dir, DisplayFitter.CACHE_DIR, "0123456789abcdef_1920x1080.jpg")
+    os.makedirs(os.path.dirname(fitted))
+    write(fitted, b"fitted")
+    WallpaperApplier.apply(fitted)
+    os.utime(fitted, ns=(1, 1))
+    assert not WallpaperApplier.apply(fitted)["applied"]
+
+def test_unindexed_file_is_reapplied_when_rewritten(tmp_path, monkeypatch):
+    no_full_read(monkeypatch)
+    path = str(tmp_path / "custom.jpg")
+    write(path, b"custom")
+    WallpaperApplier.apply(path)
+    assert not WallpaperApplier.apply(path)["applied"]
+    os.utime(path, ns=(1, 1))
+    assert WallpaperApplier.apply(path)["applied"]
@@ -0,0 +1,42 @@
+import datetime
+import os
+
+import pytest
+
+pytest.importorskip("requests")
+
+from wallpaper_core import ArchiveBackfill, WallpaperStore
+
+DAYS = 300
+
+def day(i):
+    return (datetime.date.today() - datetime.timedelta(days=i)).strftime("%Y%m%d")
+
+def test_backfill_pages_through_a_long_archive(bing, save_dir):
+    server = bing(archive_days=DAYS, image_size=16 * 1024)
+    store = WallpaperStore.open(save_dir)
+    for i in (0, 10, 200):
+        path = os.path.join(save_dir, f"{day(i)}_UHD.jpg")
+        with open(path, "wb") as f:
+            f.write(b"existing")
+        store.record_file(path)
+    # 索引中有记录但文件已被删除的日期需要重新补全
+    os.remove(os.path.join(save_dir, f"{day(200)}_UHD.jpg"))
+
+    backfill = ArchiveBackfill(save_dir, max_idx=DAYS - 1, workers=8)
+    report = backfill.run()
+    assert report["errors"] == []
+    assert report["missing"] == report["downloaded"] == DAYS - 2
+    assert {row["date"] for row in store.history()} == {day(i) for i in range(DAYS)}
+    # 再次运行时全部由索引判定为已存在，只按每页 8 张遍历一次存档
+    requests = server.requests
+    assert ArchiveBackfill(save_dir, max_idx=DAYS - 1).run()["missing"] == 0
+    # 某页慢于 p95 时会多发一次对冲请求
+    pages = DAYS // ArchiveBackfill.PAGE_SIZE + 1
+    assert pages <= server.requests - requests <= pages + 2
+
+def test_backfill_stops_at_the_real_archive_limit(bing, save_dir):
+    # 默认与真实接口一致只能获取 8 天
+    bing(image_size=16 * 1024)
+    report = ArchiveBackfill(save_dir).run()
+    assert report["downloaded"] == 8
@@ -0,0 +1,67 @@
+import os
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("requests")
+
+from wallpaper_core import WallpaperUtils, SegmentedDownloader, Deadline, CancelToken, TaskCancelled
+
+IMAGE = "/th?id=OHR.Test_ZH-CN1_UHD.jpg"
+
+def cancel_after(seconds):
+    cancel = CancelToken()
+    timer = threading.Timer(seconds, cancel.cancel)
+    timer.daemon = True
+    timer.start()
+    return cancel
+
+def test_cancelled_download_leaves_pool_usable(bing, save_dir):
+    # 取消时半读的连接不能回到共享连接池，否则同一会话的下一次请求读到上次剩余的正文
+    server = bing(image_size=2 * 1024 * 1024, bandwidth_mbps=1)
+    url = server.url + IMAGE
+    for attempt in range(3):
+        save_path = os.path.join(save_dir, f"cancelled{attempt}.jpg")
+        with pytest.raises(TaskCancelled):
+            SegmentedDownloader(WallpaperUtils.get_session(), url, save_path,
+                                deadline=Deadline(30, cancel=cancel_after(0.3))).run()
+        WallpaperUtils.download_image(url, os.path.join(save_dir, f"after{attempt}.jpg"))
+    health = WallpaperUtils.host_health(server.url)
+    assert health.state == "closed"
+    assert health._failures == 0
+
+@pytest.mark.parametrize("waiter_deadline", [None, 30])
+def test_waiter_takes_over_when_owner_is_cancelled(waiter_deadline):
+    # 发起方(如被新的预览刷新取代的预览任务)被取消时，仍在等待同一结果的一方应接手重新执行
+    inflight, calls = {}, []
+    owner_cancel = CancelToken()
+    owner_started = threading.Event()
+
+    def work():
+        calls.append(threading.current_thread().name)
+        if len(calls) == 1:
+            owner_started.set()
+            while not owner_cancel.cancelled:
+                time.sleep(0.01)
+            owner_cancel.check()
+        return "done"
+
+    owner = threading.Thread(target=lambda: pytest.raises(TaskCancelled, WallpaperUtils._run_shared,
+                                                          inflight, "key", work, Deadline(30, cancel=owner_cancel)))
+    owner.start()
+    assert owner_started.wait(5)
+    result = {}
+    deadline = Deadline(waiter_deadline) if waiter_deadline else None
+    waiter = threading.Thread(target=lambda: result.update(value=WallpaperUtils._run_shared(inflight, "key", work,
+                                                                                            deadline)))
+    waiter.start()
+    time.sleep(0.3)
+    started = time.monotonic()
+    owner_cancel.cancel()
+    waiter.join(5)
+    owner.join(5)
+    assert result == {"value": "done"}
+    assert len(calls) == 2
+    assert time.monotonic() - started < 2
+    assert inflight == {}
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+import threading
+
+import pytest
+
+pytest.importorskip("requests")
+
+from wallpaper_core import WallpaperUtils, SegmentedDownloader, StreamHasher, Deadline, CancelToken, TaskCancelled
+
+IMAGE = "/th?id=OHR.Test_ZH-CN1_UHD.jpg"
+
+def download(server, save_path, deadline=None, segments=4):
+    downloader = SegmentedDownloader(WallpaperUtils.get_session(), server.url + IMAGE, save_path,
+                                     segments=segments, deadline=deadline)
+    downloader.run()
+    return downloader
+
+def expected(server):
+    return hashlib.sha256(server.image_bytes("OHR.Test_ZH-CN1_UHD.jpg")).hexdigest()
+
+def test_segmented_download_publishes_verified_file(bing, save_dir):
+    server = bing(image_size=2 * 1024 * 1024, bandwidth_mbps=8)
+    save_path = os.path.join(save_dir, "today_UHD.jpg")
+    downloader = download(server, save_path)
+    assert downloader.sha256 == expected(server)
+    assert len(downloader._state["segments"]) == 4
+    # 并行分段在内存中按顺序计入哈希，不再从文件补读
+    assert downloader._hasher.reread == 0
+    assert not os.path.exists(save_path + ".part")
+    assert not os.path.exists(save_path + ".part.json")
+
+def test_interrupted_download_resumes_each_segment(bing, save_dir):
+    # 每段 512 KB，小于 FLUSH_EVERY：中断时也必须记录各段已写入的进度
+    server = bing(image_size=2 * 1024 * 1024, bandwidth_mbps=1)
+    save_path = os.path.join(save_dir, "today_UHD.jpg")
+    cancel = CancelToken()
+    timer = threading.Timer(0.3, cancel.cancel)
+    timer.start()
+    with pytest.raises(TaskCancelled):
+        download(server, save_path, Deadline(30, cancel=cancel))
+    timer.cancel()
+    assert not os.path.exists(save_path)
+    with open(save_path + ".part.json", encoding="utf-8") as f:
+        state = json.load(f)
+    assert all(seg[2] > 0 for seg in state["segments"])
+
+    downloader = download(server, save_path)
+    assert downloader._resumed == sum(seg[2] for seg in state["segments"])
+    assert downloader.sha256 == expected(server)
+    # 只有续传前已写入的部分需要读文件
+    assert downloader._hasher.reread == downloader._resumed
+    assert not os.path.exists(save_path + ".part.json")
+
+def test_stale_progress_is_not_reused(bing, save_dir):
+    server = bing(image_size=1024 * 1024)
+    save_path = os.path.join(save_dir, "today_UHD.jpg")
+    download(server, save_path)
+    # 服务器内容变化(校验器不同)时不沿用旧的进度
+    with open(save_path + ".part.json", "w", encoding="utf-8") as f:
+        json.dump({"url": server.url + IMAGE, "total": 1, "validator": "old", "segments": [[0, 0, 1]]}, f)
+    os.remove(save_path)
+    downloader = download(server, save_path)
+    assert downloader._resumed == 0
+    assert downloader.sha256 == expected(server)
+
+def test_stream_hasher_orders_chunks_in_memory(tmp_path, monkeypatch):
+    data = os.urandom(10 * 1000)
+    path = tmp_path / "part"
+    path.write_bytes(data)
+    chunks = [(offset, data[offset:offset + 1000]) for offset in range(0, len(data), 1000)]
+
+    hasher = StreamHasher(str(path))
+    for offset, chunk in reversed(chunks):
+        hasher.update(offset, chunk)
+    assert hasher.hexdigest() == hashlib.sha256(data).hexdigest()
+    assert hasher.reread == 0 and hasher.buffered == 0
+
+    # 暂存超出上限的部分与已在文件中的部分从文件读取
+    monkeypatch.setattr(StreamHasher, "MAX_BUFFER", 3000)
+    hasher = StreamHasher(str(path))
+    hasher.on_disk(0, 2000)
+    for offset, chunk in reversed(chunks[2:]):
+        hasher.update(offset, chunk)
+    hasher.catch_up(len(data))
+    assert hasher.hexdigest() == hashlib.sha256(data).hexdigest()
+    # 直接计入 1000 字节，暂存 3000 字节，其余从文件读取
+    assert hasher.reread == len(data) - 4000
+    assert hasher.buffered == 0
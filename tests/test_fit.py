@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+pytest.importorskip("PIL")
+
+from PIL import Image
+
+from fit import make_image
+from wallpaper_core import DisplayFitter
+
+GEOMETRIES = [(1366, 768), (1920, 1080), (2560, 1080), (1080, 1920)]
+
+@pytest.fixture
+def source(save_dir):
+    path = os.path.join(save_dir, "20260101_UHD.jpg")
+    make_image(path, 1920, 1080)
+    return path
+
+def test_fit_outputs_each_geometry_and_caches(source, save_dir):
+    fitter = DisplayFitter(save_dir)
+    cold = fitter.fit(source, GEOMETRIES + [(1920, 1080)])
+    assert cold["cached"] == 0
+    assert set(cold["outputs"]) == set(GEOMETRIES)
+    for (width, height), path in cold["outputs"].items():
+        assert os.path.dirname(path) == fitter.cache_dir
+        with Image.open(path) as img:
+            assert img.size == (width, height)
+    # 每百万像素耗时按源图像素计，供与基准结果对比
+    assert cold["ms_per_mp"] > 0
+
+    mtimes = {path: os.stat(path).st_mtime_ns for path in cold["outputs"].values()}
+    warm = fitter.fit(source, GEOMETRIES)
+    assert warm["cached"] == len(GEOMETRIES)
+    assert warm["ms_per_mp"] == 0.0
+    assert {path: os.stat(path).st_mtime_ns for path in warm["outputs"].values()} == mtimes
+
+def test_fit_crops_around_the_center(save_dir):
+    # 左中右三块纯色，竖屏尺寸只保留中间一块
+    path = os.path.join(save_dir, "20260102_UHD.jpg")
+    img = Image.new("RGB", (1920, 1080), (255, 0, 0))
+    img.paste((0, 255, 0), (640, 0, 1280, 1080))
+    img.paste((0, 0, 255), (1280, 0, 1920, 1080))
+    img.save(path, "JPEG", quality=95)
+    fitted = DisplayFitter(save_dir).fit(path, [(540, 960)])["outputs"][(540, 960)]
+    with Image.open(fitted) as out:
+        for x in (10, 270, 530):
+            r, g, b = out.getpixel((x, 480))
+            assert g > 200 and r < 60 and b < 60
+
+def test_wallpaper_for_single_and_mixed_displays(source, save_dir):
+    fitter = DisplayFitter(save_dir)
+    fitted = fitter.wallpaper_for(source, [(1366, 768), (1366, 768)])
+    assert fitted == fitter.cache_path(os.path.basename(fitted)[:16], (1366, 768))
+    # 尺寸不一致或无显示器信息时交给系统缩放原图
+    assert fitter.wallpaper_for(source, [(1366, 768), (1920, 1080)]) == source
+    assert fitter.wallpaper_for(source, []) == source
+
+def test_unreadable_image_falls_back_to_original(save_dir):
+    path = os.path.join(save_dir, "20260103_UHD.jpg")
+    with open(path, "wb") as f:
+        f.write(b"not a jpeg")
+    assert DisplayFitter(save_dir).wallpaper_for(path, [(800, 600)]) == path
+
+def test_cache_keeps_newest_entries(source, save_dir, monkeypatch):
+    monkeypatch.setattr(DisplayFitter, "MAX_ENTRIES", 2)
+    fitter = DisplayFitter(save_dir)
+    for geometry in [(320, 240), (640, 480), (800, 600)]:
+        fitter.fit(source, [geometry])
+    assert len(os.listdir(fitter.cache_dir)) == 2
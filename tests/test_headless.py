@@ -0,0 +1,85 @@
+import os
+import re
+import subprocess
+import sys
+import urllib.error
+import urllib.request
+
+import pytest
+
+from conftest import ROOT
+from wallpaper_core import (PeerServer, RolloverScheduler, run_headless, library_state_path,
+                            HEADLESS_STARTUP_BUDGET_MS, HEADLESS_PEAK_RSS_BUDGET_MB)
+
+def write_settings(tmp_path, monkeypatch, **values):
+    config = tmp_path / "config" / "BingWallpaper"
+    config.mkdir(parents=True)
+    lines = ["[General]"] + [f"{key}={value}" for key, value in values.items()]
+    (config / "Manager.conf").write_text("\n".join(lines), encoding="utf-8")
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path / "config"))
+
+def test_peer_serve_setting_keeps_headless_resident(tmp_path, save_dir, monkeypatch):
+    # 设置项 peer_serve 与 --serve-peers 一样启动共享并常驻，而不是单次运行后退出
+    write_settings(tmp_path, monkeypatch, peer_serve="true", peer_port=0)
+    servers, runs = [], []
+    start = PeerServer.start
+    monkeypatch.setattr(PeerServer, "start", lambda self: servers.append(self) or start(self))
+
+    def run(self, stop_event=None, once=False, max_attempts=None):
+        # 空目录没有今日元数据，共享服务应答 404
+        try:
+            urllib.request.urlopen(servers[0].url.replace("0.0.0.0", "127.0.0.1") + "/meta", timeout=5)
+        except urllib.error.HTTPError as e:
+            runs.append((once, e.code))
+
+    monkeypatch.setattr(RolloverScheduler, "run", run)
+    try:
+        assert run_headless(["--headless", "--save-dir", save_dir]) == 0
+    finally:
+        for server in servers:
+            server.stop()
+    assert runs == [(False, 404)]
+
+# 子进程与 bing_wallpaper.py --headless 的入口一致: 先计时，再导入 wallpaper_core 并进入 run_headless；
+# 只额外把 Bing 地址指向替身服务器、桌面设置换成记录型后端
+CHILD = """
+import time
+started_at = time.perf_counter()
+import sys
+import wallpaper_core
+wallpaper_core.WallpaperUtils.BING_HOST = sys.argv[1]
+wallpaper_core.WallpaperApplier.backend = wallpaper_core.RecordingBackend()
+code = wallpaper_core.run_headless(["--headless"] + sys.argv[2:], started_at=started_at)
+print("PyQt5" in sys.modules)
+sys.exit(code)
+"""
+
+def run_child(server, save_dir, tmp_path):
+    env = dict(os.environ, XDG_STATE_HOME=str(tmp_path / "state"), XDG_CONFIG_HOME=str(tmp_path / "config"))
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))
+    proc = subprocess.run([sys.executable, "-c", CHILD, server.url, "--save-dir", save_dir],
+                          cwd=ROOT, env=env, capture_output=True, text=True, timeout=120)
+    assert proc.returncode == 0, proc.stderr
+    return proc.stdout
+
+@pytest.mark.parametrize("relaunch", [False, True])
+def test_headless_run_stays_within_budgets(bing, save_dir, tmp_path, relaunch):
+    pytest.importorskip("requests")
+    server = bing(image_size=1024 * 1024)
+    if relaunch:
+        # 同日再次启动由完成日志直接结束
+        run_child(server, save_dir, tmp_path)
+    out = run_child(server, save_dir, tmp_path)
+    startup_ms = float(re.search(r"启动 (\d+) ms", out).group(1))
+    rss_mb = float(re.search(r"峰值内存 ([\d.]+) MB", out).group(1))
+    assert startup_ms <= HEADLESS_STARTUP_BUDGET_MS, out
+    assert rss_mb <= HEADLESS_PEAK_RSS_BUDGET_MB, out
+    assert ("未联网" in out) == relaunch
+    assert out.strip().endswith("False"), "无界面模式不应导入 PyQt5"
+
+def test_scheduler_state_is_kept_outside_the_image_folder(tmp_path, save_dir, monkeypatch):
+    paths = []
+    monkeypatch.setattr(RolloverScheduler, "run", lambda self, **kwargs: paths.append(self.state_path) or {})
+    run_headless(["--headless", "--save-dir", save_dir, "--daemon"])
+    assert paths and paths[0] == library_state_path(save_dir, "scheduler.json")
+    assert paths[0].startswith(str(tmp_path / "state"))
@@ -0,0 +1,33 @@
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT
+from import_time import BUDGETS_MS, RUNS, import_cost_ms
+
+# 这些依赖只在首次用到的代码路径中导入，不计入冷启动
+LAZY = ["requests", "urllib3", "packaging", "concurrent.futures", "getpass", "PyQt5", "PIL"]
+
+def imported_after(statement):
+    code = f"import sys\n{statement}\nprint(' '.join(m for m in {LAZY!r} if m in sys.modules))"
+    proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, timeout=60)
+    assert proc.returncode == 0, proc.stderr
+    return proc.stdout.split()
+
+def test_core_import_is_lazy():
+    assert imported_after("import wallpaper_core") == []
+
+def test_headless_entry_does_not_load_gui_or_network_stack():
+    # 解析参数、读取设置不需要网络库；PyQt5 始终不导入
+    loaded = imported_after("import wallpaper_core as w\nw.load_settings()\nw.RolloverScheduler(None)")
+    assert loaded == []
+
+@pytest.mark.parametrize("module", sorted(BUDGETS_MS))
+def test_cold_import_within_budget(module):
+    if module == "bing_wallpaper":
+        pytest.importorskip("PyQt5")
+    # 取多次冷导入中的最小值，降低机器负载带来的抖动
+    samples = [import_cost_ms(module) for _ in range(RUNS)]
+    assert None not in samples, f"导入 {module} 失败"
+    assert min(samples) <= BUDGETS_MS[module], f"{module} 冷导入 {min(samples):.1f} ms，预算 {BUDGETS_MS[module]} ms"
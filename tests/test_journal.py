@@ -0,0 +1,64 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip("requests")
+
+from wallpaper_core import WallpaperUtils, WallpaperApplier, CompletionJournal
+
+def relaunch(monkeypatch):
+    # 新进程没有内存中的元数据缓存与本次下载记录
+    monkeypatch.setattr(WallpaperUtils, "_meta_cache", {})
+    monkeypatch.setattr(WallpaperUtils, "_fresh_downloads", set())
+
+def test_same_day_relaunch_makes_no_requests_and_no_apply(bing, save_dir, monkeypatch):
+    server = bing(image_size=256 * 1024)
+    first = WallpaperUtils.run_daily(save_dir)
+    assert first["is_new"]
+    assert len(WallpaperApplier.backend.calls) == 1
+
+    relaunch(monkeypatch)
+    requests = server.requests
+    second = WallpaperUtils.run_daily(save_dir)
+    assert second["journal"]
+    assert second["path"] == first["path"]
+    assert server.requests == requests
+    assert len(WallpaperApplier.backend.calls) == 1
+    # 日志中的元数据填回缓存，切换时间仍可计算
+    assert second["fullstartdate"] == first["fullstartdate"]
+
+@pytest.mark.parametrize("content", [b"", b'{"2026', b"\x00\xff garbage", b"[1, 2]"])
+def test_corrupt_journal_falls_back_to_a_normal_run(bing, save_dir, monkeypatch, content):
+    bing(image_size=256 * 1024)
+    first = WallpaperUtils.run_daily(save_dir)
+    journal = CompletionJournal(save_dir)
+    with open(journal.path, "wb") as f:
+        f.write(content)
+
+    relaunch(monkeypatch)
+    result = WallpaperUtils.run_daily(save_dir)
+    # 不跳过任何步骤: 今日图片已在本地，仍走完整流程并检查是否需要重新应用
+    assert not result.get("journal")
+    assert result["path"] == first["path"]
+    assert not result["is_new"]
+    assert "applied" in result["apply"]
+    # 完整流程结束后重新写入有效的日志
+    with open(journal.path, encoding="utf-8") as f:
+        assert CompletionJournal.today() in json.load(f)
+
+def test_journal_lives_outside_the_image_folder(bing, save_dir, monkeypatch):
+    server = bing(image_size=256 * 1024)
+    WallpaperUtils.run_daily(save_dir)
+    journal = CompletionJournal(save_dir)
+    assert not journal.path.startswith(save_dir)
+    assert "journal.json" not in os.listdir(save_dir)
+
+    # 旧版本写在保存目录中的日志在首次读取时迁移过去，仍可跳过联网
+    os.replace(journal.path, os.path.join(save_dir, "journal.json"))
+    relaunch(monkeypatch)
+    requests = server.requests
+    assert WallpaperUtils.run_daily(save_dir)["journal"]
+    assert server.requests == requests
+    assert os.path.exists(journal.path)
+    assert "journal.json" not in os.listdir(save_dir)
@@ -0,0 +1,41 @@
+import datetime
+import os
+
+import pytest
+
+pytest.importorskip("requests")
+
+from wallpaper_core import WallpaperUtils, WallpaperApplier, WallpaperStore, MultiMarketFetch, parse_markets
+
+TODAY = datetime.date.today().strftime("%Y%m%d")
+MARKETS = ["zh-CN", "en-US", "ja-JP"]
+
+def test_parse_markets():
+    assert parse_markets(" zh-CN, en-US,,zh-CN ") == ["zh-CN", "en-US"]
+    assert parse_markets(["en-US", "ja-JP"]) == ["en-US", "ja-JP"]
+    assert parse_markets(None) == []
+
+def test_image_key_ignores_the_market_suffix():
+    assert MultiMarketFetch.image_key("/th?id=OHR.Lake_ZH-CN123") == MultiMarketFetch.image_key("/th?id=OHR.Lake_EN-US456")
+
+def test_shared_image_is_stored_and_applied_once(bing, save_dir):
+    # 替身服务器对所有市场返回同一张图片(仅 urlbase 的市场后缀不同)
+    bing(image_size=256 * 1024)
+    result = WallpaperUtils.run_daily(save_dir, markets=MARKETS)
+    assert os.listdir(save_dir) == [f"{TODAY}_UHD.jpg"]
+    assert result["is_new"]
+    assert len(WallpaperApplier.backend.calls) == 1
+    # 共用该图片的市场都记录在索引中
+    assert WallpaperStore.open(save_dir).markets(f"{TODAY}_UHD.jpg") == MARKETS
+
+def test_same_content_under_different_names_is_kept_once(bing, save_dir, monkeypatch):
+    server = bing(image_size=256 * 1024)
+    server.config.image = server.image_bytes("OHR.Same_UHD.jpg")
+    # 按完整 urlbase 分组，使各市场的图片名不同、内容相同，只能按哈希去重
+    monkeypatch.setattr(MultiMarketFetch, "image_key", staticmethod(lambda urlbase: urlbase))
+    result = MultiMarketFetch(save_dir, MARKETS[:2]).run()
+    assert result == {"markets": 2, "unique": 1, "files": [f"{TODAY}_UHD.jpg"]}
+    assert os.listdir(save_dir) == [f"{TODAY}_UHD.jpg"]
+    store = WallpaperStore.open(save_dir)
+    assert store.count() == 1
+    assert store.markets(f"{TODAY}_UHD.jpg") == MARKETS[:2]
@@ -0,0 +1,14 @@
+import sys
+
+import pytest
+
+from wallpaper_core import peak_rss_mb, rss_mb
+
+@pytest.mark.skipif(sys.platform == "darwin", reason="macOS 没有 /proc，当前内存不可读")
+def test_current_and_peak_rss():
+    before = rss_mb()
+    assert 0 < before <= peak_rss_mb()
+    block = bytearray(64 * 1024 * 1024)
+    assert rss_mb() - before > 32
+    del block
+    assert peak_rss_mb() - before > 32
@@ -0,0 +1,51 @@
+import threading
+
+import pytest
+
+pytest.importorskip("requests")
+
+from wallpaper_core import WallpaperUtils, SegmentedDownloader, MultiMarketFetch, ArchiveBackfill
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def test_concurrent_callers_share_one_request(bing):
+    # 响应慢于全部线程就绪所需时间，所有调用都落在同一个进行中的请求上
+    server = bing(latency_ms=300)
+    barrier = threading.Barrier(16)
+    results = []
+
+    def call():
+        barrier.wait()
+        results.append(WallpaperUtils.get_bing_meta())
+
+    threads = [threading.Thread(target=call) for _ in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert server.requests == 1
+    assert len(results) == 16 and all(meta == results[0] for meta in results)
+
+def test_meta_is_refetched_after_ttl(bing, monkeypatch):
+    server = bing()
+    clock = Clock()
+    monkeypatch.setattr(WallpaperUtils, "meta_clock", clock)
+    WallpaperUtils.get_bing_meta()
+    clock.now += WallpaperUtils.META_TTL - 1
+    WallpaperUtils.get_bing_meta()
+    assert server.requests == 1
+    clock.now += 2
+    WallpaperUtils.get_bing_meta()
+    assert server.requests == 2
+
+def test_connection_pool_fits_the_largest_fan_out():
+    adapter = WallpaperUtils.get_session().get_adapter("https://cn.bing.com")
+    assert adapter._pool_maxsize == WallpaperUtils.pool_maxsize()
+    assert adapter._pool_maxsize >= MultiMarketFetch.MAX_WORKERS * SegmentedDownloader.MAX_SEGMENTS
+    assert adapter._pool_maxsize >= ArchiveBackfill.WORKERS
+    assert adapter._pool_maxsize >= WallpaperUtils.HEDGE_WORKERS
@@ -0,0 +1,30 @@
+import pytest
+
+pytest.importorskip("requests")
+
+from wallpaper_core import WallpaperUtils, Metrics
+
+ARCHIVE = "/HPImageArchive.aspx?format=js&idx=0&n=1&mkt=zh-CN"
+
+@pytest.fixture
+def totals(monkeypatch):
+    monkeypatch.setattr(Metrics, "_totals", {})
+    return Metrics.totals
+
+def test_connect_span_times_new_connections_only(bing, totals):
+    server = bing()
+    for _ in range(3):
+        WallpaperUtils.timed_get(server.url + ARCHIVE)
+    # 三次请求复用同一条连接，只计一次建连；不再有额外的 DNS 解析
+    assert totals()["connect"]["count"] == 1
+    assert totals()["connect"]["errors"] == 0
+    assert totals()["first_byte"]["count"] == 3
+    assert "dns" not in totals()
+
+def test_failed_connect_is_recorded_as_error(bing, totals):
+    server = bing()
+    url = server.url
+    server.stop()
+    with pytest.raises(Exception):
+        WallpaperUtils.timed_get(url + ARCHIVE, timeout=2)
+    assert totals()["connect"]["errors"] >= 1
@@ -0,0 +1,72 @@
+import datetime
+import os
+
+import pytest
+
+pytest.importorskip("requests")
+
+from wallpaper_core import WallpaperUtils, PeerServer, PeerCache, file_sha256
+
+TODAY = datetime.date.today().strftime("%Y%m%d")
+
+@pytest.fixture
+def peer(bing, tmp_path, monkeypatch):
+    # 共享实例先从替身服务器下载今日壁纸并登记索引，再在回环地址上提供共享
+    server = bing(image_size=512 * 1024)
+    peer_dir = tmp_path / "peer"
+    peer_dir.mkdir()
+    url = WallpaperUtils.get_bing_url()
+    path = str(peer_dir / f"{TODAY}_UHD.jpg")
+    sha256 = WallpaperUtils.download_image(url, path)
+    WallpaperUtils.store_download(path, sha256, meta=WallpaperUtils.get_bing_meta(), market="zh-CN")
+    shared = PeerServer(str(peer_dir), host="127.0.0.1", port=0).start()
+    PeerCache.configure([shared.url])
+    monkeypatch.setattr(PeerCache, "misses", 0)
+    monkeypatch.setattr(PeerCache, "hits", 0)
+    yield server, shared, url, path
+    shared.stop()
+
+def origin(server, url):
+    return server.image_bytes(url.split("id=", 1)[1])
+
+def test_verified_peer_image_skips_bing(peer, save_dir):
+    server, shared, url, _ = peer
+    before = server.requests
+    save_path = os.path.join(save_dir, f"{TODAY}_UHD.jpg")
+    WallpaperUtils.download_image(url, save_path)
+    assert server.requests == before
+    assert (shared.served, PeerCache.hits) == (1, 1)
+    with open(save_path, "rb") as f:
+        assert f.read() == origin(server, url)
+
+def corrupt(path, monkeypatch):
+    # 内容被改写但大小与修改时间不变，共享端索引仍认为哈希有效
+    st = os.stat(path)
+    with open(path, "r+b") as f:
+        f.seek(st.st_size // 2)
+        f.write(b"\x00" * 4096)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+def truncate(path, monkeypatch):
+    # 共享端发出的正文比 /lookup 声明的短
+    short = path + ".short"
+    with open(path, "rb") as src, open(short, "wb") as dst:
+        dst.write(src.read(100 * 1024))
+    monkeypatch.setattr(PeerServer, "file_for", lambda self, sha256: (short, os.path.getsize(short)))
+
+@pytest.mark.parametrize("tamper", [corrupt, truncate])
+def test_tampered_peer_image_falls_back_to_bing(peer, save_dir, tamper, monkeypatch):
+    server, shared, url, path = peer
+    tamper(path, monkeypatch)
+    before = server.requests
+    save_path = os.path.join(save_dir, f"{TODAY}_UHD.jpg")
+    sha256 = WallpaperUtils.download_image(url, save_path)
+
+    assert shared.served == 1
+    assert (PeerCache.hits, PeerCache.misses) == (0, 1)
+    assert server.requests > before
+    expected = origin(server, url)
+    with open(save_path, "rb") as f:
+        assert f.read() == expected
+    assert sha256 == file_sha256(save_path)
+    assert os.listdir(save_dir) == [os.path.basename(save_path)]
@@ -0,0 +1,63 @@
+import time
+
+import pytest
+
+pytest.importorskip("requests")
+
+from wallpaper_core import WallpaperUtils, HostHealth, CircuitOpenError
+
+ARCHIVE = "/HPImageArchive.aspx?format=js&idx=0&n=1&mkt=zh-CN"
+
+def test_hedge_wins_over_slow_primary(bing, monkeypatch):
+    # 首选主机每个请求都卡顿 3 s，超过对冲等待后向备用主机发出的请求先返回
+    fast = bing()
+    slow = bing(spike_rate=1.0, spike_ms=3000)
+    monkeypatch.setattr(WallpaperUtils, "BING_HOSTS", (slow.url, fast.url))
+    monkeypatch.setattr(WallpaperUtils, "BING_HOST", slow.url)
+    monkeypatch.setattr(HostHealth, "DEFAULT_HEDGE_DELAY", 0.2)
+    started = time.monotonic()
+    response = WallpaperUtils.hedged_get(ARCHIVE, timeout=10)
+    assert time.monotonic() - started < 2
+    assert response.url.startswith(fast.url)
+    assert response.json()["images"]
+    assert (slow.requests, fast.requests) == (1, 1)
+
+def test_failed_primary_falls_back_without_waiting(bing, monkeypatch):
+    healthy = bing()
+    broken = bing(drop_rate=1.0)
+    monkeypatch.setattr(WallpaperUtils, "BING_HOSTS", (broken.url, healthy.url))
+    monkeypatch.setattr(WallpaperUtils, "BING_HOST", broken.url)
+    started = time.monotonic()
+    assert WallpaperUtils.hedged_get(ARCHIVE, timeout=10).url.startswith(healthy.url)
+    # 首选请求断连后立即回退，不等对冲延迟
+    assert time.monotonic() - started < HostHealth.DEFAULT_HEDGE_DELAY
+    assert WallpaperUtils.host_health(broken.url)._failures == 1
+
+def test_breaker_opens_and_half_opens(bing, monkeypatch):
+    monkeypatch.setattr(HostHealth, "COOLDOWN", 0.3)
+    server = bing(drop_rate=1.0)
+    health = WallpaperUtils.host_health(server.url)
+    # 单一主机时对冲请求发往同一主机，每次调用计两次失败
+    for _ in range(2):
+        with pytest.raises(Exception):
+            WallpaperUtils.hedged_get(ARCHIVE, timeout=5)
+    assert health.state == "open"
+    requests = server.requests
+    with pytest.raises(CircuitOpenError):
+        WallpaperUtils.hedged_get(ARCHIVE, timeout=5)
+    assert server.requests == requests
+
+    # 冷却期后放行一次试探请求；试探失败重新熔断
+    time.sleep(0.35)
+    assert health.state == "half-open"
+    with pytest.raises(Exception):
+        WallpaperUtils.hedged_get(ARCHIVE, timeout=5)
+    assert server.requests == requests + 1
+    assert health.state == "open"
+
+    # 主机恢复后试探成功，熔断器闭合
+    server.config.drop_rate = 0.0
+    time.sleep(0.35)
+    assert WallpaperUtils.hedged_get(ARCHIVE, timeout=5).json()["images"]
+    assert health.state == "closed"
+    assert health._failures == 0
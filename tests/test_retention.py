@@ -0,0 +1,133 @@
+import datetime
+import os
+import time
+
+import pytest
+
+from wallpaper_core import RetentionPolicy, WallpaperStore
+
+TODAY = datetime.date(2026, 3, 10)
+KB = 1024
+
+@pytest.fixture(autouse=True)
+def fresh_instances(monkeypatch):
+    monkeypatch.setattr(WallpaperStore, "_instances", {})
+
+def day(offset):
+    return (TODAY - datetime.timedelta(days=offset)).strftime("%Y%m%d")
+
+def make(save_dir, days, size=KB):
+    # 按天生成主市场壁纸，返回文件名(由新到旧)
+    names = []
+    for offset in days:
+        name = f"{day(offset)}_UHD.jpg"
+        with open(os.path.join(save_dir, name), "wb") as f:
+            f.write(b"\0" * size)
+        names.append(name)
+    WallpaperStore.open(save_dir).rebuild()
+    return names
+
+def remaining(save_dir):
+    return sorted(os.listdir(save_dir))
+
+def test_keep_days_removes_older_files_and_their_rows(save_dir):
+    names = make(save_dir, range(5))
+    report = RetentionPolicy(keep_days=3).apply(save_dir, today=TODAY)
+    assert remaining(save_dir) == sorted(names[:3])
+    assert (report["removed"], report["bytes"], report["kept"], report["kept_bytes"]) == (2, 2 * KB, 3, 3 * KB)
+    assert WallpaperStore.open(save_dir).count() == 3
+
+def test_default_keeps_only_today(save_dir):
+    names = make(save_dir, range(3))
+    RetentionPolicy().apply(save_dir, today=TODAY)
+    assert remaining(save_dir) == [names[0]]
+
+def test_max_bytes_evicts_oldest_first(save_dir):
+    names = make(save_dir, range(6), size=10 * KB)
+    report = RetentionPolicy(keep_days=30, max_bytes=35 * KB).apply(save_dir, today=TODAY)
+    # 今天的文件不计入上限，其余五个只留最新的三个
+    assert remaining(save_dir) == sorted(names[:4])
+    assert report["removed"] == 2
+    assert report["kept_bytes"] == 40 * KB
+
+def test_protected_files_do_not_count_towards_max_bytes(save_dir):
+    names = make(save_dir, range(4), size=10 * KB)
+    WallpaperStore.open(save_dir).set_pinned(names[3])
+    # 今天与收藏的文件已超出上限，仍保留上限内的可淘汰文件
+    RetentionPolicy(keep_days=30, max_bytes=10 * KB).apply(save_dir, today=TODAY)
+    assert remaining(save_dir) == sorted([names[0], names[1], names[3]])
+
+def test_pinned_files_survive_keep_days(save_dir):
+    names = make(save_dir, range(4))
+    WallpaperStore.open(save_dir).set_pinned(names[2])
+    RetentionPolicy(keep_days=1).apply(save_dir, today=TODAY)
+    assert remaining(save_dir) == sorted([names[0], names[2]])
+    RetentionPolicy(keep_days=1, keep_pinned=False).apply(save_dir, today=TODAY)
+    assert remaining(save_dir) == [names[0]]
+
+def test_future_dated_files_are_kept(save_dir):
+    names = make(save_dir, [-1, 0, 1])
+    RetentionPolicy().apply(save_dir, today=TODAY)
+    assert remaining(save_dir) == sorted(names[:2])
+
+def test_deletion_is_batched(save_dir, monkeypatch):
+    monkeypatch.setattr(RetentionPolicy, "BATCH_SIZE", 4)
+    store = WallpaperStore.open(save_dir)
+    batches = []
+    original = store.remove
+    monkeypatch.setattr(store, "remove", lambda filenames: (batches.append(len(filenames)), original(filenames)))
+    make(save_dir, range(11))
+    report = RetentionPolicy().apply(save_dir, today=TODAY)
+    assert batches == [4, 4, 2]
+    assert report["removed"] == 10
+    assert store.count() == 1
+
+def test_undeletable_file_is_reported_as_kept(save_dir, monkeypatch):
+    names = make(save_dir, range(3))
+    real_remove = os.remove
+
+    def remove(path):
+        if path.endswith(names[1]):
+            raise PermissionError(path)
+        real_remove(path)
+    monkeypatch.setattr(os, "remove", remove)
+    report = RetentionPolicy().apply(save_dir, today=TODAY)
+    assert remaining(save_dir) == sorted(names[:2])
+    assert (report["removed"], report["kept"]) == (1, 2)
+    assert WallpaperStore.open(save_dir).get(names[1]) is not None
+
+def test_stale_temp_files_are_aged_out(save_dir):
+    names = make(save_dir, [0])
+    stale = time.time() - RetentionPolicy.TEMP_MAX_AGE - 60
+    temps = [f"{day(0)}_UHD.jpg.{suffix}" for suffix in ("part", "part.json", "peer", "link", "tmp")]
+    fresh = f"{day(3)}_UHD.jpg.part"
+    for name in temps + [fresh, "notes.tmp"]:
+        path = os.path.join(save_dir, name)
+        with open(path, "wb") as f:
+            f.write(b"x")
+        if name != fresh:
+            os.utime(path, (stale, stale))
+    report = RetentionPolicy().apply(save_dir, today=TODAY)
+    # 正在进行的下载(含补全往日的)保留，与壁纸无关的文件不动
+    assert remaining(save_dir) == sorted([names[0], fresh, "notes.tmp"])
+    assert report["removed"] == len(temps)
+
+def test_hardlinked_group_is_counted_once(save_dir):
+    names = make(save_dir, range(4), size=10 * KB)
+    store = WallpaperStore.open(save_dir)
+    # 第 1、2 天的图片是第 3 天那张的硬链接，三个文件只占一份空间
+    group = names[3]
+    for name in names[1:3]:
+        os.remove(os.path.join(save_dir, name))
+        os.link(os.path.join(save_dir, group), os.path.join(save_dir, name))
+        store.record_file(os.path.join(save_dir, name), duplicate_of=group)
+    report = RetentionPolicy(keep_days=30, max_bytes=10 * KB).apply(save_dir, today=TODAY)
+    assert report["removed"] == 0
+    assert report["kept_bytes"] == 20 * KB
+
+    # 只有整组删除后才算回收空间
+    report = RetentionPolicy(keep_days=2).apply(save_dir, today=TODAY)
+    assert (report["removed"], report["bytes"]) == (2, 0)
+    report = RetentionPolicy(keep_days=1).apply(save_dir, today=TODAY)
+    assert (report["removed"], report["bytes"]) == (1, 10 * KB)
+    assert remaining(save_dir) == [names[0]]
@@ -0,0 +1,128 @@
+import datetime
+import json
+import time
+
+import pytest
+
+from wallpaper_core import RolloverScheduler
+
+UTC = datetime.timezone.utc
+
+class FakeClock:
+    # wait 不真正睡眠而是推进时间；oversleep/undersleep 模拟系统休眠后晚醒或提前醒来，
+    # 等待次数用完时返回 True 使调度器停止
+    def __init__(self, start, max_waits=1):
+        self.current = start
+        self.waits = []
+        self.max_waits = max_waits
+        self.drift = []
+
+    def now(self):
+        return self.current
+
+    def wait(self, seconds, stop_event):
+        self.waits.append(seconds)
+        if len(self.waits) > self.max_waits:
+            return True
+        drift = self.drift.pop(0) if self.drift else 0
+        self.current += datetime.timedelta(seconds=max(0.0, seconds + drift))
+        return False
+
+def daily_task(clock, runs, fails=0):
+    def task():
+        runs.append(clock.now())
+        if len(runs) <= fails:
+            raise ConnectionError("暂时不可用")
+        # zh-CN 的图片在北京时间 0 点(UTC 16:00)切换
+        day = clock.now() - datetime.timedelta(hours=16)
+        return {"fullstartdate": day.strftime("%Y%m%d") + "1600"}
+    return task
+
+def test_sleeps_until_rollover_plus_grace(tmp_path):
+    clock = FakeClock(datetime.datetime(2026, 10, 16, 18, 0, tzinfo=UTC), max_waits=1)
+    runs = []
+    state_path = str(tmp_path / "scheduler.json")
+    RolloverScheduler(daily_task(clock, runs), clock=clock, state_path=state_path).run()
+    rollover = datetime.datetime(2026, 10, 17, 16, 0, tzinfo=UTC)
+    grace = RolloverScheduler.ROLLOVER_GRACE
+    # 一次性睡到下次切换，醒来后运行，再睡到下一天
+    assert runs == [datetime.datetime(2026, 10, 16, 18, 0, tzinfo=UTC), rollover + datetime.timedelta(seconds=grace)]
+    assert clock.waits == [22 * 3600 + grace, 24 * 3600]
+    with open(state_path, encoding="utf-8") as f:
+        state = json.load(f)
+    assert state["next_run"] == (rollover + datetime.timedelta(days=1, seconds=grace)).isoformat()
+
+def test_early_wake_waits_again():
+    clock = FakeClock(datetime.datetime(2026, 10, 16, 18, 0, tzinfo=UTC), max_waits=2)
+    clock.drift = [-3600]
+    runs = []
+    RolloverScheduler(daily_task(clock, runs), clock=clock).run()
+    grace = RolloverScheduler.ROLLOVER_GRACE
+    # 提前一小时醒来时不运行，重新等待剩余时间
+    assert clock.waits[:2] == [22 * 3600 + grace, 3600]
+    assert len(runs) == 2
+    assert runs[1] == datetime.datetime(2026, 10, 17, 16, 2, tzinfo=UTC)
+
+def test_missed_wake_runs_once_and_skips_to_next_rollover():
+    # 系统休眠三天后醒来: 只补运行一次，下次时间为醒来之后最近的一次切换
+    clock = FakeClock(datetime.datetime(2026, 10, 16, 18, 0, tzinfo=UTC), max_waits=1)
+    clock.drift = [3 * 86400]
+    runs = []
+    RolloverScheduler(daily_task(clock, runs), clock=clock).run()
+    woke = datetime.datetime(2026, 10, 20, 16, 2, tzinfo=UTC)
+    assert runs == [datetime.datetime(2026, 10, 16, 18, 0, tzinfo=UTC), woke]
+    assert clock.waits[1] == 24 * 3600
+
+def test_failures_back_off_with_jitter(tmp_path):
+    clock = FakeClock(datetime.datetime(2026, 10, 16, 18, 0, tzinfo=UTC), max_waits=3)
+    runs = []
+    state_path = str(tmp_path / "scheduler.json")
+    scheduler = RolloverScheduler(daily_task(clock, runs, fails=3), clock=clock, state_path=state_path,
+                                  rng=lambda: 0.5)
+    scheduler.run()
+    # 等量抖动: 15 s、30 s、60 s 上限的 3/4
+    assert clock.waits[:3] == [11.25, 22.5, 45.0]
+    assert len(runs) == 4
+    assert [RolloverScheduler(None, rng=lambda: r).backoff_delay(20) for r in (0, 1)] == [1800, 3600]
+
+def test_restart_keeps_waiting_for_persisted_next_run(tmp_path):
+    state_path = str(tmp_path / "scheduler.json")
+    clock = FakeClock(datetime.datetime(2026, 10, 16, 18, 0, tzinfo=UTC), max_waits=0)
+    runs = []
+    RolloverScheduler(daily_task(clock, runs), clock=clock, state_path=state_path).run()
+    # 重启后的新进程不重复运行，而是继续等待上次记录的时间
+    clock.current += datetime.timedelta(hours=1)
+    clock.waits = []
+    RolloverScheduler(daily_task(clock, runs), clock=clock, state_path=state_path).run()
+    assert len(runs) == 1
+    assert clock.waits == [21 * 3600 + RolloverScheduler.ROLLOVER_GRACE]
+
+def test_run_once_retries_then_raises():
+    clock = FakeClock(datetime.datetime(2026, 10, 16, 18, 0, tzinfo=UTC), max_waits=10)
+    runs = []
+    with pytest.raises(ConnectionError):
+        RolloverScheduler(daily_task(clock, runs, fails=10), clock=clock, rng=lambda: 0).run(once=True,
+                                                                                             max_attempts=3)
+    assert len(runs) == 3
+    assert clock.waits == [7.5, 15.0]
+
+@pytest.fixture
+def berlin(monkeypatch):
+    if not hasattr(time, "tzset"):
+        pytest.skip("需要 time.tzset")
+    monkeypatch.setenv("TZ", "Europe/Berlin")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+@pytest.mark.parametrize("now, expected", [
+    # 夏令时开始(3 月 29 日 02:00 跳到 03:00): 当天只有 23 小时，零点为 UTC 22:00
+    (datetime.datetime(2026, 3, 29, 0, 0, tzinfo=UTC), datetime.datetime(2026, 3, 29, 22, 0, tzinfo=UTC)),
+    # 夏令时结束(10 月 25 日 03:00 回到 02:00): 当天 25 小时，零点为 UTC 23:00
+    (datetime.datetime(2026, 10, 24, 23, 0, tzinfo=UTC), datetime.datetime(2026, 10, 25, 23, 0, tzinfo=UTC)),
+    (datetime.datetime(2026, 7, 1, 12, 0, tzinfo=UTC), datetime.datetime(2026, 7, 1, 22, 0, tzinfo=UTC)),
+])
+def test_local_midnight_fallback_across_dst(berlin, now, expected):
+    assert RolloverScheduler.next_rollover(now) == expected
+    assert RolloverScheduler.next_rollover(now, "bad") == expected
@@ -0,0 +1,143 @@
+import os
+import shutil
+
+import pytest
+
+from wallpaper_core import WallpaperUtils, WallpaperStore, library_state_dir, file_sha256
+
+def write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+
+@pytest.fixture(autouse=True)
+def fresh_instances(monkeypatch):
+    monkeypatch.setattr(WallpaperStore, "_instances", {})
+
+def reopen(store):
+    # 关闭连接并丢弃单例，模拟进程重启后再次打开
+    store._conn.close()
+    WallpaperStore._instances.clear()
+    return WallpaperStore.open(store.save_dir)
+
+def db_path(save_dir):
+    return os.path.join(library_state_dir(save_dir), WallpaperStore.DB_NAME)
+
+def test_index_is_rebuilt_from_an_existing_directory(save_dir):
+    for name in ("20260101_UHD.jpg", "20260102_UHD.jpg", "20260102_ZH-CN123_UHD.jpg"):
+        write(os.path.join(save_dir, name), name.encode())
+    write(os.path.join(save_dir, "notes.txt"), b"ignored")
+    os.makedirs(os.path.join(save_dir, "20260103_UHD.jpg"))
+
+    store = WallpaperStore.open(save_dir)
+    assert store.count() == 3
+    row = store.get("20260102_UHD.jpg")
+    assert (row["date"], row["resolution"], row["size"]) == ("20260102", "UHD", len(b"20260102_UHD.jpg"))
+    assert row["sha256"] is None
+    assert not os.path.exists(os.path.join(save_dir, WallpaperStore.DB_NAME))
+
+def test_rebuild_drops_deleted_files(save_dir):
+    write(os.path.join(save_dir, "20260101_UHD.jpg"), b"a")
+    write(os.path.join(save_dir, "20260102_UHD.jpg"), b"b")
+    store = WallpaperStore.open(save_dir)
+    os.remove(os.path.join(save_dir, "20260101_UHD.jpg"))
+    assert store.rebuild() == 1
+    assert [row["filename"] for row in store.history()] == ["20260102_UHD.jpg"]
+
+def test_primary_for_date(save_dir):
+    store = WallpaperStore.open(save_dir)
+    for name in ("20260102_ZH-CN123_UHD.jpg", "20260102_UHD.jpg", "20260101_UHD.jpg"):
+        write(os.path.join(save_dir, name), name.encode())
+        store.record_file(os.path.join(save_dir, name))
+    assert store.primary_for_date("20260102") == "20260102_UHD.jpg"
+    assert store.primary_for_date("20260103") is None
+    # 文件被删除后不再返回，记录同时被清除
+    os.remove(os.path.join(save_dir, "20260102_UHD.jpg"))
+    assert store.primary_for_date("20260102") is None
+    assert store.get("20260102_UHD.jpg") is None
+
+def test_lookup_by_content_id(save_dir):
+    store = WallpaperStore.open(save_dir)
+    data = os.urandom(4096)
+    for name in ("20260101_UHD.jpg", "20260102_UHD.jpg"):
+        write(os.path.join(save_dir, name), data)
+        store.record_file(os.path.join(save_dir, name))
+    write(os.path.join(save_dir, "20260103_UHD.jpg"), b"other")
+    store.record_file(os.path.join(save_dir, "20260103_UHD.jpg"))
+
+    sha = store.ensure_hash("20260101_UHD.jpg")
+    assert sha == file_sha256(os.path.join(save_dir, "20260101_UHD.jpg"))
+    assert [row["filename"] for row in store.find_by_hash(sha)] == ["20260101_UHD.jpg"]
+    store.ensure_hash("20260102_UHD.jpg")
+    assert [row["filename"] for row in store.find_by_hash(sha)] == ["20260101_UHD.jpg", "20260102_UHD.jpg"]
+    assert store.ensure_hash("20260104_UHD.jpg") is None
+
+def test_rewritten_file_invalidates_its_hash(save_dir):
+    path = os.path.join(save_dir, "20260101_UHD.jpg")
+    write(path, b"old")
+    store = WallpaperStore.open(save_dir)
+    old = store.ensure_hash("20260101_UHD.jpg")
+    write(path, b"new content")
+    assert store.ensure_hash("20260101_UHD.jpg") == file_sha256(path) != old
+    assert store.find_by_hash(old) == []
+
+def test_wal_mode_and_rows_survive_reopen(save_dir):
+    write(os.path.join(save_dir, "20260101_UHD.jpg"), b"a")
+    store = WallpaperStore.open(save_dir)
+    store.set_pinned("20260101_UHD.jpg")
+    sha = store.ensure_hash("20260101_UHD.jpg")
+
+    store = reopen(store)
+    assert store._conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert store.pinned_filenames() == {"20260101_UHD.jpg"}
+    assert store.get("20260101_UHD.jpg")["sha256"] == sha
+
+def test_old_index_in_the_image_folder_is_migrated(save_dir):
+    write(os.path.join(save_dir, "20260101_UHD.jpg"), b"a")
+    store = WallpaperStore.open(save_dir)
+    store.set_pinned("20260101_UHD.jpg")
+    store._conn.close()
+    WallpaperStore._instances.clear()
+    # 模拟旧版本: 数据库位于保存目录
+    old_path = os.path.join(save_dir, WallpaperStore.DB_NAME)
+    shutil.move(db_path(save_dir), old_path)
+    for suffix in ("-wal", "-shm"):
+        if os.path.exists(db_path(save_dir) + suffix):
+            shutil.move(db_path(save_dir) + suffix, old_path + suffix)
+
+    store = WallpaperStore.open(save_dir)
+    assert os.path.exists(db_path(save_dir))
+    assert not [name for name in os.listdir(save_dir) if name.startswith(WallpaperStore.DB_NAME)]
+    # 收藏标记只存在于数据库中，保留下来说明是迁移而非重建
+    assert store.pinned_filenames() == {"20260101_UHD.jpg"}
+
+def download(save_dir, name, data):
+    # 模拟下载完成后的登记流程
+    path = os.path.join(save_dir, name)
+    write(path, data)
+    return WallpaperUtils.store_download(path, file_sha256(path))
+
+def test_duplicate_download_becomes_a_hardlink(save_dir):
+    data = os.urandom(8192)
+    download(save_dir, "20260101_UHD.jpg", data)
+    row = download(save_dir, "20260105_UHD.jpg", data)
+    assert row["duplicate_of"] == "20260101_UHD.jpg"
+    # 第三份同样归入第一份所在的组
+    assert download(save_dir, "20260109_UHD.jpg", data)["duplicate_of"] == "20260101_UHD.jpg"
+    stats = [os.stat(os.path.join(save_dir, name)) for name in sorted(os.listdir(save_dir))]
+    assert len({st.st_ino for st in stats}) == 1
+    assert stats[0].st_nlink == 3
+    assert download(save_dir, "20260110_UHD.jpg", b"other")["duplicate_of"] is None
+    assert WallpaperStore.open(save_dir).link_groups() == {"20260105_UHD.jpg": "20260101_UHD.jpg",
+                                                          "20260109_UHD.jpg": "20260101_UHD.jpg"}
+
+def test_duplicate_is_kept_as_a_copy_when_links_are_unsupported(save_dir, monkeypatch):
+    def refuse(src, dst):
+        raise OSError("hard links not supported")
+    monkeypatch.setattr(os, "link", refuse)
+    data = os.urandom(8192)
+    download(save_dir, "20260101_UHD.jpg", data)
+    row = download(save_dir, "20260105_UHD.jpg", data)
+    assert row["duplicate_of"] is None
+    first, second = (os.stat(os.path.join(save_dir, name)) for name in ("20260101_UHD.jpg", "20260105_UHD.jpg"))
+    assert first.st_ino != second.st_ino
+    assert sorted(os.listdir(save_dir)) == ["20260101_UHD.jpg", "20260105_UHD.jpg"]
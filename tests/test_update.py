@@ -0,0 +1,87 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip("requests")
+
+from wallpaper_core import WallpaperUtils, UpdateChecker
+
+RESET = 2_000_000_000
+
+class Clock:
+    def __init__(self, now=1_800_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def github(bing, monkeypatch):
+    server = bing(latest_tag="v1.5.0", rate_reset=RESET)
+    monkeypatch.setattr(WallpaperUtils, "UPDATE_API", f"{server.url}/repos/QsSama-W/wallpaper-win/releases/latest")
+    return server
+
+@pytest.fixture
+def checker(tmp_path):
+    return UpdateChecker(state_path=str(tmp_path / "update.json"), interval_hours=24, clock=Clock())
+
+def state(checker):
+    with open(checker.state_path, encoding="utf-8") as f:
+        return json.load(f)
+
+def test_result_is_reused_within_the_interval(github, checker):
+    assert checker.check("1.4.0")[:2] == (True, "1.5.0")
+    assert github.requests == 1
+    checker.clock.now += 23 * 3600
+    assert checker.check("1.4.0")[:2] == (True, "1.5.0")
+    assert github.requests == 1
+
+def test_not_modified_reuses_cached_release(github, checker):
+    checker.check("1.4.0")
+    assert state(checker)["etag"] == '"v1.5.0"'
+    checker.clock.now += 25 * 3600
+    assert checker.check("1.5.0") == (False, "1.5.0", "")
+    assert github.requests == 2
+    assert state(checker)["checked_at"] == checker.clock.now
+
+def test_force_skips_the_interval(github, checker):
+    checker.check("1.4.0")
+    checker.check("1.4.0", force=True)
+    assert github.requests == 2
+
+def test_rate_limit_pauses_until_reset(github, checker):
+    checker.check("1.4.0")
+    github.config.rate_remaining = 0
+    checker.clock.now += 25 * 3600
+    # 被限流时沿用上次结果，并记录额度重置时间
+    assert checker.check("1.4.0")[:2] == (True, "1.5.0")
+    assert state(checker)["paused_until"] == RESET
+    assert github.requests == 2
+
+    # 手动检查跳过间隔，但在重置前不发请求
+    github.config.rate_remaining = 59
+    checker.check("1.4.0", force=True)
+    assert github.requests == 2
+    checker.clock.now = RESET
+    checker.check("1.4.0", force=True)
+    assert github.requests == 3
+    assert state(checker)["paused_until"] == 0
+
+def test_low_remaining_pauses_before_the_limit_is_hit(bing, checker, monkeypatch):
+    server = bing(rate_remaining=UpdateChecker.LOW_REMAINING - 1, rate_reset=RESET)
+    monkeypatch.setattr(WallpaperUtils, "UPDATE_API", f"{server.url}/releases/latest")
+    checker.check("1.4.0")
+    assert state(checker)["paused_until"] == RESET
+
+def test_paused_without_cached_release_raises(github, checker):
+    github.config.rate_remaining = 0
+    with pytest.raises(RuntimeError, match="受限"):
+        checker.check("1.4.0", force=True)
+    assert state(checker)["paused_until"] == RESET
+    assert "release" not in state(checker)
+    # 暂停期间不再请求，直接报告恢复时间
+    with pytest.raises(RuntimeError, match="后再试"):
+        checker.check("1.4.0", force=True)
+    assert github.requests == 1
+    assert not os.path.exists(checker.state_path + ".tmp")
@@ -0,0 +1,47 @@
+import pytest
+
+pytest.importorskip("requests")
+
+from wallpaper_core import VariantSelector
+
+URLBASE = "/th?id=OHR.Test_ZH-CN1"
+
+@pytest.fixture
+def auto(monkeypatch):
+    def configure(*displays):
+        monkeypatch.setattr(VariantSelector, "preference", "auto")
+        monkeypatch.setattr(VariantSelector, "_displays", list(displays))
+    return configure
+
+def test_smallest_covering_variant_is_chosen(bing, auto):
+    server = bing()
+    auto((1920, 1080))
+    assert VariantSelector.choose(URLBASE) == "1920x1080"
+    # 小于屏幕的规格不确认，只对选中的规格发一次 HEAD
+    assert server.requests == 1
+
+def test_head_results_are_cached(bing, auto):
+    server = bing(variants={"UHD", "1366x768", "1920x1200"})
+    auto((1920, 1080))
+    assert VariantSelector.choose(URLBASE) == "1920x1200"
+    assert server.requests == 2
+    # 存在与不存在的结果都缓存，再次选择不再发 HEAD
+    assert VariantSelector.choose(URLBASE) == "1920x1200"
+    assert server.requests == 2
+    assert VariantSelector.choose("/th?id=OHR.Other_ZH-CN2") == "1920x1200"
+    assert server.requests == 4
+
+def test_largest_display_decides(bing, auto):
+    server = bing()
+    auto((1366, 768), (2560, 1440))
+    # 没有比 UHD 更小且能覆盖 2560x1440 的规格，UHD 无需确认
+    assert VariantSelector.choose(URLBASE) == "UHD"
+    assert server.requests == 0
+
+def test_fixed_preference_and_unknown_displays_skip_heads(bing, auto, monkeypatch):
+    server = bing()
+    auto()
+    assert VariantSelector.choose(URLBASE) == VariantSelector.DEFAULT
+    monkeypatch.setattr(VariantSelector, "preference", "1366x768")
+    assert VariantSelector.choose(URLBASE) == "1366x768"
+    assert server.requests == 0
@@ -0,0 +1,2896 @@
+import sys
+import os
+import datetime
+import ctypes
+import re
+import json
+import time
+import threading
+from collections import deque
+from importlib.util import find_spec
+
+# requests / urllib3 / packaging / concurrent.futures 较重，仅在用到时才导入
+HAS_PACKAGING = find_spec("packaging") is not None
+HAS_PILLOW = find_spec("PIL") is not None
+
+# 本模块只包含业务逻辑，不得导入 PyQt5 等 GUI 模块，供无界面模式直接使用
+
+def default_save_dir():
+    import getpass
+    return os.path.join(f"C:\\Users\\{getpass.getuser()}", "Pictures", "bing_wallpaper")
+
+def _process_memory_counters():
+    # Windows: 本进程的 PROCESS_MEMORY_COUNTERS，失败时返回 None
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                    ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    handle = ctypes.windll.kernel32.GetCurrentProcess()
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+        return None
+    return counters
+
+def _proc_status_mb(field):
+    # Linux: /proc/self/status 中以 kB 计的字段，不可用时返回 None
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def peak_rss_mb():
+    if sys.platform.startswith('win'):
+        counters = _process_memory_counters()
+        return counters.PeakWorkingSetSize / (1024 * 1024) if counters else 0.0
+    # Linux 的 ru_maxrss 在 exec 后保留父进程的峰值(由大进程启动时偏高)，优先读取本进程地址空间的 VmHWM
+    peak = _proc_status_mb("VmHWM")
+    if peak is not None:
+        return peak
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 计，macOS 以字节计
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def rss_mb():
+    # 当前(而非峰值)常驻内存；无法读取时返回 0
+    if sys.platform.startswith('win'):
+        counters = _process_memory_counters()
+        return counters.WorkingSetSize / (1024 * 1024) if counters else 0.0
+    return _proc_status_mb("VmRSS") or 0.0
+
+# 启动里程碑: 名称 -> 首次到达时的 perf_counter，用于统计出托盘图标、首次联网等耗时
+_milestones = {}
+
+def mark_milestone(name):
+    _milestones.setdefault(name, time.perf_counter())
+
+def milestone_ms(name, started_at):
+    reached = _milestones.get(name)
+    return None if reached is None else (reached - started_at) * 1000
+
+def app_data_dir():
+    if sys.platform.startswith('win'):
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_STATE_HOME") or os.path.expanduser("~/.local/state")
+    return os.path.join(base, "BingWallpaper")
+
+def library_state_dir(save_dir):
+    # 每个保存目录的内部状态(完成日志、调度状态、索引)放在应用数据目录下，用户的图片目录中只有图片
+    import hashlib
+    key = hashlib.sha1(os.path.normcase(os.path.abspath(save_dir)).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(app_data_dir(), "libraries", key)
+
+def library_state_path(save_dir, name, companions=()):
+    # 返回状态文件的路径；旧版本写在保存目录中的文件(及 companions 后缀的附属文件)首次使用时移过来
+    path = os.path.join(library_state_dir(save_dir), name)
+    old = os.path.join(save_dir, name)
+    if not os.path.exists(path) and os.path.exists(old):
+        import shutil
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        for suffix in ("",) + tuple(companions):
+            if os.path.exists(old + suffix):
+                try:
+                    shutil.move(old + suffix, path + suffix)
+                except OSError:
+                    pass
+    return path
+
+# ==========================================
+# 计时与指标
+# ==========================================
+class Span:
+    def __init__(self, phase, **attrs):
+        self.phase = phase
+        self.attrs = attrs
+        self.bytes = 0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        attrs = dict(self.attrs)
+        if exc is not None:
+            attrs["error"] = str(exc)
+        Metrics.record(self.phase, time.perf_counter() - self.started, self.bytes,
+                       "ok" if exc_type is None else "error", **attrs)
+        return False
+
+class Metrics:
+    # 各阶段(元数据、建连、首字节、传输、写盘、解码缩放、应用、清理)的耗时 span，
+    # 写入滚动的 JSON Lines 日志，并可导出为 Prometheus textfile
+    LOG_MAX_BYTES = 1024 * 1024
+    LOG_BACKUPS = 3
+    PROM_PREFIX = "bing_wallpaper"
+
+    _logger = None
+    _prom_path = None
+    _totals = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def configure(cls, log_path=None, prom_path=None):
+        with cls._lock:
+            if log_path:
+                import logging
+                from logging.handlers import RotatingFileHandler
+                os.makedirs(os.path.dirname(log_path), exist_ok=True)
+                logger = logging.getLogger("bing_wallpaper.metrics")
+                logger.propagate = False
+                logger.setLevel(logging.INFO)
+                for handler in list(logger.handlers):
+                    logger.removeHandler(handler)
+                    handler.close()
+                handler = RotatingFileHandler(log_path, maxBytes=cls.LOG_MAX_BYTES,
+                                              backupCount=cls.LOG_BACKUPS, encoding="utf-8")
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                logger.addHandler(handler)
+                cls._logger = logger
+            cls._prom_path = prom_path
+
+    @classmethod
+    def span(cls, phase, **attrs):
+        return Span(phase, **attrs)
+
+    @classmethod
+    def record(cls, phase, seconds, nbytes=0, outcome="ok", **attrs):
+        entry = {"ts": round(time.time(), 3), "phase": phase, "ms": round(seconds * 1000, 2),
+                 "bytes": nbytes, "outcome": outcome}
+        entry.update(attrs)
+        with cls._lock:
+            totals = cls._totals.setdefault(phase, {"count": 0, "seconds": 0.0, "bytes": 0, "errors": 0})
+            totals["count"] += 1
+            totals["seconds"] += seconds
+            totals["bytes"] += nbytes
+            totals["errors"] += outcome != "ok"
+            logger = cls._logger
+        if logger:
+            logger.info(json.dumps(entry, ensure_ascii=False))
+        return entry
+
+    @classmethod
+    def totals(cls):
+        with cls._lock:
+            return {phase: dict(t) for phase, t in cls._totals.items()}
+
+    @classmethod
+    def export_prometheus(cls):
+        path = cls._prom_path
+        if not path:
+            return
+        p = cls.PROM_PREFIX
+        lines = [f"# HELP {p}_phase_seconds Time spent per phase.",
+                 f"# TYPE {p}_phase_seconds summary"]
+        totals = cls.totals()
+        for phase, t in sorted(totals.items()):
+            lines.append(f'{p}_phase_seconds_sum{{phase="{phase}"}} {t["seconds"]:.6f}')
+            lines.append(f'{p}_phase_seconds_count{{phase="{phase}"}} {t["count"]}')
+        lines += [f"# HELP {p}_phase_bytes_total Bytes handled per phase.", f"# TYPE {p}_phase_bytes_total counter"]
+        lines += [f'{p}_phase_bytes_total{{phase="{phase}"}} {t["bytes"]}' for phase, t in sorted(totals.items())]
+        lines += [f"# HELP {p}_phase_errors_total Failed spans per phase.", f"# TYPE {p}_phase_errors_total counter"]
+        lines += [f'{p}_phase_errors_total{{phase="{phase}"}} {t["errors"]}' for phase, t in sorted(totals.items())]
+        lines += [f"# HELP {p}_last_export_timestamp_seconds Time of the last export.",
+                  f"# TYPE {p}_last_export_timestamp_seconds gauge", f"{p}_last_export_timestamp_seconds {time.time():.0f}"]
+        # textfile collector 要求原子替换
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path + ".tmp", 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(path + ".tmp", path)
+
+def load_settings():
+    # 读取 GUI 通过 QSettings("BingWallpaper", "Manager") 保存的设置，不依赖 Qt
+    values = {}
+    if sys.platform.startswith('win'):
+        try:
+            import winreg as reg
+            with reg.OpenKey(reg.HKEY_CURRENT_USER, r"Software\BingWallpaper\Manager") as key:
+                index = 0
+                while True:
+                    try:
+                        name, value, _ = reg.EnumValue(key, index)
+                    except OSError:
+                        break
+                    values[name] = value
+                    index += 1
+        except OSError:
+            pass
+    else:
+        import configparser
+        config_home = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
+        parser = configparser.ConfigParser()
+        try:
+            parser.read(os.path.join(config_home, "BingWallpaper", "Manager.conf"), encoding="utf-8")
+            if parser.has_section("General"):
+                values.update(parser.items("General"))
+        except configparser.Error:
+            pass
+
+    def as_bool(key, default):
+        val = values.get(key, default)
+        if isinstance(val, str):
+            return val.lower() == 'true'
+        return bool(val)
+
+    def as_int(key, default):
+        try:
+            return int(values.get(key, default))
+        except (TypeError, ValueError):
+            return default
+
+    return {
+        "auto_delete": as_bool("auto_delete", False),
+        "auto_check_update": as_bool("auto_check_update", True),
+        "silent_exit": as_bool("silent_exit", False),
+        "markets": parse_markets(values.get("markets")),
+        "keep_days": as_int("keep_days", 1),
+        "max_size_mb": as_int("max_size_mb", 0),
+        "prom_textfile": values.get("prom_textfile") or None,
+        "image_variant": values.get("image_variant") or "auto",
+        "update_interval_hours": as_int("update_interval_hours", 24),
+        "peers": values.get("peers") or "",
+        "peer_serve": as_bool("peer_serve", False),
+        "peer_port": as_int("peer_port", PeerServer.PORT),
+    }
+
+def parse_markets(value):
+    # "zh-CN, en-US" -> ["zh-CN", "en-US"]；第一个为主市场，其壁纸用于设置桌面
+    if isinstance(value, (list, tuple)):
+        value = ",".join(value)
+    markets = []
+    for mkt in (value or "").split(","):
+        mkt = mkt.strip()
+        if mkt and mkt not in markets:
+            markets.append(mkt)
+    return markets
+
+def file_sha256(path):
+    import hashlib
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def jpeg_structure_ok(path):
+    # 从 SOI 开始逐个检查标记段长度，直到扫描数据(SOS)，要求其间出现过帧头(SOF)
+    try:
+        with open(path, 'rb') as f:
+            if f.read(2) != b"\xff\xd8":
+                return False
+            seen_frame = False
+            while True:
+                marker = f.read(2)
+                if len(marker) < 2 or marker[0] != 0xFF:
+                    return False
+                kind = marker[1]
+                if kind == 0xFF:
+                    f.seek(-1, 1)
+                    continue
+                if kind == 0x01 or 0xD0 <= kind <= 0xD7:
+                    continue
+                raw = f.read(2)
+                if len(raw) < 2:
+                    return False
+                length = int.from_bytes(raw, "big")
+                if length < 2:
+                    return False
+                if 0xC0 <= kind <= 0xCF and kind not in (0xC4, 0xC8, 0xCC):
+                    seen_frame = True
+                if kind == 0xDA:
+                    return seen_frame
+                f.seek(length - 2, 1)
+    except OSError:
+        return False
+
+class StreamHasher:
+    # 按文件顺序增量计算 SHA-256: 正好接在已计算位置之后的数据在下载线程中直接计入；并行的后续分段
+    # 先按偏移暂存在内存中(图片只有几 MB)，前面的数据到齐后依次计入，不再从文件补读。
+    # 只有续传前已写入文件的部分(on_disk 登记)需要读文件；暂存超过 MAX_BUFFER 时由 catch_up 兜底补读
+    READ_SIZE = 1024 * 1024
+    MAX_BUFFER = 64 * 1024 * 1024
+
+    def __init__(self, path):
+        import hashlib
+        self.path = path
+        self.position = 0
+        self.reread = 0
+        self.buffered = 0
+        self._digest = hashlib.sha256()
+        self._pending = {}
+        self._on_disk = {}
+        self._lock = threading.Lock()
+
+    def on_disk(self, offset, length):
+        # 登记已在文件中的区间，计算到该处时从文件读取
+        if length <= 0:
+            return
+        with self._lock:
+            self._on_disk[offset] = length
+            self._drain()
+
+    def update(self, offset, chunk):
+        with self._lock:
+            if offset == self.position:
+                self._digest.update(chunk)
+                self.position += len(chunk)
+                self._drain()
+            elif offset > self.position and self.buffered + len(chunk) <= self.MAX_BUFFER:
+                self._pending[offset] = chunk
+                self.buffered += len(chunk)
+
+    def _drain(self):
+        while True:
+            chunk = self._pending.pop(self.position, None)
+            if chunk is not None:
+                self.buffered -= len(chunk)
+                self._digest.update(chunk)
+                self.position += len(chunk)
+                continue
+            length = self._on_disk.pop(self.position, None)
+            if length is None:
+                return
+            self._read_file(self.position + length)
+
+    def _read_file(self, upto):
+        with open(self.path, 'rb') as f:
+            f.seek(self.position)
+            while self.position < upto:
+                block = f.read(min(self.READ_SIZE, upto - self.position))
+                if not block:
+                    break
+                self._digest.update(block)
+                self.position += len(block)
+                self.reread += len(block)
+
+    def catch_up(self, upto):
+        # 下载完成后调用: 正常情况下已全部计入；暂存溢出而未计入的部分从文件补读
+        with self._lock:
+            # 只补读暂存数据之间的空缺
+            while self.position < upto:
+                position = self.position
+                self._read_file(min([o for o in self._pending if o > position] + [upto]))
+                self._drain()
+                if self.position == position:
+                    break
+            for offset in [o for o in self._pending if o < self.position]:
+                self.buffered -= len(self._pending.pop(offset))
+
+    def hexdigest(self):
+        return self._digest.hexdigest()
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+class TaskCancelled(DeadlineExceeded):
+    # 取消等同于截止时间提前到达，沿用同一条中止路径(不回退到其它主机、不计入熔断)
+    pass
+
+class Registration:
+    # register 的返回值: 调用或退出 with 块时注销回调
+    def __init__(self, release=None):
+        self.release = release or (lambda: None)
+
+    def __call__(self):
+        self.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+class CancelToken:
+    # 协作式取消: 任务在各检查点调用 check()；正在进行的传输通过 register 登记关闭回调，取消时立即中断
+    def __init__(self):
+        self._event = threading.Event()
+        self._callbacks = set()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks = list(self._callbacks)
+            self._callbacks.clear()
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    def register(self, callback):
+        # 返回注销函数；已取消时立即执行回调
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.add(callback)
+                return Registration(lambda: self._discard(callback))
+        callback()
+        return Registration()
+
+    def _discard(self, callback):
+        with self._lock:
+            self._callbacks.discard(callback)
+
+    def check(self):
+        if self._event.is_set():
+            raise TaskCancelled("任务已取消")
+
+class Deadline:
+    # 获取 -> 下载 -> 应用 整条链路共享的截止时间，各步骤的超时都不超过剩余时间；
+    # 可附带取消令牌，取消后的下一个检查点即中止
+    def __init__(self, seconds, cancel=None):
+        self.expires_at = time.monotonic() + seconds
+        self.cancel = cancel
+
+    def remaining(self):
+        return self.expires_at - time.monotonic()
+
+    def check(self):
+        if self.cancel is not None:
+            self.cancel.check()
+        if self.remaining() <= 0:
+            raise DeadlineExceeded("超出本次任务的时间限制")
+
+    def on_cancel(self, callback):
+        return self.cancel.register(callback) if self.cancel is not None else Registration()
+
+    def timeout(self, cap):
+        self.check()
+        return min(cap, self.remaining())
+
+def deadline_timeout(deadline, cap):
+    return deadline.timeout(cap) if deadline else cap
+
+def abort_response(resp):
+    # 取消时中断进行中的流式响应: 只对底层 socket 执行 shutdown，唤醒阻塞在读取上的线程，
+    # 由读取线程自己按连接中断处理并丢弃连接。若在取消线程中关闭响应，读取线程会在连接关闭之前
+    # 把它交还共享连接池，后续请求复用这条连接读到的是上次剩余的正文
+    import socket
+    sock = getattr(getattr(resp.raw, "_connection", None), "sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except (OSError, ValueError):
+            pass
+
+def timed_adapter(**kwargs):
+    # 连接池中新建连接时计时建连(DNS 解析、TCP 握手，HTTPS 另含 TLS 握手)，复用的连接不计
+    import requests
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    def timed(base, tls):
+        class TimedConnection(base):
+            def connect(self):
+                with Metrics.span("connect", host=self.host, tls=tls):
+                    return super().connect()
+        return TimedConnection
+
+    class TimedHTTPPool(HTTPConnectionPool):
+        ConnectionCls = timed(HTTPConnection, False)
+
+    class TimedHTTPSPool(HTTPSConnectionPool):
+        ConnectionCls = timed(HTTPSConnection, True)
+
+    class TimedAdapter(requests.adapters.HTTPAdapter):
+        def init_poolmanager(self, *args, **pool_kwargs):
+            super().init_poolmanager(*args, **pool_kwargs)
+            self.poolmanager.pool_classes_by_scheme = {"http": TimedHTTPPool, "https": TimedHTTPSPool}
+
+    return TimedAdapter(**kwargs)
+
+class CircuitOpenError(ConnectionError):
+    pass
+
+class HostHealth:
+    # 单个主机的延迟统计与熔断器: 连续失败达到阈值后熔断，冷却期后放行一次试探请求
+    FAILURE_THRESHOLD = 3
+    COOLDOWN = 60
+    SAMPLES = 50
+    DEFAULT_HEDGE_DELAY = 1.0
+    MIN_HEDGE_DELAY = 0.05
+
+    def __init__(self):
+        self._latencies = deque(maxlen=self.SAMPLES)
+        self._failures = 0
+        self._opened_at = None
+        self._last_trial = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half-open" if self._trial_due() else "open"
+
+    def _trial_due(self):
+        since = max(self._opened_at, self._last_trial or self._opened_at)
+        return time.monotonic() - since >= self.COOLDOWN
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial_due():
+                self._last_trial = time.monotonic()
+                return True
+            return False
+
+    def record_success(self, latency=None):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._last_trial = None
+            if latency is not None:
+                self._latencies.append(latency)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._opened_at is not None or self._failures >= self.FAILURE_THRESHOLD:
+                self._opened_at = time.monotonic()
+                self._last_trial = None
+
+    def hedge_delay(self):
+        # 以 p95 延迟作为发出对冲请求的等待时间
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < 5:
+            return self.DEFAULT_HEDGE_DELAY
+        return max(self.MIN_HEDGE_DELAY, samples[int(0.95 * (len(samples) - 1))])
+
+# ==========================================
+# 1. 业务逻辑
+# ==========================================
+class WallpaperUtils:
+    BING_HOST = "https://cn.bing.com"
+    # 主机不可用时依次回退
+    BING_HOSTS = ("https://cn.bing.com", "https://www.bing.com")
+    UPDATE_API = "https://api.github.com/repos/QsSama-W/wallpaper-win/releases/latest"
+    DAILY_DEADLINE = 180  # 单次 获取 -> 下载 -> 应用 的总时限(秒)
+    DEFAULT_MKT = "zh-CN"
+    META_TTL = 30 * 60  # 元数据缓存有效期(秒)
+    HEDGE_WORKERS = 4
+
+    # 所有网络请求共用一个连接池，复用 TLS 连接
+    _session = None
+    _session_lock = threading.Lock()
+
+    # 元数据缓存: (mkt, 日期) -> (获取时间, images[0])；获取时间取自 meta_clock
+    _meta_cache = {}
+    meta_clock = time.monotonic
+    _meta_lock = threading.Lock()
+
+    # 进行中的请求: 并发调用同一资源时共享同一个 Future
+    _meta_inflight = {}
+    _download_inflight = {}
+    _inflight_lock = threading.Lock()
+    _fresh_downloads = set()
+
+    # 主机 -> HostHealth；对冲请求使用的线程池
+    _host_health = {}
+    _host_lock = threading.Lock()
+    _hedge_pool = None
+
+    @classmethod
+    def get_session(cls):
+        mark_milestone("first_network_request")
+        with cls._session_lock:
+            if cls._session is None:
+                import requests
+                try:
+                    import urllib3
+                    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+                except ImportError:
+                    pass
+                session = requests.Session()
+                adapter = timed_adapter(pool_connections=4, pool_maxsize=cls.pool_maxsize())
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                cls._session = session
+            return cls._session
+
+    @classmethod
+    def pool_maxsize(cls):
+        # 每个主机保留的连接数按同一主机上的最大并发取: 多市场并行下载时每张图各占 MAX_SEGMENTS 条，
+        # 历史补全的工作线程与对冲请求的线程；不足时多出的连接用完即关闭，无法复用
+        return max(MultiMarketFetch.MAX_WORKERS * SegmentedDownloader.MAX_SEGMENTS, ArchiveBackfill.WORKERS,
+                   cls.HEDGE_WORKERS)
+
+    @staticmethod
+    def split_host(url):
+        scheme, _, rest = url.partition("://")
+        host, _, path = rest.partition("/")
+        return f"{scheme}://{host}", "/" + path
+
+    @classmethod
+    def host_health(cls, host):
+        with cls._host_lock:
+            health = cls._host_health.get(host)
+            if health is None:
+                health = cls._host_health[host] = HostHealth()
+            return health
+
+    @classmethod
+    def available_hosts(cls, hosts=None):
+        hosts = [h for h in (hosts or cls.hosts()) if cls.host_health(h).allow()]
+        if not hosts:
+            raise CircuitOpenError("Bing 服务器暂时不可用，稍后重试")
+        return hosts
+
+    @classmethod
+    def hosts(cls):
+        # BING_HOST 可被替换(如指向本地测试服务器)，此时不再回退到公网主机
+        if cls.BING_HOST not in cls.BING_HOSTS:
+            return [cls.BING_HOST]
+        return [cls.BING_HOST] + [h for h in cls.BING_HOSTS if h != cls.BING_HOST]
+
+    @classmethod
+    def timed_get(cls, url, deadline=None, timeout=10, record_latency=True, **kwargs):
+        health = cls.host_health(cls.split_host(url)[0])
+        kwargs.setdefault("verify", False)
+        started = time.monotonic()
+        try:
+            response = cls.get_session().get(url, timeout=deadline_timeout(deadline, timeout), **kwargs)
+            response.raise_for_status()
+        except Exception:
+            health.record_failure()
+            raise
+        health.record_success(time.monotonic() - started if record_latency else None)
+        # elapsed 为发出请求到解析完响应头(新连接时包含 TCP/TLS 建连)
+        Metrics.record("first_byte", response.elapsed.total_seconds(), host=cls.split_host(url)[0])
+        return response
+
+    @classmethod
+    def hedged_get(cls, path, deadline=None, timeout=10, **kwargs):
+        # 先向首选主机发出请求；超过其 p95 延迟仍未返回时向备用主机(或同一主机的新连接)再发一份，
+        # 先成功者为准。首选请求提前失败时立即回退
+        from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+        with cls._host_lock:
+            if cls._hedge_pool is None:
+                cls._hedge_pool = ThreadPoolExecutor(max_workers=cls.HEDGE_WORKERS, thread_name_prefix="hedge")
+            pool = cls._hedge_pool
+        targets = cls.available_hosts()
+        # 熔断后的试探只放行一个请求，不向同一主机对冲
+        if len(targets) == 1 and cls.host_health(targets[0]).state == "closed":
+            targets = targets * 2
+        delay = cls.host_health(targets[0]).hedge_delay()
+
+        futures = {pool.submit(cls.timed_get, targets[0] + path, deadline, timeout, **kwargs)}
+        launched, hedge_at, last_error = 1, time.monotonic() + delay, None
+        while True:
+            wait_for = max(0.0, hedge_at - time.monotonic()) if launched < len(targets) else None
+            if deadline:
+                remaining = max(0.0, deadline.remaining())
+                wait_for = remaining if wait_for is None else min(wait_for, remaining)
+            done, futures = wait(futures, timeout=wait_for, return_when=FIRST_COMPLETED)
+            futures = set(futures)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                last_error = future.exception()
+            if launched < len(targets) and (not futures or time.monotonic() >= hedge_at):
+                futures.add(pool.submit(cls.timed_get, targets[launched] + path, deadline, timeout, **kwargs))
+                launched += 1
+                hedge_at = time.monotonic() + delay
+            elif not futures:
+                raise last_error
+            elif deadline:
+                deadline.check()
+
+    @classmethod
+    def fetch_archive(cls, mkt=DEFAULT_MKT, idx=0, n=1, deadline=None):
+        path = f"/HPImageArchive.aspx?format=js&idx={idx}&n={n}&mkt={mkt}"
+        with Metrics.span("metadata", mkt=mkt, idx=idx, n=n) as span:
+            response = cls.hedged_get(path, deadline=deadline, timeout=10)
+            span.bytes = len(response.content)
+        return response.json().get('images') or []
+
+    @classmethod
+    def _fetch_bing_meta(cls, mkt, deadline=None):
+        images = cls.fetch_archive(mkt, 0, 1, deadline=deadline)
+        if not images:
+            raise ValueError("Bing 未返回壁纸信息")
+        return images[0]
+
+    @classmethod
+    def _run_shared(cls, inflight, key, func, deadline=None):
+        from concurrent.futures import Future, wait
+        with cls._inflight_lock:
+            pending = inflight.get(key)
+            owner = pending is None
+            if owner:
+                pending = Future()
+                inflight[key] = pending
+        if not owner:
+            # 先等到结果就绪再区分超时与失败: TaskCancelled 与 DeadlineExceeded 都是 TimeoutError 的子类，
+            # 不能与等待超时混在一起捕获
+            while not pending.done():
+                # 分段等待，以便及时响应本方的取消
+                wait([pending], timeout=min(0.25, max(0.0, deadline.remaining())) if deadline else None)
+                if deadline:
+                    deadline.check()
+            if isinstance(pending.exception(), DeadlineExceeded):
+                # 发起方被取消或超时而本方仍需要结果时，由本方重新执行
+                if deadline:
+                    deadline.check()
+                return cls._run_shared(inflight, key, func, deadline)
+            return pending.result()
+
+        try:
+            result = func()
+        except Exception as e:
+            with cls._inflight_lock:
+                inflight.pop(key, None)
+            pending.set_exception(e)
+            raise
+        with cls._inflight_lock:
+            inflight.pop(key, None)
+        pending.set_result(result)
+        return result
+
+    @classmethod
+    def _get_cached_meta(cls, key):
+        with cls._meta_lock:
+            cached = cls._meta_cache.get(key)
+            if cached and cls.meta_clock() - cached[0] < cls.META_TTL:
+                return cached[1]
+        return None
+
+    @classmethod
+    def _put_cached_meta(cls, key, meta, replace=True):
+        with cls._meta_lock:
+            # 跨天后旧日期的缓存不再有用
+            for k in [k for k in cls._meta_cache if k[1] != key[1]]:
+                del cls._meta_cache[k]
+            if replace or key not in cls._meta_cache:
+                cls._meta_cache[key] = (cls.meta_clock(), meta)
+
+    @classmethod
+    def cached_meta(cls, mkt=DEFAULT_MKT):
+        return cls._get_cached_meta((mkt, datetime.date.today().isoformat()))
+
+    @classmethod
+    def seed_meta(cls, mkt, meta):
+        # 由完成日志还原今日元数据，已有本进程获取的结果时不覆盖
+        cls._put_cached_meta((mkt, datetime.date.today().isoformat()), meta, replace=False)
+
+    @classmethod
+    def get_bing_meta(cls, mkt=DEFAULT_MKT, deadline=None):
+        key = (mkt, datetime.date.today().isoformat())
+        meta = cls._get_cached_meta(key)
+        if meta is not None:
+            return meta
+
+        def fetch():
+            meta = cls._get_cached_meta(key)
+            if meta is not None:
+                return meta
+            meta = PeerCache.fetch_meta(mkt, deadline) or cls._fetch_bing_meta(mkt, deadline)
+            cls._put_cached_meta(key, meta)
+            return meta
+
+        return cls._run_shared(cls._meta_inflight, key, fetch, deadline)
+
+    @classmethod
+    def get_bing_url(cls, mkt=DEFAULT_MKT, deadline=None):
+        imgurl_base = cls.get_bing_meta(mkt, deadline)['urlbase']
+        return f"{cls.BING_HOST}{imgurl_base}_{VariantSelector.choose(imgurl_base, deadline)}.jpg"
+
+    @classmethod
+    def fetch_bytes(cls, url, timeout=10, deadline=None):
+        return cls.timed_get(url, deadline=deadline, timeout=timeout).content
+
+    @classmethod
+    def download_image(cls, url, save_path, segments=None, throttle=None, deadline=None):
+        # 先尝试局域网共享，再依次尝试可用的 Bing 主机，失败计入对应主机的熔断器；返回校验用的 SHA-256
+        segments = segments or SegmentedDownloader.MAX_SEGMENTS
+        host, path = cls.split_host(url)
+        if host in cls.hosts():
+            sha256 = PeerCache.fetch_image(url, save_path, deadline)
+            if sha256:
+                return sha256
+        candidates = cls.available_hosts() if host in cls.hosts() else [host]
+        last_error = None
+        for candidate in candidates:
+            health = cls.host_health(candidate)
+            downloader = SegmentedDownloader(cls.get_session(), candidate + path, save_path, segments=segments,
+                                             throttle=throttle, deadline=deadline)
+            try:
+                downloader.run()
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                # 取消时关闭连接会引发读取错误，此时按取消处理而不是主机故障
+                if deadline:
+                    deadline.check()
+                health.record_failure()
+                last_error = e
+                continue
+            health.record_success()
+            return downloader.sha256
+        raise last_error
+
+    @staticmethod
+    def store_download(save_path, sha256, meta=None, market=None):
+        # 与已有壁纸内容相同(如 Bing 隔几天重复同一张图)时改为硬链接，再写入索引
+        store = WallpaperStore.open(os.path.dirname(save_path))
+        duplicate_of = store.link_duplicate(os.path.basename(save_path), sha256)
+        return store.record_file(save_path, meta=meta, market=market, sha256=sha256, duplicate_of=duplicate_of)
+
+    @staticmethod
+    def find_today(save_dir):
+        # 今日主市场壁纸的任一已下载规格，没有时返回 None
+        today = datetime.date.today().strftime("%Y%m%d")
+        store = WallpaperStore.open(save_dir)
+        name = store.primary_for_date(today)
+        if name is None:
+            # 未登记的文件(如手动拷入)按已知规格名补登记
+            name = next((n for n in (f"{today}_{v}.jpg" for v in VariantSelector.names()) if store.lookup(n)), None)
+        return os.path.join(save_dir, name) if name else None
+
+    @classmethod
+    def today_path(cls, save_dir, variant=None):
+        if variant is None:
+            found = cls.find_today(save_dir)
+            if found:
+                return found
+            variant = VariantSelector.DEFAULT
+        today = datetime.date.today().strftime("%Y%m%d")
+        return os.path.join(save_dir, f"{today}_{variant}.jpg")
+
+    @classmethod
+    def ensure_image(cls, url, save_path, meta=None, market=None, deadline=None):
+        # 返回本进程是否新下载了该文件；预览与自动任务共享同一次下载，完成后写入索引
+        store = WallpaperStore.open(os.path.dirname(save_path))
+        name = os.path.basename(save_path)
+        if store.lookup(name) is None:
+            def fetch():
+                if store.lookup(name) is None:
+                    sha256 = cls.download_image(url, save_path, deadline=deadline)
+                    cls._fresh_downloads.add(save_path)
+                    cls.store_download(save_path, sha256, meta=meta, market=market)
+                return save_path
+            cls._run_shared(cls._download_inflight, save_path, fetch, deadline)
+        elif market:
+            store.add_markets(name, [market])
+        return save_path in cls._fresh_downloads
+
+    @classmethod
+    def ensure_today(cls, save_dir, mkt=DEFAULT_MKT, deadline=None):
+        # 索引中已有今日壁纸(任一规格)时不访问网络
+        save_path = cls.find_today(save_dir)
+        if save_path is None:
+            meta = cls.get_bing_meta(mkt, deadline)
+            variant = VariantSelector.choose(meta['urlbase'], deadline)
+            save_path = cls.today_path(save_dir, variant)
+            cls.ensure_image(f"{cls.BING_HOST}{meta['urlbase']}_{variant}.jpg", save_path, meta=meta, market=mkt,
+                             deadline=deadline)
+        return save_path, save_path in cls._fresh_downloads
+
+    @staticmethod
+    def set_wallpaper_api(image_path):
+        return WallpaperApplier.apply(image_path)
+
+    @staticmethod
+    def clean_old_wallpapers(save_dir, policy=None):
+        return (policy or RetentionPolicy()).apply(save_dir)["removed"]
+
+    @classmethod
+    def run_daily(cls, save_dir, auto_delete=False, markets=None, retention=None, deadline=None):
+        # 获取 -> 下载 -> 应用 -> 清理
+        try:
+            with Metrics.span("daily_run"):
+                return cls._run_daily(save_dir, auto_delete, markets, retention, deadline)
+        finally:
+            Metrics.export_prometheus()
+
+    @classmethod
+    def _run_daily(cls, save_dir, auto_delete, markets, retention, deadline):
+        deadline = deadline or Deadline(cls.DAILY_DEADLINE)
+        markets = list(markets or [cls.DEFAULT_MKT])
+        journal = CompletionJournal(save_dir)
+        displays = VariantSelector.displays()
+        entry = journal.completed(markets, displays)
+        if entry is not None:
+            return cls._resume_daily(save_dir, markets, entry)
+
+        if len(markets) > 1:
+            MultiMarketFetch(save_dir, markets).run(deadline)
+            save_path = cls.today_path(save_dir)
+            is_new = save_path in cls._fresh_downloads
+        else:
+            save_path, is_new = cls.ensure_today(save_dir, markets[0], deadline)
+        deadline.check()
+        wallpaper = DisplayFitter(save_dir).wallpaper_for(save_path)
+        applied = cls.set_wallpaper_api(wallpaper) or {}
+        report = (retention or RetentionPolicy()).apply(save_dir) if auto_delete else None
+        metas = cls.today_metas(save_dir, markets, save_path)
+        try:
+            journal.record(markets, metas, save_path, wallpaper, displays)
+        except OSError:
+            # 日志写入失败只影响下次启动能否跳过联网
+            pass
+        meta = metas.get(markets[0]) or {}
+        return {"path": save_path, "cleaned": report["removed"] if report else 0,
+                "reclaimed": report["bytes"] if report else 0, "is_new": is_new,
+                "fullstartdate": meta.get("fullstartdate"), "apply": applied}
+
+    @classmethod
+    def _resume_daily(cls, save_dir, markets, entry):
+        # 今日工作已完成: 不联网、不设置壁纸，日志中的元数据填入缓存供预览、局域网共享与切换时间计算使用
+        metas = entry.get("meta") or {}
+        for mkt, meta in metas.items():
+            cls.seed_meta(mkt, meta)
+        Metrics.record("journal_hit", 0.0)
+        meta = metas.get(markets[0]) or {}
+        return {"path": os.path.join(save_dir, entry["file"]), "cleaned": 0, "reclaimed": 0, "is_new": False,
+                "fullstartdate": meta.get("fullstartdate"), "apply": {}, "journal": True}
+
+    @classmethod
+    def today_metas(cls, save_dir, markets, save_path):
+        # 本进程获取过的元数据；今日文件已在本地而未联网时由索引记录还原主市场的元数据(不含切换时间)
+        metas = {mkt: cls.cached_meta(mkt) for mkt in markets}
+        if metas[markets[0]] is None:
+            row = WallpaperStore.open(save_dir).get(os.path.basename(save_path))
+            if row is not None and row["urlbase"]:
+                metas[markets[0]] = {"startdate": row["date"], "urlbase": row["urlbase"], "title": row["title"],
+                                     "copyright": row["copyright"]}
+        return {mkt: meta for mkt, meta in metas.items() if meta}
+
+    @classmethod
+    def revalidate_today(cls, save_dir, markets=None, deadline=None):
+        # 由日志还原的元数据在后台重新获取一次(每天至多一次，绕过缓存)，更新缓存与日志。
+        # 今日已校验过时返回 None；主市场的图片已变化时删除今日记录，下次运行走完整流程
+        markets = list(markets or [cls.DEFAULT_MKT])
+        journal = CompletionJournal(save_dir)
+        date = journal.today()
+        entry = journal.load().get(date)
+        if entry is None or entry.get("revalidated_at"):
+            return None
+        today = datetime.date.today().isoformat()
+        metas = {}
+        for mkt in markets:
+            meta = PeerCache.fetch_meta(mkt, deadline) or cls._fetch_bing_meta(mkt, deadline)
+            cls._put_cached_meta((mkt, today), meta)
+            metas[mkt] = meta
+        old = (entry.get("meta") or {}).get(markets[0]) or {}
+        changed = old.get("urlbase") != metas[markets[0]].get("urlbase")
+        if changed:
+            journal.discard(date)
+        else:
+            journal.update(date, meta=metas, revalidated_at=datetime.datetime.now().isoformat(timespec="seconds"))
+        return {"changed": changed, "fullstartdate": metas[markets[0]].get("fullstartdate")}
+
+    @classmethod
+    def check_update(cls, current_ver, force=False, interval_hours=None):
+        if not HAS_PACKAGING:
+            return False, "库缺失", ""
+        checker = UpdateChecker(interval_hours=interval_hours or UpdateChecker.INTERVAL_HOURS)
+        return checker.check(current_ver, force=force)
+
+class WallpaperBackend:
+    # 设置桌面壁纸的后端接口: current() 返回当前壁纸路径(无法获取时为 None)，apply() 设置壁纸
+    name = "none"
+
+    def current(self):
+        return None
+
+    def apply(self, path):
+        raise NotImplementedError
+
+class WindowsBackend(WallpaperBackend):
+    name = "windows"
+    SPI_GETDESKWALLPAPER = 0x0073
+    SPI_SETDESKWALLPAPER = 20
+    # 写入用户配置并广播 WM_SETTINGCHANGE，代价较高，仅在壁纸确实变化时使用
+    SPIF_UPDATEINIFILE = 0x01
+    SPIF_SENDCHANGE = 0x02
+    MAX_PATH = 1024
+
+    def current(self):
+        buf = ctypes.create_unicode_buffer(self.MAX_PATH)
+        if not ctypes.windll.user32.SystemParametersInfoW(self.SPI_GETDESKWALLPAPER, self.MAX_PATH, buf, 0):
+            return None
+        return buf.value or None
+
+    def apply(self, path):
+        if not ctypes.windll.user32.SystemParametersInfoW(self.SPI_SETDESKWALLPAPER, 0, path,
+                                                          self.SPIF_UPDATEINIFILE | self.SPIF_SENDCHANGE):
+            raise ctypes.WinError()
+
+class LinuxDesktopBackend(WallpaperBackend):
+    # GNOME / Unity / Cinnamon / MATE 通过 gsettings 设置；其它桌面回退到 feh(无法读取当前壁纸)
+    name = "linux"
+    GSETTINGS = {
+        "gnome": ("org.gnome.desktop.background", ["picture-uri", "picture-uri-dark"], True),
+        "unity": ("org.gnome.desktop.background", ["picture-uri"], True),
+        "cinnamon": ("org.cinnamon.desktop.background", ["picture-uri"], True),
+        "mate": ("org.mate.background", ["picture-filename"], False),
+    }
+
+    def __init__(self, desktop=None):
+        desktop = (desktop or os.environ.get("XDG_CURRENT_DESKTOP", "")).lower()
+        self.schema = next((v for k, v in self.GSETTINGS.items() if k in desktop.split(":")), None)
+
+    @staticmethod
+    def _run(*cmd):
+        import subprocess
+        try:
+            proc = subprocess.run(cmd, capture_output=True, text=True, timeout=5)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            raise OSError(f"无法执行 {cmd[0]}: {e}")
+        if proc.returncode != 0:
+            raise OSError(proc.stderr.strip() or f"{cmd[0]} 返回 {proc.returncode}")
+        return proc.stdout.strip()
+
+    def current(self):
+        if self.schema is None:
+            return None
+        from urllib.parse import unquote, urlsplit
+        schema, keys, is_uri = self.schema
+        try:
+            value = self._run("gsettings", "get", schema, keys[0]).strip("'")
+        except OSError:
+            return None
+        return unquote(urlsplit(value).path) if is_uri else value or None
+
+    def apply(self, path):
+        if self.schema is None:
+            self._run("feh", "--bg-fill", path)
+            return
+        from urllib.parse import quote
+        schema, keys, is_uri = self.schema
+        value = "file://" + quote(path) if is_uri else path
+        for i, key in enumerate(keys):
+            try:
+                self._run("gsettings", "set", schema, key, value)
+            except OSError:
+                # 旧版 GNOME 没有 picture-uri-dark
+                if i == 0:
+                    raise
+
+class RecordingBackend(WallpaperBackend):
+    # 只记录调用、不改动桌面，供基准与调试使用
+    name = "recording"
+
+    def __init__(self, current=None):
+        self.wallpaper = current
+        self.calls = []
+
+    def current(self):
+        return self.wallpaper
+
+    def apply(self, path):
+        self.calls.append(path)
+        self.wallpaper = path
+
+class WallpaperApplier:
+    # 应用壁纸前比较当前壁纸路径与内容: 路径一致且文件未变(大小与修改时间相同，或索引中的哈希相同)时跳过，
+    # 不写用户配置也不广播。上次应用的文件信息与累计次数跨进程保存，用于计算跳过率
+    backend = None
+    state_path = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_backend(cls):
+        if cls.backend is None:
+            cls.backend = WindowsBackend() if sys.platform.startswith('win') else LinuxDesktopBackend()
+        return cls.backend
+
+    @classmethod
+    def _state_path(cls):
+        return cls.state_path or os.path.join(app_data_dir(), "wallpaper.json")
+
+    @classmethod
+    def _load_state(cls):
+        try:
+            with open(cls._state_path(), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @classmethod
+    def _save_state(cls, state):
+        path = cls._state_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(path + ".tmp", path)
+
+    @staticmethod
+    def _same_path(a, b):
+        return bool(a and b) and os.path.normcase(os.path.abspath(a)) == os.path.normcase(os.path.abspath(b))
+
+    @staticmethod
+    def content_id(path):
+        # 不读取整张图片即可得到的内容标识: 保存目录中的壁纸使用索引中下载时已算好的 SHA-256，
+        # 预缩放图片的文件名本身由原图哈希与尺寸构成；其它文件返回 None，只按大小与修改时间判断
+        directory, name = os.path.split(path)
+        if os.path.basename(directory) == DisplayFitter.CACHE_DIR:
+            return "fitted:" + name
+        if WallpaperStore.parse_name(name)[0] and os.path.exists(
+                os.path.join(library_state_dir(directory), WallpaperStore.DB_NAME)):
+            return WallpaperStore.open(directory).ensure_hash(name)
+        return None
+
+    @classmethod
+    def is_current(cls, image_path):
+        # 上次由本程序应用的即为该文件，且系统当前壁纸未被改为其它图片；只读取状态，不设置壁纸
+        path = os.path.abspath(image_path)
+        if not cls._same_path(cls._load_state().get("path"), path):
+            return False
+        try:
+            current = cls.get_backend().current()
+        except OSError:
+            current = None
+        return current is None or cls._same_path(current, path)
+
+    @classmethod
+    def apply(cls, image_path, force=False):
+        # 返回 {"applied", "ms", "skip_rate"}
+        path = os.path.abspath(image_path)
+        if not os.path.exists(path):
+            raise FileNotFoundError("壁纸文件未找到")
+        with cls._lock:
+            started = time.perf_counter()
+            backend = cls.get_backend()
+            state = cls._load_state()
+            st = os.stat(path)
+            try:
+                current = backend.current()
+            except OSError:
+                current = None
+            content = None
+            unchanged = (not force and cls._same_path(state.get("path"), path)
+                         and (current is None or cls._same_path(current, path)))
+            if unchanged and (state.get("size"), state.get("mtime_ns")) != (st.st_size, st.st_mtime_ns):
+                # 同一路径的文件被重写过(如重新下载)，内容相同时仍可跳过；无法标识内容时重新设置
+                content = cls.content_id(path)
+                unchanged = content is not None and content == state.get("content")
+
+            if unchanged:
+                state["skipped"] = state.get("skipped", 0) + 1
+                Metrics.record("apply_skip", time.perf_counter() - started, backend=backend.name)
+            else:
+                with Metrics.span("apply", backend=backend.name):
+                    backend.apply(path)
+                state["applied"] = state.get("applied", 0) + 1
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            # 内容标识取自索引，供下次判断同路径重写的文件是否内容相同
+            if content is None:
+                content = state.get("content") if unchanged else cls.content_id(path)
+            state.pop("sha256", None)
+            state.update(path=path, size=st.st_size, mtime_ns=st.st_mtime_ns, content=content)
+            cls._save_state(state)
+            applied, skipped = state.get("applied", 0), state.get("skipped", 0)
+            return {"applied": not unchanged, "ms": elapsed_ms, "skip_rate": skipped / (applied + skipped)}
+
+class UpdateChecker:
+    # 检查 GitHub 最新版本: 间隔内直接使用上次结果；请求时带上 ETag / Last-Modified 做条件请求，
+    # 304 不计入 GitHub 的限额；剩余额度过低或被限流时等到额度重置。状态与结果跨进程保存
+    INTERVAL_HOURS = 24
+    LOW_REMAINING = 5
+    RATE_LIMIT_BACKOFF = 60 * 60  # 被限流但响应未给出重置时间时的等待(秒)
+
+    def __init__(self, state_path=None, interval_hours=INTERVAL_HOURS, clock=time.time):
+        self.state_path = state_path or os.path.join(app_data_dir(), "update.json")
+        self.interval = max(0, interval_hours) * 3600
+        self.clock = clock
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self, state):
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    @staticmethod
+    def compare(current_ver, release):
+        from packaging import version
+        latest_tag = re.sub(r'^v', '', release.get('tag_name', ''))
+        if version.parse(latest_tag) > version.parse(current_ver):
+            return True, latest_tag, release.get('html_url')
+        return False, latest_tag, ""
+
+    def _limited_until(self, resp, now):
+        # 返回应暂停请求直到的时间戳，额度充足时为 0
+        headers = resp.headers
+        try:
+            remaining = int(headers.get("X-RateLimit-Remaining", -1))
+            reset = float(headers.get("X-RateLimit-Reset", 0))
+            retry_after = float(headers.get("Retry-After", 0))
+        except ValueError:
+            remaining, reset, retry_after = -1, 0, 0
+        if retry_after:
+            return now + retry_after
+        if resp.status_code in (403, 429) or 0 <= remaining < self.LOW_REMAINING:
+            return reset if reset > now else now + self.RATE_LIMIT_BACKOFF
+        return 0
+
+    def check(self, current_ver, force=False):
+        # force 为手动检查，跳过间隔限制，但仍遵守限流等待
+        state = self._load_state()
+        release = state.get("release")
+        now = self.clock()
+        if release and not force and now < state.get("checked_at", 0) + self.interval:
+            return self.compare(current_ver, release)
+        if now < state.get("paused_until", 0):
+            if release:
+                return self.compare(current_ver, release)
+            resume = datetime.datetime.fromtimestamp(state["paused_until"]).strftime("%H:%M")
+            raise RuntimeError(f"GitHub 接口访问受限，请于 {resume} 后再试")
+
+        headers = {"Accept": "application/vnd.github+json"}
+        if release and state.get("etag"):
+            headers["If-None-Match"] = state["etag"]
+        if release and state.get("last_modified"):
+            headers["If-Modified-Since"] = state["last_modified"]
+        try:
+            resp = WallpaperUtils.timed_get(WallpaperUtils.UPDATE_API, timeout=5, verify=True, headers=headers)
+        except Exception as e:
+            resp = getattr(e, "response", None)
+            if resp is None or resp.status_code not in (403, 429):
+                raise
+        state["paused_until"] = self._limited_until(resp, now)
+
+        if resp.status_code in (403, 429):
+            self._save_state(state)
+            if release:
+                return self.compare(current_ver, release)
+            raise RuntimeError("GitHub 接口访问受限，请稍后再试")
+        if resp.status_code != 304:
+            info = resp.json()
+            release = {"tag_name": info.get("tag_name", ""), "html_url": info.get("html_url")}
+            state.update(release=release, etag=resp.headers.get("ETag"),
+                         last_modified=resp.headers.get("Last-Modified"))
+        state["checked_at"] = now
+        self._save_state(state)
+        return self.compare(current_ver, release)
+
+class VariantSelector:
+    # 按所有显示器的物理像素选择能铺满屏幕且无需放大的最小 Bing 图片规格；
+    # 非 UHD 规格是否存在由 HEAD 请求确认，结果按 urlbase 缓存
+    VARIANTS = (("1366x768", 1366, 768), ("1920x1080", 1920, 1080), ("1920x1200", 1920, 1200),
+                ("UHD", 3840, 2160))
+    DEFAULT = "UHD"
+    HEAD_TTL = 6 * 3600
+
+    preference = "auto"  # auto 或固定规格名，如 UHD / 1920x1080
+    _displays = None
+    _head_cache = {}
+    _head_lock = threading.Lock()
+
+    @classmethod
+    def names(cls):
+        return [name for name, _, _ in cls.VARIANTS]
+
+    @classmethod
+    def configure(cls, preference=None, displays=None):
+        cls.preference = preference or "auto"
+        cls._displays = [(int(w), int(h)) for w, h in displays] if displays else None
+
+    @staticmethod
+    def detect_displays():
+        # 无界面模式下直接枚举显示器；声明 DPI 感知后得到的是物理像素而非缩放后的尺寸
+        if not sys.platform.startswith('win'):
+            return []
+        from ctypes import wintypes
+        user32 = ctypes.windll.user32
+        try:
+            user32.SetProcessDPIAware()
+        except AttributeError:
+            pass
+        sizes = []
+        MONITORENUMPROC = ctypes.WINFUNCTYPE(wintypes.BOOL, wintypes.HMONITOR, wintypes.HDC,
+                                             ctypes.POINTER(wintypes.RECT), wintypes.LPARAM)
+
+        def callback(hmonitor, hdc, rect, lparam):
+            r = rect.contents
+            sizes.append((r.right - r.left, r.bottom - r.top))
+            return True
+
+        user32.EnumDisplayMonitors(None, None, MONITORENUMPROC(callback), 0)
+        return sizes
+
+    @classmethod
+    def displays(cls):
+        return cls._displays if cls._displays is not None else cls.detect_displays()
+
+    @classmethod
+    def required_size(cls):
+        # 壁纸按"填充"铺到每块屏幕，规格需在宽、高上都覆盖最大的那块屏幕
+        displays = cls.displays()
+        if not displays:
+            return None
+        return max(w for w, _ in displays), max(h for _, h in displays)
+
+    @classmethod
+    def exists(cls, urlbase, variant, deadline=None):
+        key = (urlbase, variant)
+        now = time.monotonic()
+        with cls._head_lock:
+            hit = cls._head_cache.get(key)
+            if hit and now - hit[0] < cls.HEAD_TTL:
+                return hit[1]
+        # 局域网内已有该规格时无需再向 Bing 确认
+        if PeerCache.peers and PeerCache.lookup(urlbase, variant, deadline)[0]:
+            return True
+        url = f"{WallpaperUtils.BING_HOST}{urlbase}_{variant}.jpg"
+        try:
+            resp = WallpaperUtils.get_session().head(url, timeout=deadline_timeout(deadline, 5),
+                                                     verify=False, allow_redirects=False)
+        except DeadlineExceeded:
+            raise
+        except Exception:
+            # 网络错误不缓存，本次按不存在处理
+            return False
+        found = resp.status_code == 200 and resp.headers.get("Content-Type", "").startswith("image/")
+        with cls._head_lock:
+            cls._head_cache[key] = (now, found)
+        return found
+
+    @classmethod
+    def choose(cls, urlbase, deadline=None):
+        if cls.preference != "auto":
+            return cls.preference
+        need = cls.required_size()
+        if need is None:
+            return cls.DEFAULT
+        for name, width, height in cls.VARIANTS:
+            if width < need[0] or height < need[1]:
+                continue
+            if name == cls.DEFAULT or cls.exists(urlbase, name, deadline):
+                return name
+        return cls.DEFAULT
+
+def _fit_image(src, dst, width, height, quality):
+    # JPEG 先按 draft 以 1/2^n 比例解码，再居中裁剪到目标宽高比并 Lanczos 缩放
+    from PIL import Image, ImageOps
+    started = time.perf_counter()
+    with Image.open(src) as img:
+        megapixels = img.width * img.height / 1e6
+        img.draft("RGB", (width, height))
+        fitted = ImageOps.fit(img.convert("RGB"), (width, height), Image.LANCZOS, centering=(0.5, 0.5))
+    fitted.save(dst + ".tmp", "JPEG", quality=quality, optimize=True)
+    os.replace(dst + ".tmp", dst)
+    return time.perf_counter() - started, megapixels
+
+class DisplayFitter:
+    # 为每种显示器尺寸预先裁剪、缩放壁纸，系统设置壁纸时不必再解码并缩放整张原图；
+    # 结果按 (原图哈希, 尺寸) 缓存在 .fitted 目录。需要 Pillow，缺失时直接使用原图
+    CACHE_DIR = ".fitted"
+    QUALITY = 92
+    MAX_ENTRIES = 16
+
+    def __init__(self, save_dir):
+        self.save_dir = save_dir
+        self.cache_dir = os.path.join(save_dir, self.CACHE_DIR)
+
+    def cache_path(self, digest, geometry):
+        return os.path.join(self.cache_dir, f"{digest[:16]}_{geometry[0]}x{geometry[1]}.jpg")
+
+    def fit(self, image_path, geometries, digest=None):
+        # 返回 {"outputs": {(宽, 高): 路径}, "cached", "seconds", "ms_per_mp"}，只生成未命中缓存的尺寸。
+        # 桌面只设置一张壁纸，实际每次只需一种尺寸，因此在本进程内依次生成，不启动进程池
+        started = time.perf_counter()
+        digest = digest or WallpaperStore.open(os.path.dirname(image_path)).ensure_hash(
+            os.path.basename(image_path)) or file_sha256(image_path)
+        outputs, pending = {}, []
+        for geometry in dict.fromkeys((int(w), int(h)) for w, h in geometries):
+            path = outputs[geometry] = self.cache_path(digest, geometry)
+            if not os.path.exists(path):
+                pending.append(geometry)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        jobs = [(image_path, outputs[g], g[0], g[1], self.QUALITY) for g in pending]
+        timings = [_fit_image(*job) for job in jobs]
+
+        work_seconds = sum(t for t, _ in timings)
+        megapixels = sum(mp for _, mp in timings)
+        if jobs:
+            self._prune()
+        elapsed = time.perf_counter() - started
+        Metrics.record("fit", elapsed, outputs=len(outputs), generated=len(jobs))
+        return {"outputs": outputs, "cached": len(outputs) - len(jobs), "seconds": elapsed,
+                "ms_per_mp": work_seconds * 1000 / megapixels if megapixels else 0.0}
+
+    def wallpaper_for(self, image_path, displays=None):
+        # 所有显示器尺寸一致时返回预缩放后的图片，否则(或无法处理时)返回原图由系统缩放
+        displays = displays if displays is not None else VariantSelector.displays()
+        geometries = set((int(w), int(h)) for w, h in displays or [])
+        if not HAS_PILLOW or len(geometries) != 1:
+            return image_path
+        geometry = next(iter(geometries))
+        try:
+            return self.fit(image_path, [geometry])["outputs"][geometry]
+        except Exception:
+            return image_path
+
+    def _prune(self):
+        try:
+            entries = sorted(os.scandir(self.cache_dir), key=lambda e: e.stat().st_mtime, reverse=True)
+        except FileNotFoundError:
+            return
+        for entry in entries[self.MAX_ENTRIES:]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+class DownloadProgress:
+    # 下载进度的发布/订阅: 下载线程按时间节流发布，订阅者(如预览)自行按 save_path 过滤。
+    # 事件中的 prefix 为已写入文件且从开头连续的字节数，可用于边下载边解码；
+    # 没有订阅者时下载线程不做额外的刷盘与统计
+    INTERVAL = 0.1
+
+    _listeners = set()
+    _lock = threading.Lock()
+
+    @classmethod
+    def subscribe(cls, callback):
+        with cls._lock:
+            cls._listeners.add(callback)
+
+        def release():
+            with cls._lock:
+                cls._listeners.discard(callback)
+        return Registration(release)
+
+    @classmethod
+    def active(cls):
+        return bool(cls._listeners)
+
+    @classmethod
+    def publish(cls, event):
+        with cls._lock:
+            listeners = list(cls._listeners)
+        for callback in listeners:
+            try:
+                callback(event)
+            except Exception:
+                pass
+
+class SegmentedDownloader:
+    # 按 HTTP Range 分段并行下载，写入 .part 临时文件，
+    # 进度记录在 .part.json 中以便重启后续传；校验通过后原子重命名为最终文件
+    CHUNK_SIZE = 64 * 1024
+    FLUSH_EVERY = 1024 * 1024
+    MIN_SEGMENT = 512 * 1024
+    MAX_SEGMENTS = 4
+
+    def __init__(self, session, url, save_path, segments=MAX_SEGMENTS, timeout=30, throttle=None, deadline=None):
+        self.session = session
+        self.url = url
+        self.save_path = save_path
+        self.part_path = save_path + ".part"
+        self.state_path = save_path + ".part.json"
+        self.max_segments = max(1, segments)
+        self.timeout = timeout
+        self.throttle = throttle
+        self.deadline = deadline
+        self._lock = threading.Lock()
+        self._state = None
+        self._write_seconds = 0.0
+        self._written = 0
+        self._hasher = None
+        self.sha256 = None
+        # 各分段已刷到文件的字节数与上次发布进度的时间，仅在有进度订阅者时维护
+        self._flushed = [0]
+        self._resumed = 0
+        self._total = 0
+        self._reported_at = 0.0
+
+    def run(self):
+        with Metrics.span("body_transfer", url=self.url) as span:
+            try:
+                self._download()
+            except Exception:
+                # 取消时断开连接会让读取线程抛出各种读取错误，统一按取消处理
+                if self.deadline:
+                    self.deadline.check()
+                raise
+            span.bytes = self._written
+        Metrics.record("disk_write", self._write_seconds, self._written, hash_reread=self._hasher.reread)
+        return self.save_path
+
+    def _download(self):
+        from concurrent.futures import ThreadPoolExecutor
+        total, ranged, validator = self._probe()
+        self._hasher = StreamHasher(self.part_path)
+        if ranged and total > 0:
+            self._state = self._load_state(total, validator) or self._new_state(total, validator)
+            self._save_state()
+            segments = self._state["segments"]
+            for start, _, done in segments:
+                self._hasher.on_disk(start, done)
+            self._flushed = [seg[2] for seg in segments]
+            self._resumed = sum(self._flushed)
+            pending = [i for i, seg in enumerate(segments) if seg[2] < seg[1] - seg[0] + 1]
+            if pending:
+                with ThreadPoolExecutor(max_workers=len(pending)) as pool:
+                    for future in [pool.submit(self._fetch_segment, i) for i in pending]:
+                        future.result()
+        else:
+            self._fetch_whole()
+
+        if not self._verify(total):
+            self._discard()
+            raise IOError("下载的图片校验失败")
+        self._hasher.catch_up(total or os.path.getsize(self.part_path))
+        self.sha256 = self._hasher.hexdigest()
+        os.replace(self.part_path, self.save_path)
+        self._remove(self.state_path)
+        if DownloadProgress.active():
+            size = os.path.getsize(self.save_path)
+            DownloadProgress.publish({"save_path": self.save_path, "part_path": self.save_path, "done": size,
+                                      "total": size, "prefix": size, "finished": True})
+
+    def _prefix(self):
+        if self._state is None:
+            return self._flushed[0]
+        prefix = 0
+        for (start, end, _), flushed in zip(self._state["segments"], self._flushed):
+            prefix = start + flushed
+            if prefix <= end:
+                break
+        return prefix
+
+    def _report(self, f, index, done):
+        # 有订阅者时每块都刷到文件，保证发布的 prefix 范围内的数据可被其它线程读到
+        f.flush()
+        self._flushed[index] = done
+        now = time.monotonic()
+        with self._lock:
+            if now - self._reported_at < DownloadProgress.INTERVAL:
+                return
+            self._reported_at = now
+            written = self._written
+        total = self._state["total"] if self._state else self._total
+        DownloadProgress.publish({"save_path": self.save_path, "part_path": self.part_path,
+                                  "done": self._resumed + written, "total": total, "prefix": self._prefix(),
+                                  "finished": False})
+
+    def _write(self, f, chunk):
+        started = time.perf_counter()
+        f.write(chunk)
+        with self._lock:
+            self._write_seconds += time.perf_counter() - started
+            self._written += len(chunk)
+
+    def _timeout(self):
+        return deadline_timeout(self.deadline, self.timeout)
+
+    def _watch(self, resp):
+        # 取消时断开连接，中断阻塞中的读取
+        return self.deadline.on_cancel(lambda: abort_response(resp)) if self.deadline else Registration()
+
+    def _probe(self):
+        resp = self.session.get(self.url, verify=False, stream=True, timeout=self._timeout(),
+                                headers={"Range": "bytes=0-0"})
+        Metrics.record("first_byte", resp.elapsed.total_seconds(), host=WallpaperUtils.split_host(self.url)[0])
+        with resp, self._watch(resp):
+            resp.raise_for_status()
+            validator = resp.headers.get("ETag") or resp.headers.get("Last-Modified") or ""
+            if resp.status_code == 206:
+                m = re.match(r"bytes\s+0-0/(\d+)", resp.headers.get("Content-Range", ""))
+                if m:
+                    return int(m.group(1)), True, validator
+            return int(resp.headers.get("Content-Length") or 0), False, validator
+
+    def _new_state(self, total, validator):
+        count = max(1, min(self.max_segments, total // self.MIN_SEGMENT))
+        size = -(-total // count)
+        segments = [[start, min(start + size, total) - 1, 0] for start in range(0, total, size)]
+        # 按 Content-Length 预分配
+        with open(self.part_path, 'wb') as f:
+            f.truncate(total)
+        return {"url": self.url, "total": total, "validator": validator, "segments": segments}
+
+    def _load_state(self, total, validator):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if (state.get("url") == self.url and state.get("total") == total
+                    and state.get("validator") == validator
+                    and os.path.getsize(self.part_path) == total):
+                return state
+        except (OSError, ValueError):
+            pass
+        return None
+
+    def _save_state(self):
+        with self._lock:
+            tmp_path = self.state_path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._state, f)
+            os.replace(tmp_path, self.state_path)
+
+    def _fetch_segment(self, index):
+        seg = self._state["segments"][index]
+        start, end = seg[0], seg[1]
+        offset = start + seg[2]
+        headers = {"Range": f"bytes={offset}-{end}"}
+        if self._state["validator"]:
+            headers["If-Range"] = self._state["validator"]
+        resp = self.session.get(self.url, verify=False, stream=True, timeout=self._timeout(), headers=headers)
+        with resp, self._watch(resp):
+            resp.raise_for_status()
+            if resp.status_code != 206:
+                raise IOError("服务器未返回分段数据")
+            with open(self.part_path, 'r+b') as f:
+                f.seek(offset)
+                unflushed = 0
+                try:
+                    for chunk in resp.iter_content(chunk_size=self.CHUNK_SIZE):
+                        if not chunk: continue
+                        if self.deadline: self.deadline.check()
+                        chunk = chunk[:end + 1 - offset]
+                        if self.throttle: self.throttle.consume(len(chunk))
+                        self._write(f, chunk)
+                        self._hasher.update(offset, chunk)
+                        offset += len(chunk)
+                        unflushed += len(chunk)
+                        if DownloadProgress.active():
+                            self._report(f, index, offset - start)
+                        # 先落盘再记录进度，保证续传时已记录的部分一定有效
+                        if unflushed >= self.FLUSH_EVERY:
+                            f.flush()
+                            seg[2] = offset - start
+                            unflushed = 0
+                            self._save_state()
+                        if offset > end: break
+                finally:
+                    # 正常结束、取消或连接中断时都记录本分段的进度，不足 FLUSH_EVERY 的分段也能续传
+                    f.flush()
+                    seg[2] = offset - start
+                    self._save_state()
+        if offset <= end:
+            raise IOError("分段下载不完整")
+
+    def _fetch_whole(self):
+        resp = self.session.get(self.url, verify=False, stream=True, timeout=self._timeout())
+        with resp, self._watch(resp):
+            resp.raise_for_status()
+            expected = int(resp.headers.get("Content-Length") or 0)
+            self._total = expected
+            offset = 0
+            with open(self.part_path, 'wb') as f:
+                for chunk in resp.iter_content(chunk_size=self.CHUNK_SIZE):
+                    if not chunk: continue
+                    if self.deadline: self.deadline.check()
+                    if self.throttle: self.throttle.consume(len(chunk))
+                    self._write(f, chunk)
+                    self._hasher.update(offset, chunk)
+                    offset += len(chunk)
+                    if DownloadProgress.active():
+                        self._report(f, 0, offset)
+        if expected and offset != expected:
+            self._discard()
+            raise IOError("下载的数据长度与 Content-Length 不一致")
+
+    def _verify(self, total):
+        # 大小与 Content-Length 一致，JPEG 头部标记段完整，且以 EOI 结尾
+        try:
+            size = os.path.getsize(self.part_path)
+            if size < 4 or (total and size != total):
+                return False
+            with open(self.part_path, 'rb') as f:
+                f.seek(max(0, size - 1024))
+                tail = f.read()
+        except OSError:
+            return False
+        return tail.rstrip(b"\x00").endswith(b"\xff\xd9") and jpeg_structure_ok(self.part_path)
+
+    def _discard(self):
+        self._remove(self.part_path)
+        self._remove(self.state_path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class TokenBucket:
+    # 多个下载线程共享的带宽上限(字节/秒)
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                # 单次请求超过桶容量时允许透支，由后续等待补齐
+                if self._tokens >= min(amount, self.capacity):
+                    self._tokens -= amount
+                    return
+                wait = (min(amount, self.capacity) - self._tokens) / self.rate
+            time.sleep(wait)
+
+class ArchiveBackfill:
+    # 通过 HPImageArchive 的 idx/n 分页补全 save_dir 中缺失的历史壁纸
+    PAGE_SIZE = 8      # 接口单次最多返回 8 张
+    MAX_IDX = 7        # 接口 idx 上限，超出后会被钳制为 7
+    WORKERS = 4
+    PER_HOST = 2
+
+    def __init__(self, save_dir, mkt=WallpaperUtils.DEFAULT_MKT, max_idx=MAX_IDX,
+                 workers=WORKERS, per_host=PER_HOST, max_rate=None):
+        self.save_dir = save_dir
+        self.mkt = mkt
+        self.max_idx = max_idx
+        self.workers = max(1, workers)
+        self.per_host = max(1, per_host)
+        self.throttle = TokenBucket(max_rate) if max_rate else None
+        self._host_slots = {}
+        self._host_lock = threading.Lock()
+
+    def list_archive(self):
+        images, seen = [], set()
+        idx = 0
+        while True:
+            page = WallpaperUtils.fetch_archive(self.mkt, idx, self.PAGE_SIZE)
+            fresh = [img for img in page if img.get('startdate') and img['startdate'] not in seen]
+            if not fresh:
+                break
+            for img in fresh:
+                seen.add(img['startdate'])
+            images.extend(fresh)
+            if len(page) < self.PAGE_SIZE or idx >= self.max_idx:
+                break
+            # 最后一页从 idx 上限处取，重叠部分按 startdate 去重
+            idx = min(idx + len(page), self.max_idx)
+        return images
+
+    def find_missing(self, images):
+        # 由索引查询已有的主市场图片，只核对存档涉及日期的记录是否仍在磁盘上
+        store = WallpaperStore.open(self.save_dir)
+        wanted = {img['startdate'] for img in images}
+        existing = {row["date"] for row in store.history()
+                    if row["date"] in wanted and store.PRIMARY_RE.match(row["filename"])
+                    and store.lookup(row["filename"])}
+        return [img for img in images if img['startdate'] not in existing]
+
+    def _host_slot(self, url):
+        host = url.split("/", 3)[2] if "://" in url else ""
+        with self._host_lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.per_host)
+            return self._host_slots[host]
+
+    def _download(self, img):
+        variant = VariantSelector.choose(img['urlbase'])
+        url = f"{WallpaperUtils.BING_HOST}{img['urlbase']}_{variant}.jpg"
+        save_path = os.path.join(self.save_dir, f"{img['startdate']}_{variant}.jpg")
+        # 按主机限制并发，每张图只用一条连接，由全局令牌桶限速
+        with self._host_slot(url):
+            sha256 = WallpaperUtils.download_image(url, save_path, segments=1, throttle=self.throttle)
+        WallpaperUtils.store_download(save_path, sha256, meta=img, market=self.mkt)
+        return os.path.getsize(save_path)
+
+    def run(self):
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        started = time.perf_counter()
+        os.makedirs(self.save_dir, exist_ok=True)
+        missing = self.find_missing(self.list_archive())
+        downloaded, total_bytes, errors = 0, 0, []
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self._download, img): img for img in missing}
+            for future in as_completed(futures):
+                try:
+                    total_bytes += future.result()
+                    downloaded += 1
+                except Exception as e:
+                    errors.append(f"{futures[future]['startdate']}: {e}")
+        elapsed = max(time.perf_counter() - started, 1e-6)
+        return {
+            "missing": len(missing),
+            "downloaded": downloaded,
+            "errors": errors,
+            "bytes": total_bytes,
+            "seconds": elapsed,
+            "images_per_sec": downloaded / elapsed,
+            "mb_per_sec": total_bytes / (1024 * 1024) / elapsed,
+        }
+
+class MultiMarketFetch:
+    # 并行获取多个市场的今日元数据，同一张图片只下载一次，并在索引中记录其所属的市场
+    MAX_WORKERS = 4  # 同时处理的市场数上限
+
+    def __init__(self, save_dir, markets):
+        self.save_dir = save_dir
+        self.markets = parse_markets(markets) or [WallpaperUtils.DEFAULT_MKT]
+
+    @staticmethod
+    def image_key(urlbase):
+        # 不同市场的 urlbase 形如 /th?id=OHR.Name_ZH-CN123 与 /th?id=OHR.Name_EN-US456，按图片名去重
+        m = re.search(r"OHR\.([A-Za-z0-9]+)", urlbase)
+        return m.group(1) if m else urlbase
+
+    def _resolve(self, deadline=None):
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=min(len(self.markets), self.MAX_WORKERS)) as pool:
+            metas = list(pool.map(lambda mkt: WallpaperUtils.get_bing_meta(mkt, deadline), self.markets))
+        groups = {}
+        for mkt, meta in zip(self.markets, metas):
+            key = self.image_key(meta['urlbase'])
+            groups.setdefault(key, {"meta": meta, "markets": []})["markets"].append(mkt)
+        return groups
+
+    def _filename(self, key, group, deadline=None):
+        primary = self.markets[0] in group["markets"]
+        if primary:
+            existing = WallpaperUtils.find_today(self.save_dir)
+            if existing:
+                return os.path.basename(existing)
+        today = datetime.date.today().strftime("%Y%m%d")
+        variant = VariantSelector.choose(group["meta"]["urlbase"], deadline)
+        if primary:
+            return f"{today}_{variant}.jpg"
+        return f"{today}_{re.sub(r'[^A-Za-z0-9]', '', key)[:40]}_{variant}.jpg"
+
+    def run(self, deadline=None):
+        from concurrent.futures import ThreadPoolExecutor
+        store = WallpaperStore.open(self.save_dir)
+        groups = self._resolve(deadline)
+        targets = {self._filename(key, group, deadline): group for key, group in groups.items()}
+
+        def fetch(item):
+            name, group = item
+            meta = group["meta"]
+            variant = WallpaperStore.parse_name(name)[1]
+            WallpaperUtils.ensure_image(f"{WallpaperUtils.BING_HOST}{meta['urlbase']}_{variant}.jpg",
+                                        os.path.join(self.save_dir, name), meta=meta, market=group["markets"][0],
+                                        deadline=deadline)
+            store.add_markets(name, group["markets"])
+            return name, store.ensure_hash(name)
+
+        with ThreadPoolExecutor(max_workers=min(len(targets), self.MAX_WORKERS)) as pool:
+            hashed = list(pool.map(fetch, targets.items()))
+
+        # 图片名不同但内容相同时只保留一份(优先主市场的文件)
+        by_hash = {}
+        for name, digest in hashed:
+            kept = by_hash.get(digest)
+            if kept is None:
+                by_hash[digest] = name
+                continue
+            os.remove(os.path.join(self.save_dir, name))
+            store.add_markets(kept, store.markets(name))
+            store.remove([name])
+        return {"markets": len(self.markets), "unique": len(by_hash),
+                "files": sorted(by_hash.values())}
+
+# ==========================================
+# 2. 壁纸索引
+# ==========================================
+class WallpaperStore:
+    # save_dir 的 SQLite 索引(位于应用数据目录)，记录每张已下载壁纸的元数据，替代目录扫描与文件名解析
+    DB_NAME = "wallpapers.db"
+    NAME_RE = re.compile(r"^(\d{8})_(?:.*_)?([^_.]+)\.jpg$")
+    # 主市场文件只有 日期_规格 两段，其它市场的文件在中间带图片名
+    PRIMARY_RE = re.compile(r"^\d{8}_[^_.]+\.jpg$")
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS images (
+            filename   TEXT PRIMARY KEY,
+            date       TEXT NOT NULL,
+            market     TEXT,
+            urlbase    TEXT,
+            resolution TEXT,
+            size       INTEGER NOT NULL,
+            mtime_ns   INTEGER NOT NULL,
+            sha256     TEXT,
+            title      TEXT,
+            copyright  TEXT,
+            pinned     INTEGER NOT NULL DEFAULT 0,
+            duplicate_of TEXT
+        );
+        CREATE INDEX IF NOT EXISTS images_date ON images(date);
+        CREATE INDEX IF NOT EXISTS images_sha256 ON images(sha256);
+        CREATE TABLE IF NOT EXISTS image_markets (
+            filename TEXT NOT NULL,
+            market   TEXT NOT NULL,
+            PRIMARY KEY (filename, market)
+        );
+    """
+
+    # 元数据字段只在有新值时覆盖；文件大小或修改时间变化时作废旧哈希
+    UPSERT = """
+        INSERT INTO images (filename, date, market, urlbase, resolution, size, mtime_ns, sha256, title, copyright,
+                            duplicate_of)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(filename) DO UPDATE SET
+            date = excluded.date,
+            market = COALESCE(excluded.market, images.market),
+            urlbase = COALESCE(excluded.urlbase, images.urlbase),
+            resolution = COALESCE(excluded.resolution, images.resolution),
+            sha256 = CASE
+                WHEN excluded.sha256 IS NOT NULL THEN excluded.sha256
+                WHEN images.size = excluded.size AND images.mtime_ns = excluded.mtime_ns THEN images.sha256
+                ELSE NULL END,
+            size = excluded.size,
+            mtime_ns = excluded.mtime_ns,
+            title = COALESCE(excluded.title, images.title),
+            copyright = COALESCE(excluded.copyright, images.copyright),
+            duplicate_of = COALESCE(excluded.duplicate_of, images.duplicate_of)
+    """
+
+    @classmethod
+    def open(cls, save_dir):
+        key = os.path.abspath(save_dir)
+        with cls._instances_lock:
+            store = cls._instances.get(key)
+            if store is None:
+                store = cls._instances[key] = cls(key)
+            return store
+
+    def __init__(self, save_dir):
+        import sqlite3
+        os.makedirs(save_dir, exist_ok=True)
+        self.save_dir = save_dir
+        # 索引放在应用数据目录；旧版本保存目录中的数据库连同 WAL 文件首次打开时迁移过去
+        db_path = library_state_path(save_dir, self.DB_NAME, companions=("-wal", "-shm"))
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        fresh = not os.path.exists(db_path)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(images)")}
+        if "pinned" not in columns:
+            self._conn.execute("ALTER TABLE images ADD COLUMN pinned INTEGER NOT NULL DEFAULT 0")
+        if "duplicate_of" not in columns:
+            self._conn.execute("ALTER TABLE images ADD COLUMN duplicate_of TEXT")
+        if fresh:
+            # 旧版本留下的目录首次打开时从磁盘建立索引
+            self.rebuild()
+
+    @classmethod
+    def parse_name(cls, filename):
+        m = cls.NAME_RE.match(filename)
+        return (m.group(1), m.group(2)) if m else (None, None)
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params)]
+
+    def get(self, filename):
+        rows = self._query("SELECT * FROM images WHERE filename = ?", (filename,))
+        return rows[0] if rows else None
+
+    def lookup(self, filename):
+        # 返回与磁盘一致的索引记录；文件已删除时清除记录，未索引或已变化的文件重新登记
+        row = self.get(filename)
+        try:
+            st = os.stat(os.path.join(self.save_dir, filename))
+        except FileNotFoundError:
+            if row:
+                self.remove([filename])
+            return None
+        if row and row["size"] == st.st_size and row["mtime_ns"] == st.st_mtime_ns:
+            return row
+        return self.record_file(os.path.join(self.save_dir, filename))
+
+    def record_file(self, path, meta=None, market=None, sha256=None, duplicate_of=None):
+        filename = os.path.basename(path)
+        date, resolution = self.parse_name(filename)
+        if date is None:
+            raise ValueError(f"无法识别的壁纸文件名: {filename}")
+        st = os.stat(path)
+        meta = meta or {}
+        with self._lock, self._conn:
+            self._conn.execute(self.UPSERT, (
+                filename, date, market, meta.get("urlbase"), resolution, st.st_size, st.st_mtime_ns,
+                sha256, meta.get("title"), meta.get("copyright"), duplicate_of))
+            if market:
+                self._conn.execute("INSERT OR IGNORE INTO image_markets VALUES (?, ?)", (filename, market))
+        return self.get(filename)
+
+    def ensure_hash(self, filename):
+        row = self.lookup(filename)
+        if row is None:
+            return None
+        if not row["sha256"]:
+            row["sha256"] = file_sha256(os.path.join(self.save_dir, filename))
+            with self._lock, self._conn:
+                self._conn.execute("UPDATE images SET sha256 = ? WHERE filename = ?", (row["sha256"], filename))
+        return row["sha256"]
+
+    def add_markets(self, filename, markets):
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR IGNORE INTO image_markets VALUES (?, ?)",
+                                   [(filename, mkt) for mkt in markets])
+
+    def markets(self, filename):
+        return [row["market"] for row in self._query(
+            "SELECT market FROM image_markets WHERE filename = ? ORDER BY rowid", (filename,))]
+
+    def set_pinned(self, filename, pinned=True):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE images SET pinned = ? WHERE filename = ?", (int(bool(pinned)), filename))
+
+    def pinned_filenames(self):
+        return {row["filename"] for row in self._query("SELECT filename FROM images WHERE pinned = 1")}
+
+    def find_by_hash(self, sha256):
+        return self._query("SELECT * FROM images WHERE sha256 = ? ORDER BY date", (sha256,))
+
+    def link_duplicate(self, filename, sha256):
+        # 已有相同内容的文件时把 filename 替换为指向它的硬链接，返回共享数据的那组文件的代表文件名；
+        # 文件系统不支持硬链接时保留副本，返回 None
+        path = os.path.join(self.save_dir, filename)
+        for row in self.find_by_hash(sha256):
+            if row["filename"] == filename:
+                continue
+            source = os.path.join(self.save_dir, row["filename"])
+            try:
+                if not os.path.samefile(source, path):
+                    os.link(source, path + ".link")
+                    os.replace(path + ".link", path)
+            except FileNotFoundError:
+                continue
+            except OSError:
+                SegmentedDownloader._remove(path + ".link")
+                return None
+            return row["duplicate_of"] or row["filename"]
+        return None
+
+    def link_groups(self):
+        # 文件名 -> 所属硬链接组(代表文件名)，供按实际占用统计空间
+        return {row["filename"]: row["duplicate_of"] for row in self._query(
+            "SELECT filename, duplicate_of FROM images WHERE duplicate_of IS NOT NULL")}
+
+    def primary_for_date(self, date):
+        for row in self._query("SELECT filename FROM images WHERE date = ? ORDER BY mtime_ns DESC", (date,)):
+            if self.PRIMARY_RE.match(row["filename"]) and self.lookup(row["filename"]):
+                return row["filename"]
+        return None
+
+    def filenames_not_on(self, date):
+        return [row["filename"] for row in self._query(
+            "SELECT filename FROM images WHERE date != ?", (date,))]
+
+    def history(self, limit=-1, offset=0):
+        return self._query("SELECT * FROM images ORDER BY date DESC, filename LIMIT ? OFFSET ?", (limit, offset))
+
+    def count(self):
+        return self._query("SELECT COUNT(*) AS n FROM images")[0]["n"]
+
+    def remove(self, filenames):
+        params = [(name,) for name in filenames]
+        if not params:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM images WHERE filename = ?", params)
+            self._conn.executemany("DELETE FROM image_markets WHERE filename = ?", params)
+
+    def rebuild(self, hash_files=False):
+        # 单次 scandir 直接使用目录项自带的 stat 信息，批量写入；哈希默认按需计算
+        rows = []
+        with os.scandir(self.save_dir) as entries:
+            for entry in entries:
+                date, resolution = self.parse_name(entry.name)
+                if date is None or not entry.is_file():
+                    continue
+                st = entry.stat()
+                rows.append((entry.name, date, None, None, resolution, st.st_size, st.st_mtime_ns,
+                             None, None, None, None))
+        on_disk = {row[0] for row in rows}
+        with self._lock, self._conn:
+            self._conn.executemany(self.UPSERT, rows)
+            stale = [(name,) for (name,) in self._conn.execute("SELECT filename FROM images")
+                     if name not in on_disk]
+            self._conn.executemany("DELETE FROM images WHERE filename = ?", stale)
+            self._conn.executemany("DELETE FROM image_markets WHERE filename = ?", stale)
+        if hash_files:
+            for row in self._query("SELECT filename FROM images WHERE sha256 IS NULL"):
+                self.ensure_hash(row["filename"])
+        return len(rows)
+
+class RetentionPolicy:
+    # 保留最近 keep_days 天(含今天)，其余壁纸占用超出 max_bytes 时从最旧的开始淘汰；
+    # 收藏的壁纸与今天的壁纸永不删除，也不计入 max_bytes。超过 TEMP_MAX_AGE 未更新的
+    # 下载残留(.part 断点、.peer 局域网临时文件、.link / .tmp)在同一次扫描中清理
+    BATCH_SIZE = 256
+    TEMP_RE = re.compile(r"^\d{8}_.*\.jpg\.(?:part(?:\.json)?|peer|link|tmp)$")
+    TEMP_MAX_AGE = 24 * 3600
+
+    def __init__(self, keep_days=1, max_bytes=0, keep_pinned=True):
+        self.keep_days = max(1, int(keep_days))
+        self.max_bytes = max(0, int(max_bytes))
+        self.keep_pinned = keep_pinned
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(keep_days=settings.get("keep_days", 1),
+                   max_bytes=settings.get("max_size_mb", 0) * 1024 * 1024)
+
+    def apply(self, save_dir, today=None):
+        started = time.perf_counter()
+        report = {"removed": 0, "bytes": 0, "kept": 0, "kept_bytes": 0, "seconds": 0.0}
+        if not os.path.isdir(save_dir):
+            return report
+        store = WallpaperStore.open(save_dir)
+        today = (today or datetime.date.today())
+        cutoff = (today - datetime.timedelta(days=self.keep_days - 1)).strftime("%Y%m%d")
+        today = today.strftime("%Y%m%d")
+        pinned = store.pinned_filenames() if self.keep_pinned else set()
+        # 硬链接的重复图片共用同一份数据，按组只计一次占用，组内文件全部删除后才算回收
+        groups = store.link_groups()
+        held = {}
+
+        def hold(group, size):
+            held[group] = held.get(group, 0) + 1
+            return size if held[group] == 1 else 0
+
+        def release(group, size):
+            held[group] -= 1
+            return size if held[group] == 0 else 0
+
+        # 单次 scandir，大小与修改时间取自目录项缓存的 stat 信息
+        evict, evictable, protected, kept_bytes, kept = [], [], {}, 0, 0
+        stale_before = time.time() - self.TEMP_MAX_AGE
+        with os.scandir(save_dir) as entries:
+            for entry in entries:
+                date, _ = WallpaperStore.parse_name(entry.name)
+                if date is None:
+                    if self.TEMP_RE.match(entry.name):
+                        st = entry.stat()
+                        if st.st_mtime < stale_before:
+                            evict.append((entry.name, st.st_size, entry.name))
+                    continue
+                size = entry.stat().st_size
+                group = groups.get(entry.name, entry.name)
+                if entry.name in pinned or date >= today:
+                    kept += 1
+                    kept_bytes += hold(group, size)
+                    protected[group] = size
+                elif date < cutoff:
+                    evict.append((entry.name, size, group))
+                else:
+                    kept += 1
+                    kept_bytes += hold(group, size)
+                    evictable.append((date, entry.name, size, group))
+
+        # 容量上限只约束可淘汰的壁纸；与受保护文件同组的硬链接删除后不回收空间，本就不计入
+        capped_bytes = kept_bytes - sum(protected.values())
+        if self.max_bytes and capped_bytes > self.max_bytes:
+            evictable.sort()
+            for date, name, size, group in evictable:
+                if capped_bytes <= self.max_bytes:
+                    break
+                if group in protected:
+                    continue
+                evict.append((name, size, group))
+                released = release(group, size)
+                kept_bytes -= released
+                capped_bytes -= released
+                kept -= 1
+
+        freed = set()
+        for i in range(0, len(evict), self.BATCH_SIZE):
+            removed = []
+            for name, size, group in evict[i:i + self.BATCH_SIZE]:
+                try:
+                    os.remove(os.path.join(save_dir, name))
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    kept += 1
+                    kept_bytes += hold(group, size)
+                    continue
+                removed.append(name)
+                if not held.get(group) and group not in freed:
+                    freed.add(group)
+                    report["bytes"] += size
+            report["removed"] += len(removed)
+            store.remove(removed)
+
+        report.update(kept=kept, kept_bytes=kept_bytes, seconds=time.perf_counter() - started)
+        Metrics.record("cleanup", report["seconds"], report["bytes"], removed=report["removed"])
+        return report
+
+class CompletionJournal:
+    # 按日期记录每天最后一次成功运行的元数据、文件大小/修改时间/哈希与应用的壁纸。
+    # 重启时今日记录与磁盘、设置和当前壁纸一致即视为已完成。写入先同步落盘临时文件再原子替换，
+    # 中途崩溃或断电时保留上一版内容；文件损坏时当作没有记录，走完整流程
+    FILENAME = "journal.json"
+    KEEP_DAYS = 7
+    _lock = threading.Lock()
+
+    def __init__(self, save_dir):
+        self.save_dir = save_dir
+        self.path = library_state_path(save_dir, self.FILENAME)
+
+    @staticmethod
+    def today():
+        return datetime.date.today().strftime("%Y%m%d")
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def _save(self, data):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        if not sys.platform.startswith('win'):
+            # 目录项同样落盘，替换本身才不会在断电后丢失
+            fd = os.open(os.path.dirname(self.path), os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def update(self, date, **fields):
+        with self._lock:
+            data = self.load()
+            data.setdefault(date, {}).update(fields)
+            for old in sorted(data)[:-self.KEEP_DAYS]:
+                del data[old]
+            self._save(data)
+
+    def discard(self, date):
+        with self._lock:
+            data = self.load()
+            if data.pop(date, None) is not None:
+                self._save(data)
+
+    def record(self, markets, metas, save_path, wallpaper, displays):
+        st, wst = os.stat(save_path), os.stat(wallpaper)
+        store = WallpaperStore.open(self.save_dir)
+        self.update(self.today(), markets=list(markets), meta=metas, file=os.path.basename(save_path),
+                    size=st.st_size, mtime_ns=st.st_mtime_ns, sha256=store.ensure_hash(os.path.basename(save_path)),
+                    wallpaper=os.path.abspath(wallpaper), wallpaper_size=wst.st_size,
+                    wallpaper_mtime_ns=wst.st_mtime_ns, displays=[list(d) for d in displays or []],
+                    completed_at=datetime.datetime.now().isoformat(timespec="seconds"))
+
+    def completed(self, markets, displays):
+        # 返回与当前状态一致的今日记录，否则返回 None；只做 stat 与状态读取，不打开索引
+        entry = self.load().get(self.today())
+        if not isinstance(entry, dict) or not entry.get("file") or not entry.get("wallpaper"):
+            return None
+        if entry.get("markets") != list(markets) or entry.get("displays") != [list(d) for d in displays or []]:
+            return None
+        for path, size, mtime_ns in ((os.path.join(self.save_dir, entry["file"]), entry.get("size"), entry.get("mtime_ns")),
+                                     (entry["wallpaper"], entry.get("wallpaper_size"), entry.get("wallpaper_mtime_ns"))):
+            try:
+                st = os.stat(path)
+            except OSError:
+                return None
+            if (st.st_size, st.st_mtime_ns) != (size, mtime_ns):
+                return None
+        # 之后应用过历史壁纸或系统壁纸被改动时需要重新设置
+        if not WallpaperApplier.is_current(entry["wallpaper"]):
+            return None
+        return entry
+
+# ==========================================
+# 3. 局域网共享
+# ==========================================
+def _make_peer_handler(peer_server):
+    # http.server 仅在开启共享时才导入
+    from http.server import BaseHTTPRequestHandler
+
+    class PeerHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            from urllib.parse import parse_qs, urlsplit
+            parts = urlsplit(self.path)
+            query = parse_qs(parts.query)
+            try:
+                if parts.path == "/meta":
+                    return self._send_json(peer_server.today_meta(query.get("mkt", [WallpaperUtils.DEFAULT_MKT])[0]))
+                if parts.path == "/lookup":
+                    record = peer_server.find(query.get("urlbase", [""])[0], query.get("variant", [""])[0])
+                    return self._send_json(record and {"sha256": record["sha256"], "size": record["size"]})
+                if parts.path.startswith("/image/"):
+                    return self._send_file(*peer_server.file_for(parts.path[len("/image/"):]))
+            except Exception:
+                return self._send(500, b"")
+            return self._send(404, b"")
+
+        def _send(self, status, body, content_type="text/plain"):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_json(self, payload):
+            if payload is None:
+                return self._send(404, b"")
+            return self._send(200, json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json")
+
+        def _send_file(self, path, size):
+            if path is None:
+                return self._send(404, b"")
+            import shutil
+            with open(path, 'rb') as f:
+                self.send_response(200)
+                self.send_header("Content-Type", "image/jpeg")
+                self.send_header("Content-Length", str(size))
+                self.end_headers()
+                shutil.copyfileobj(f, self.wfile, 256 * 1024)
+            peer_server.served += 1
+
+    return PeerHandler
+
+class PeerServer:
+    # 以只读 HTTP 向局域网内的其它实例提供本机已校验的壁纸:
+    #   GET /meta?mkt=zh-CN                      今日元数据
+    #   GET /lookup?urlbase=/th?id=...&variant=UHD  图片的 sha256 与大小
+    #   GET /image/<sha256>                      图片内容
+    # 只提供索引中已有哈希、且大小与修改时间和磁盘一致的文件
+    PORT = 18765
+
+    def __init__(self, save_dir, host="0.0.0.0", port=PORT):
+        from http.server import ThreadingHTTPServer
+        self.save_dir = save_dir
+        self.store = WallpaperStore.open(save_dir)
+        self.httpd = ThreadingHTTPServer((host, port), _make_peer_handler(self))
+        self.httpd.daemon_threads = True
+        self.served = 0
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="PeerServer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def today_meta(self, mkt):
+        # 优先使用本进程获取到的元数据，进程重启后由索引中今日主市场文件的记录还原
+        today = datetime.date.today()
+        with WallpaperUtils._meta_lock:
+            cached = WallpaperUtils._meta_cache.get((mkt, today.isoformat()))
+        if cached:
+            return cached[1]
+        rows = self.store._query(
+            "SELECT * FROM images WHERE date = ? AND market = ? AND urlbase IS NOT NULL ORDER BY filename LIMIT 1",
+            (today.strftime("%Y%m%d"), mkt))
+        if not rows:
+            return None
+        row = rows[0]
+        return {"startdate": row["date"], "urlbase": row["urlbase"], "title": row["title"],
+                "copyright": row["copyright"]}
+
+    def find(self, urlbase, variant):
+        rows = self.store._query(
+            "SELECT filename FROM images WHERE urlbase = ? AND resolution = ? AND sha256 IS NOT NULL", (urlbase, variant))
+        for row in rows:
+            record = self.store.lookup(row["filename"])
+            if record and record["sha256"]:
+                return record
+        return None
+
+    def file_for(self, sha256):
+        for row in self.store.find_by_hash(sha256):
+            record = self.store.lookup(row["filename"])
+            if record and record["sha256"] == sha256:
+                return os.path.join(self.save_dir, record["filename"]), record["size"]
+        return None, 0
+
+class PeerCache:
+    # 先向局域网内的其它实例获取元数据与图片，任何失败都静默回退到 Bing；
+    # 图片写入临时文件，校验大小、SHA-256 与 JPEG 结构后才替换到目标路径。
+    # 校验防止传输损坏与截断；对端本身按局域网内可信处理
+    TIMEOUT = 3
+    peers = []
+    hits = 0
+    misses = 0
+
+    @classmethod
+    def configure(cls, peers):
+        # "192.168.1.10:18765, nas:18765" 或列表
+        if isinstance(peers, str):
+            peers = peers.split(",")
+        cls.peers = [p if "://" in p else f"http://{p}" for p in (p.strip() for p in peers or []) if p]
+
+    @classmethod
+    def _candidates(cls):
+        return [p for p in cls.peers if WallpaperUtils.host_health(p).allow()]
+
+    @classmethod
+    def _get(cls, url, deadline, **kwargs):
+        return WallpaperUtils.timed_get(url, deadline=deadline, timeout=cls.TIMEOUT, **kwargs)
+
+    @classmethod
+    def fetch_meta(cls, mkt, deadline=None):
+        today = datetime.date.today().strftime("%Y%m%d")
+        for peer in cls._candidates():
+            with Metrics.span("peer_meta", peer=peer, mkt=mkt) as span:
+                try:
+                    meta = cls._get(f"{peer}/meta?mkt={mkt}", deadline).json()
+                except DeadlineExceeded:
+                    raise
+                except Exception:
+                    meta = None
+                # 只接受今日的完整记录，过期或残缺的元数据回退到 Bing
+                span.attrs["hit"] = (isinstance(meta, dict) and meta.get("startdate") == today
+                                     and str(meta.get("urlbase", "")).startswith("/th?id="))
+            if span.attrs["hit"]:
+                return meta
+        return None
+
+    @classmethod
+    def lookup(cls, urlbase, variant, deadline=None):
+        from urllib.parse import urlencode
+        query = urlencode({"urlbase": urlbase, "variant": variant})
+        for peer in cls._candidates():
+            try:
+                info = cls._get(f"{peer}/lookup?{query}", deadline).json()
+            except DeadlineExceeded:
+                raise
+            except Exception:
+                continue
+            if isinstance(info, dict) and re.fullmatch(r"[0-9a-f]{64}", str(info.get("sha256", ""))):
+                return peer, info
+        return None, None
+
+    @classmethod
+    def fetch_image(cls, url, save_path, deadline=None):
+        # 返回校验通过的 SHA-256；对端没有该图片或校验失败时返回 None
+        if not cls.peers:
+            return None
+        m = re.match(r"^(.*)_([^_/]+)\.jpg$", WallpaperUtils.split_host(url)[1])
+        if not m:
+            return None
+        peer, info = cls.lookup(m.group(1), m.group(2), deadline)
+        if peer is None:
+            cls.misses += 1
+            return None
+        import hashlib
+        tmp_path = save_path + ".peer"
+        try:
+            with Metrics.span("peer_transfer", peer=peer) as span:
+                resp = cls._get(f"{peer}/image/{info['sha256']}", deadline, stream=True)
+                with resp, (deadline.on_cancel(lambda: abort_response(resp)) if deadline else Registration()):
+                    hasher = hashlib.sha256()
+                    with open(tmp_path, 'wb') as f:
+                        for chunk in resp.iter_content(256 * 1024):
+                            f.write(chunk)
+                            hasher.update(chunk)
+                            span.bytes += len(chunk)
+                if span.bytes != info.get("size") or hasher.hexdigest() != info["sha256"] \
+                        or not jpeg_structure_ok(tmp_path):
+                    raise IOError("共享图片校验失败")
+            os.replace(tmp_path, save_path)
+        except DeadlineExceeded:
+            SegmentedDownloader._remove(tmp_path)
+            raise
+        except Exception:
+            if deadline:
+                deadline.check()
+            SegmentedDownloader._remove(tmp_path)
+            WallpaperUtils.host_health(peer).record_failure()
+            cls.misses += 1
+            return None
+        cls.hits += 1
+        return info["sha256"]
+
+# ==========================================
+# 4. 调度
+# ==========================================
+class SystemClock:
+    def now(self):
+        return datetime.datetime.now(datetime.timezone.utc)
+
+    def wait(self, seconds, stop_event):
+        # 返回 True 表示被要求停止
+        return stop_event.wait(max(0.0, seconds))
+
+class RolloverScheduler:
+    # 在 Bing 每日切换图片时运行任务，其余时间一次性睡眠到下次切换(不轮询)；
+    # 失败时按带抖动的指数退避重试。下次运行时间持久化，重启后继续等待而不是重复运行
+    BASE_DELAY = 15
+    MAX_DELAY = 60 * 60
+    ROLLOVER_GRACE = 120  # 切换后稍等片刻再获取，避免拿到旧图
+
+    def __init__(self, task, clock=None, state_path=None, rng=None,
+                 base_delay=BASE_DELAY, max_delay=MAX_DELAY):
+        self.task = task
+        self.clock = clock or SystemClock()
+        self.state_path = state_path
+        if rng is None:
+            import random
+            rng = random.random
+        self.rng = rng
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @staticmethod
+    def next_rollover(now, fullstartdate=None):
+        # fullstartdate 为 UTC 时间，如 zh-CN 的 202610161600 即北京时间 0 点；无元数据时按本地午夜计算
+        if fullstartdate:
+            try:
+                start = datetime.datetime.strptime(fullstartdate, "%Y%m%d%H%M").replace(tzinfo=datetime.timezone.utc)
+            except ValueError:
+                start = None
+            if start is not None:
+                nxt = start + datetime.timedelta(days=1)
+                if nxt <= now:
+                    nxt += datetime.timedelta(days=((now - nxt) // datetime.timedelta(days=1)) + 1)
+                return nxt
+        # 次日零点按本地时区规则换算，其间跨夏令时切换时偏移量与当前不同
+        local_now = now.astimezone()
+        midnight = datetime.datetime.combine(local_now.date() + datetime.timedelta(days=1), datetime.time())
+        return midnight.astimezone().astimezone(datetime.timezone.utc)
+
+    def backoff_delay(self, attempt):
+        # 等量抖动: 上限的一半固定，另一半随机
+        cap = min(self.max_delay, self.base_delay * (2 ** max(0, attempt - 1)))
+        return cap / 2 + self.rng() * cap / 2
+
+    def _load_state(self):
+        if not self.state_path:
+            return {}
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self, state):
+        if not self.state_path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def run(self, stop_event=None, once=False, max_attempts=None):
+        # once=True 时立即执行，成功即返回结果；否则常驻，按切换时间循环执行
+        stop_event = stop_event or threading.Event()
+        state = self._load_state()
+        attempt = 0
+        while not stop_event.is_set():
+            if not once and state.get("next_run"):
+                delay = (datetime.datetime.fromisoformat(state["next_run"]) - self.clock.now()).total_seconds()
+                if delay > 0:
+                    if self.clock.wait(delay, stop_event):
+                        break
+                    # 醒来后重新核对时间(系统休眠等情况下可能提前醒来)
+                    continue
+            try:
+                result = self.task()
+            except Exception as e:
+                attempt += 1
+                if max_attempts and attempt >= max_attempts:
+                    state["last_error"] = str(e)
+                    self._save_state(state)
+                    raise
+                retry_at = self.clock.now() + datetime.timedelta(seconds=self.backoff_delay(attempt))
+                state.update(next_run=retry_at.isoformat(), last_error=str(e))
+                self._save_state(state)
+                if once and self.clock.wait((retry_at - self.clock.now()).total_seconds(), stop_event):
+                    break
+                continue
+            attempt = 0
+            now = self.clock.now()
+            fullstartdate = result.get("fullstartdate") if isinstance(result, dict) else None
+            next_run = self.next_rollover(now, fullstartdate) + datetime.timedelta(seconds=self.ROLLOVER_GRACE)
+            state = {"last_success": now.isoformat(), "next_run": next_run.isoformat()}
+            self._save_state(state)
+            if once:
+                return result
+        return None
+
+class TaskHandle:
+    def __init__(self, kind, generation, func, args, kwargs):
+        self.kind = kind
+        self.generation = generation
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.token = CancelToken()
+        self.done = False
+
+    @property
+    def cancelled(self):
+        return self.token.cancelled
+
+    def cancel(self):
+        self.token.cancel()
+
+class TaskPool:
+    # 有界的共享线程池，按优先级(数值小者先)取任务。同类任务带递增的代数: 新任务可取代旧任务
+    # (取消令牌中止其网络传输)，或并入正在进行的同类任务。任务函数以关键字参数 cancel 接收令牌，
+    # 完成后调用 on_done(handle, result, error)，调用方可据 is_current 丢弃过期结果
+    PRIORITY_APPLY = 0
+    PRIORITY_PREVIEW = 1
+    PRIORITY_UPDATE = 2
+    MAX_WORKERS = 2
+
+    def __init__(self, max_workers=MAX_WORKERS, on_done=None):
+        self.max_workers = max(1, max_workers)
+        self.on_done = on_done
+        self._queue = []
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._threads = []
+        self._idle = 0
+        self._latest = {}
+        self._shutdown = False
+
+    def submit(self, kind, func, *args, priority=PRIORITY_UPDATE, replace=False, **kwargs):
+        import heapq
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("任务池已关闭")
+            latest = self._latest.get(kind)
+            if latest is not None and not latest.done:
+                if not replace:
+                    return latest
+                latest.cancel()
+            handle = TaskHandle(kind, latest.generation + 1 if latest else 1, func, args, kwargs)
+            self._latest[kind] = handle
+            self._seq += 1
+            heapq.heappush(self._queue, (priority, self._seq, handle))
+            if self._idle == 0 and len(self._threads) < self.max_workers:
+                thread = threading.Thread(target=self._work, name=f"TaskPool-{len(self._threads)}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+            self._cond.notify()
+        return handle
+
+    def is_current(self, handle):
+        with self._cond:
+            return self._latest.get(handle.kind) is handle and not handle.cancelled
+
+    def active(self, kind):
+        with self._cond:
+            latest = self._latest.get(kind)
+            return latest is not None and not latest.done
+
+    def cancel(self, kind):
+        with self._cond:
+            latest = self._latest.get(kind)
+        if latest is not None:
+            latest.cancel()
+
+    def shutdown(self):
+        # 取消全部任务，工作线程在当前任务中止后退出
+        with self._cond:
+            self._shutdown = True
+            handles = list(self._latest.values())
+            self._cond.notify_all()
+        for handle in handles:
+            handle.cancel()
+
+    def _work(self):
+        import heapq
+        while True:
+            with self._cond:
+                self._idle += 1
+                while not self._queue and not self._shutdown:
+                    self._cond.wait()
+                self._idle -= 1
+                if not self._queue:
+                    return
+                _, _, handle = heapq.heappop(self._queue)
+            result, error = None, None
+            if handle.cancelled:
+                error = TaskCancelled("任务已取消")
+            else:
+                try:
+                    result = handle.func(*handle.args, cancel=handle.token, **handle.kwargs)
+                except Exception as e:
+                    error = e
+            with self._cond:
+                handle.done = True
+            if self.on_done:
+                self.on_done(handle, result, error)
+
+# ==========================================
+# 5. 无界面模式
+# ==========================================
+HEADLESS_STARTUP_BUDGET_MS = 400
+HEADLESS_PEAK_RSS_BUDGET_MB = 60
+AUTO_RUN_MAX_ATTEMPTS = 4
+
+def acquire_single_instance(name="BingWallpaperMutex_V1.4"):
+    if not sys.platform.startswith('win'):
+        return True
+    ERROR_ALREADY_EXISTS = 183
+    handle = ctypes.windll.kernel32.CreateMutexW(None, False, name)
+    if ctypes.windll.kernel32.GetLastError() == ERROR_ALREADY_EXISTS:
+        return False
+    # 互斥体随进程退出释放，这里保持引用即可
+    acquire_single_instance.handle = handle
+    return True
+
+def run_headless(argv=None, started_at=None):
+    import argparse
+    parser = argparse.ArgumentParser(prog="bing_wallpaper", description="无界面模式: 下载并应用今日 Bing 壁纸后退出")
+    parser.add_argument("--headless", action="store_true")
+    parser.add_argument("--save-dir", default=None)
+    parser.add_argument("--markets", default=None, help="逗号分隔的市场列表，第一个为主市场，如 zh-CN,en-US")
+    parser.add_argument("--backfill", action="store_true", help="补全接口仍可获取的历史壁纸")
+    parser.add_argument("--daemon", action="store_true", help="常驻运行，每天 Bing 切换图片后自动更新")
+    parser.add_argument("--variant", default=None, help="图片规格: auto(按显示器选择) / UHD / 1920x1080 等")
+    parser.add_argument("--prom-file", default=None, help="导出 Prometheus textfile 指标的路径")
+    parser.add_argument("--profile", nargs="?", const="", default=None, metavar="PATH",
+                        help="记录完整运行的 cProfile 数据(默认写入应用数据目录)")
+    parser.add_argument("--peers", default=None, help="逗号分隔的局域网共享地址，如 192.168.1.10:18765")
+    parser.add_argument("--serve-peers", nargs="?", const="", default=None, metavar="[HOST:]PORT",
+                        help="常驻运行并向局域网共享本机壁纸(隐含 --daemon)")
+    parser.add_argument("--workers", type=int, default=ArchiveBackfill.WORKERS)
+    parser.add_argument("--max-rate", type=float, default=None, help="补全时的总带宽上限(MB/s)")
+    args = parser.parse_args(argv)
+
+    started_at = started_at if started_at is not None else time.perf_counter()
+    startup_ms = (time.perf_counter() - started_at) * 1000
+
+    if not acquire_single_instance():
+        return 0
+
+    settings = load_settings()
+    save_dir = args.save_dir or default_save_dir()
+    Metrics.configure(os.path.join(app_data_dir(), "logs", "metrics.jsonl"),
+                      prom_path=args.prom_file or settings["prom_textfile"])
+    if args.profile is None:
+        return _run_headless(args, settings, save_dir, started_at, startup_ms)
+
+    import cProfile
+    profile_path = args.profile or os.path.join(
+        app_data_dir(), f"profile-{datetime.datetime.now():%Y%m%d-%H%M%S}.prof")
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return _run_headless(args, settings, save_dir, started_at, startup_ms)
+    finally:
+        profiler.disable()
+        os.makedirs(os.path.dirname(os.path.abspath(profile_path)), exist_ok=True)
+        profiler.dump_stats(profile_path)
+        print(f"性能分析数据: {profile_path}", file=sys.stderr)
+
+def _run_headless(args, settings, save_dir, started_at, startup_ms):
+    VariantSelector.configure(args.variant or settings["image_variant"])
+    PeerCache.configure(args.peers if args.peers is not None else settings["peers"])
+    if args.backfill:
+        max_rate = args.max_rate * 1024 * 1024 if args.max_rate else None
+        try:
+            report = ArchiveBackfill(save_dir, workers=args.workers, max_rate=max_rate).run()
+        except Exception as e:
+            print(f"补全失败: {e}", file=sys.stderr)
+            return 1
+        print(f"补全 {report['downloaded']}/{report['missing']} 张, 用时 {report['seconds']:.1f} s, "
+              f"{report['images_per_sec']:.2f} 张/s, {report['mb_per_sec']:.2f} MB/s")
+        for err in report["errors"]:
+            print(f"  失败 {err}", file=sys.stderr)
+        return 1 if report["errors"] else 0
+
+    markets = parse_markets(args.markets) or settings["markets"]
+    # 设置项 peer_serve 与 --serve-peers 相同：共享需要进程常驻
+    serve_peers = args.serve_peers
+    if serve_peers is None and settings["peer_serve"]:
+        serve_peers = ""
+    resident = args.daemon or serve_peers is not None
+
+    def revalidate():
+        try:
+            WallpaperUtils.revalidate_today(save_dir, markets, Deadline(WallpaperUtils.DAILY_DEADLINE))
+        except Exception as e:
+            print(f"元数据校验失败: {e}", file=sys.stderr)
+
+    def task():
+        result = WallpaperUtils.run_daily(save_dir, auto_delete=settings["auto_delete"], markets=markets,
+                                          retention=RetentionPolicy.from_settings(settings))
+        # 单次运行由日志完成时不联网；常驻时再在后台校验日志中的元数据
+        if result.get("journal") and resident:
+            threading.Thread(target=revalidate, name="Revalidate", daemon=True).start()
+        return result
+
+    try:
+        os.makedirs(save_dir, exist_ok=True)
+        scheduler = RolloverScheduler(task, state_path=library_state_path(save_dir, "scheduler.json"))
+        if serve_peers is not None:
+            host, _, port = serve_peers.rpartition(":")
+            server = PeerServer(save_dir, host=host or "0.0.0.0", port=int(port or settings["peer_port"])).start()
+            print(f"局域网共享: {server.url}", file=sys.stderr)
+        if resident:
+            scheduler.run()
+            return 0
+        result = scheduler.run(once=True, max_attempts=AUTO_RUN_MAX_ATTEMPTS)
+    except Exception as e:
+        print(f"自动任务失败: {e}", file=sys.stderr)
+        return 1
+
+    total_ms = (time.perf_counter() - started_at) * 1000
+    rss_mb = peak_rss_mb()
+    status = "壁纸已更新" if result["is_new"] else "壁纸已是最新"
+    apply = result.get("apply") or {}
+    if result.get("journal"):
+        status += " (今日已完成，未联网)"
+    elif apply:
+        status += (f" (应用 {apply['ms']:.0f} ms" + ("" if apply["applied"] else ", 未变化已跳过")
+                   + f", 累计跳过率 {apply['skip_rate'] * 100:.0f}%)")
+    print(f"{status}: {result['path']} 清理 {result['cleaned']} 个 "
+          f"({result['reclaimed'] / (1024 * 1024):.1f} MB) | "
+          f"启动 {startup_ms:.0f} ms, 首次联网 {milestone_ms('first_network_request', started_at) or 0:.0f} ms, "
+          f"总计 {total_ms:.0f} ms, 峰值内存 {rss_mb:.1f} MB")
+    if startup_ms > HEADLESS_STARTUP_BUDGET_MS or rss_mb > HEADLESS_PEAK_RSS_BUDGET_MB:
+        print(f"超出预算: 启动 {HEADLESS_STARTUP_BUDGET_MS} ms / 内存 {HEADLESS_PEAK_RSS_BUDGET_MB} MB", file=sys.stderr)
+    return 0